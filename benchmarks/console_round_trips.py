@@ -0,0 +1,268 @@
+"""Count the console round trips of OTA package serving, batched or not.
+
+A local bash shell driven through pexpect stands in for the OTA server
+console. Every Cuttlefish boot serves its OTA package through the
+:class:`~mobilefarm.lib.ota_cache.OTAArtifactCache`, the first boot
+fetching it (a cache miss) and the others reusing it (cache hits). The
+same boots run with :func:`~mobilefarm.lib.console_batch.execute_batch`
+and with :func:`~mobilefarm.lib.console_batch.execute_sequentially`,
+which sends one command per round trip like the console did before
+batching. ``--latency`` adds a delay to every round trip to mimic a
+remote console. From the repository root::
+
+    PYTHONPATH=. python benchmarks/console_round_trips.py --boots 10 --latency 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import shlex
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pexpect
+
+from mobilefarm.lib.console_batch import execute_batch, execute_sequentially
+from mobilefarm.lib.ota_cache import OTAArtifactCache
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.console_batch import CommandResult
+
+_PROMPT = "mf-bench\\$ "
+_ARTIFACT = "cf_x86_64_phone-ota-12345.zip"
+
+
+class BashConsole:
+    """Local bash shell with the console API used by the batch helpers."""
+
+    def __init__(self, latency: float) -> None:
+        """Start the shell.
+
+        :param latency: delay added to every round trip, in seconds
+        :type latency: float
+        """
+        self._latency = latency
+        self._shell = pexpect.spawn(
+            "bash",
+            ["--norc", "--noprofile"],
+            encoding="utf-8",
+            timeout=60,
+            env={"PS1": _PROMPT.replace("\\", ""), "TERM": "dumb"},
+        )
+        self._shell.expect(_PROMPT)
+        self.round_trips = 0
+
+    @property
+    def before(self) -> str:
+        """Output read before the last match.
+
+        :return: console output
+        :rtype: str
+        """
+        return self._shell.before
+
+    def sendline(self, line: str) -> None:
+        """Send a command line, as one round trip.
+
+        :param line: command line
+        :type line: str
+        """
+        self.round_trips += 1
+        time.sleep(self._latency)
+        self._shell.sendline(line)
+
+    def expect(self, pattern: str | list[str], timeout: int = -1) -> int:
+        """Wait for a pattern.
+
+        :param pattern: pattern or patterns to wait for
+        :type pattern: str | list[str]
+        :param timeout: timeout in seconds, the default if -1
+        :type timeout: int
+        :return: index of the matched pattern
+        :rtype: int
+        """
+        return self._shell.expect(pattern, timeout=None if timeout == -1 else timeout)
+
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Run a command and return its output.
+
+        :param command: command to run
+        :type command: str
+        :param timeout: timeout in seconds, the default if -1
+        :type timeout: int
+        :return: output of the command, without its echo
+        :rtype: str
+        """
+        self.sendline(command)
+        self.expect(_PROMPT, timeout)
+        return self.before.split("\n", 1)[1] if "\n" in self.before else ""
+
+    def close(self) -> None:
+        """Stop the shell."""
+        self._shell.close()
+
+
+class BenchOTAServer:
+    """OTA server running the artifact cache commands on a bash console."""
+
+    def __init__(self, console: BashConsole, batched: bool) -> None:
+        """Initialize the server.
+
+        :param console: console of the OTA server
+        :type console: BashConsole
+        :param batched: send each batch in one round trip
+        :type batched: bool
+        """
+        self.console = console
+        self._batched = batched
+
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Run a command on the console.
+
+        :param command: command to run
+        :type command: str
+        :param timeout: timeout in seconds, the default if -1
+        :type timeout: int
+        :return: output of the command
+        :rtype: str
+        """
+        return self.console.execute_command(command, timeout)
+
+    def execute_batch(
+        self,
+        commands: Sequence[str],
+        timeout: int = -1,
+        stop_on_error: bool = False,
+    ) -> list[CommandResult]:
+        """Run commands in one round trip, or one at a time if not batched.
+
+        :param commands: commands to run
+        :type commands: Sequence[str]
+        :param timeout: timeout in seconds, the default if -1
+        :type timeout: int
+        :param stop_on_error: skip the remaining commands after a failure
+        :type stop_on_error: bool
+        :return: result of every command that ran
+        :rtype: list[CommandResult]
+        """
+        if self._batched:
+            return execute_batch(
+                self.console, commands, [_PROMPT], timeout, stop_on_error
+            )
+        return execute_sequentially(self.console, commands, timeout, stop_on_error)
+
+
+def _serve(server: BenchOTAServer, cache: OTAArtifactCache, source: Path) -> None:
+    """Serve the OTA package like ``OTAServer.serve_ota_package`` does.
+
+    :param server: OTA server
+    :type server: BenchOTAServer
+    :param cache: artifact cache of the server
+    :type cache: OTAArtifactCache
+    :param source: file standing in for the build server artifact
+    :type source: Path
+    """
+    digest = hashlib.sha256(source.read_bytes()).hexdigest()
+
+    def fetch(output: str) -> str:
+        quoted = shlex.quote(output)
+        results = server.execute_batch(
+            [
+                f"test -f {quoted} || cp {shlex.quote(str(source))} {quoted}",
+                f'[ "$(sha256sum {quoted} | cut -d" " -f1)" = {digest} ]',
+            ],
+            stop_on_error=True,
+        )
+        if len(results) != 2 or not results[-1].ok:  # noqa: PLR2004
+            err_msg = f"Fetch failed: {results}"
+            raise ValueError(err_msg)
+        return digest
+
+    path = cache.path_for("cf_x86_64_phone", "12345", _ARTIFACT)
+    cache.acquire(path)
+    try:
+        cached_path = cache.ensure("cf_x86_64_phone", "12345", _ARTIFACT, fetch)
+        cache.publish(cached_path)
+        cache.digest(cached_path)
+        index = cache.read_metadata(cached_path)
+        if not index:
+            cache.write_metadata(cached_path, {"primary": {"offset": 0}})
+    finally:
+        cache.release(path)
+
+
+def run(boots: int, latency: float, batched: bool) -> tuple[list[int], float]:
+    """Serve the OTA package for a number of boots.
+
+    :param boots: number of Cuttlefish boots
+    :type boots: int
+    :param latency: delay added to every round trip, in seconds
+    :type latency: float
+    :param batched: send each batch in one round trip
+    :type batched: bool
+    :return: round trips of every boot, total seconds
+    :rtype: tuple[list[int], float]
+    """
+    with tempfile.TemporaryDirectory(prefix="mobilefarm-bench-") as work_dir:
+        source = Path(work_dir, "build-server", _ARTIFACT)
+        source.parent.mkdir()
+        source.write_bytes(b"\0" * 1024**2)
+        serve_dir = Path(work_dir, "serve")
+        serve_dir.mkdir()
+        console = BashConsole(latency)
+        server = BenchOTAServer(console, batched)
+        cache = OTAArtifactCache(
+            server,  # type: ignore[arg-type]
+            cache_dir=f"{work_dir}/cache",
+            serve_dir=str(serve_dir),
+        )
+        round_trips = []
+        started = time.monotonic()
+        try:
+            for _ in range(boots):
+                before = console.round_trips
+                _serve(server, cache, source)
+                round_trips.append(console.round_trips - before)
+        finally:
+            console.close()
+        return round_trips, time.monotonic() - started
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Print the round trips of batched and sequential OTA serving.
+
+    :param argv: command line arguments, ``sys.argv`` if None
+    :type argv: list[str] | None
+    :return: exit code
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boots", type=int, default=10)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="delay added to every round trip, in seconds",
+    )
+    args = parser.parse_args(argv)
+    print(  # noqa: T201
+        f"{'mode':<10} {'miss':>5} {'hit':>5} {'total':>6} {'seconds':>8}"
+    )
+    for mode, batched in (("sequential", False), ("batched", True)):
+        round_trips, seconds = run(args.boots, args.latency, batched)
+        print(  # noqa: T201
+            f"{mode:<10} {round_trips[0]:>5} "
+            f"{round_trips[-1] if len(round_trips) > 1 else 0:>5} "
+            f"{sum(round_trips):>6} {seconds:>8.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
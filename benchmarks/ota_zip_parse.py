@@ -0,0 +1,242 @@
+"""Time the OTA payload lookup in a multi-GB synthetic OTA zip.
+
+The zip holds a stored ZIP64 ``payload.bin`` written as a sparse file, so
+that it takes no disk space, and a ``payload_properties.txt``. The payload
+is located three ways:
+
+* ``full read``: the zip is read from start to end, as when the OTA
+  server unpacked or copied the package to find the payload, then its
+  entries are looked up with :mod:`zipfile`;
+* ``mmap``: :func:`~mobilefarm.lib.ota_zip.parse_ota_payload`;
+* ``http range``: :func:`~mobilefarm.lib.ota_zip.parse_ota_payload_url`
+  against an :class:`~mobilefarm.lib.ota_http_server.OTAHttpServer` on
+  localhost.
+
+From the repository root::
+
+    PYTHONPATH=. python benchmarks/ota_zip_parse.py --size-gib 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Callable
+
+from mobilefarm.lib.ota_http_server import OTAHttpServer
+from mobilefarm.lib.ota_zip import parse_ota_payload, parse_ota_payload_url
+
+_PROPERTIES = (
+    b"FILE_HASH=ZmFrZQ==\nFILE_SIZE=1\nMETADATA_HASH=ZmFrZQ==\nMETADATA_SIZE=1\n"
+)
+_SATURATED = 0xFFFFFFFF
+_READ_SIZE = 16 * 1024 * 1024
+
+
+def _local_header(name: bytes, crc: int, size: int, extra: bytes) -> bytes:
+    stored = min(size, _SATURATED)
+    return (
+        struct.pack(
+            "<4s5H3L2H",
+            b"PK\x03\x04",
+            45,
+            0,
+            0,
+            0,
+            0x21,
+            crc,
+            stored,
+            stored,
+            len(name),
+            len(extra),
+        )
+        + name
+        + extra
+    )
+
+
+def _central_header(  # noqa: PLR0913
+    name: bytes, crc: int, size: int, offset: int, extra: bytes
+) -> bytes:
+    stored = min(size, _SATURATED)
+    return (
+        struct.pack(
+            "<4s6H3L5H2L",
+            b"PK\x01\x02",
+            45,
+            45,
+            0,
+            0,
+            0,
+            0x21,
+            crc,
+            stored,
+            stored,
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            0,
+            min(offset, _SATURATED),
+        )
+        + name
+        + extra
+    )
+
+
+def _zip64_extra(*values: int) -> bytes:
+    return struct.pack(f"<2H{len(values)}Q", 1, 8 * len(values), *values)
+
+
+def write_sparse_ota_zip(path: Path, payload_size: int) -> None:
+    """Write an OTA zip with a sparse stored payload.
+
+    :param path: path of the zip
+    :type path: Path
+    :param payload_size: size of ``payload.bin``, in bytes
+    :type payload_size: int
+    """
+    payload_name = b"payload.bin"
+    properties_name = b"payload_properties.txt"
+    # the payload is all zeros, like the holes of the sparse file
+    crc = 0
+    zeros = bytes(_READ_SIZE)
+    for _ in range(payload_size // _READ_SIZE):
+        crc = zlib.crc32(zeros, crc)
+    crc = zlib.crc32(bytes(payload_size % _READ_SIZE), crc)
+    properties_crc = zlib.crc32(_PROPERTIES)
+    with path.open("wb") as file:
+        payload_extra = _zip64_extra(payload_size, payload_size)
+        file.write(_local_header(payload_name, crc, payload_size, payload_extra))
+        file.seek(payload_size, 1)
+        properties_offset = file.tell()
+        file.write(
+            _local_header(properties_name, properties_crc, len(_PROPERTIES), b"")
+        )
+        file.write(_PROPERTIES)
+        cd_offset = file.tell()
+        file.write(
+            _central_header(
+                payload_name,
+                crc,
+                payload_size,
+                0,
+                payload_extra,
+            )
+        )
+        file.write(
+            _central_header(
+                properties_name,
+                properties_crc,
+                len(_PROPERTIES),
+                properties_offset,
+                _zip64_extra(properties_offset),
+            )
+        )
+        cd_size = file.tell() - cd_offset
+        zip64_eocd_offset = file.tell()
+        file.write(
+            struct.pack(
+                "<4sQ2H2L4Q", b"PK\x06\x06", 44, 45, 45, 0, 0, 2, 2, cd_size, cd_offset
+            )
+        )
+        file.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, zip64_eocd_offset, 1))
+        file.write(
+            struct.pack(
+                "<4s4H2LH",
+                b"PK\x05\x06",
+                0,
+                0,
+                2,
+                2,
+                _SATURATED,
+                _SATURATED,
+                0,
+            )
+        )
+
+
+def full_read(path: Path) -> tuple[int, int, str]:
+    """Read the whole zip, then locate the payload with :mod:`zipfile`.
+
+    :param path: path of the OTA zip
+    :type path: Path
+    :return: payload offset, payload size, payload properties
+    :rtype: tuple[int, int, str]
+    """
+    with path.open("rb") as file:
+        while file.read(_READ_SIZE):
+            pass
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo("payload.bin")
+        # local header, name and ZIP64 extra field
+        offset = info.header_offset + 30 + len(info.filename) + 20
+        return offset, info.file_size, archive.read("payload_properties.txt").decode()
+
+
+def _time(function: Callable[[], tuple[int, int, str]], runs: int) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - started) / runs
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Print the time of each payload lookup method.
+
+    :param argv: command line arguments, ``sys.argv`` if None
+    :type argv: list[str] | None
+    :return: exit code
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-gib", type=float, default=5)
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="mobilefarm-bench-") as work_dir:
+        path = Path(work_dir, "ota.zip")
+        write_sparse_ota_zip(path, int(args.size_gib * 1024**3))
+        server = OTAHttpServer(work_dir, host="127.0.0.1", port=0)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+        url = f"http://127.0.0.1:{server.port}/ota.zip"
+        try:
+            expected = full_read(path)
+            methods = {
+                "full read": (lambda: full_read(path), 1),
+                "mmap": (lambda: parse_ota_payload(path), args.runs),
+                "http range": (lambda: parse_ota_payload_url(url), args.runs),
+            }
+            print(  # noqa: T201
+                f"{path.stat().st_size / 1024**3:.1f} GiB zip, payload at "
+                f"offset {expected[0]}, {expected[1]} bytes"
+            )
+            for name, (function, runs) in methods.items():
+                if function() != expected:
+                    err_msg = f"{name} located the payload elsewhere"
+                    raise ValueError(err_msg)
+                print(  # noqa: T201
+                    f"{name:<10} {_time(function, runs) * 1000:>10.3f} ms per call "
+                    f"({runs} calls)"
+                )
+        finally:
+            loop.call_soon_threadsafe(server.close)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,28 @@
 """Mobilefarm ATS device module."""
 
+from __future__ import annotations
+
+import asyncio
 import logging
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 from boardfarm3 import hookimpl
 from boardfarm3.devices.base_devices import LinuxDevice
 from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 from boardfarm3.lib.device_manager import DeviceManager
 
+from mobilefarm.lib.console_pool import DEFAULT_POOL_SIZE, ConsolePool
+from mobilefarm.lib.utils import run_blocking
 from mobilefarm.templates.android import AndroidTemplate
 from mobilefarm.templates.ats import ATSTemplate
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.console_batch import CommandResult
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -26,6 +38,9 @@ class AndroidTestStation(LinuxDevice, ATSTemplate):
         :type cmdline_args: Namespace
         """
         super().__init__(config, cmdline_args)
+        self._console_pool = ConsolePool(
+            self, config.get("console_pool_size", DEFAULT_POOL_SIZE)
+        )
 
     @hookimpl
     def boardfarm_server_boot(self) -> None:
@@ -33,10 +48,17 @@ class AndroidTestStation(LinuxDevice, ATSTemplate):
         _LOGGER.info("Booting %s(%s) device", self.device_name, self.device_type)
         self._connect()
 
+    @hookimpl
+    async def boardfarm_server_boot_async(self) -> None:
+        """Boardfarm hook implementation to boot Android Test Station asynchronously."""
+        _LOGGER.info("Booting %s(%s) device", self.device_name, self.device_type)
+        await self._connect_async()
+
     @hookimpl
     def boardfarm_shutdown_device(self) -> None:
         """Boardfarm hook implementation to shutdown Android Test Station."""
         _LOGGER.info("Shutdown %s(%s) device", self.device_name, self.device_type)
+        self._console_pool.close()
         self._disconnect()
 
     @property
@@ -56,8 +78,70 @@ class AndroidTestStation(LinuxDevice, ATSTemplate):
         """
         return {"android_test_station": self._console}
 
-    def _connect_to_dut(self, dut: AndroidTemplate) -> None:
-        self._console.execute_command(f"adb connect {dut.adb_serial}")
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Execute a command on a console leased from the console pool.
+
+        :param command: command to execute
+        :type command: str
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :return: output of the command
+        :rtype: str
+        """
+        return self._console_pool.execute_command(command, timeout)
+
+    def execute_batch(
+        self,
+        commands: Sequence[str],
+        timeout: int = -1,
+        stop_on_error: bool = False,
+    ) -> list[CommandResult]:
+        """Execute commands in one round trip on a console of the console pool.
+
+        :param commands: shell commands, run in order
+        :type commands: Sequence[str]
+        :param timeout: timeout of the whole batch in seconds, the console
+            default if -1
+        :type timeout: int
+        :param stop_on_error: skip the remaining commands after a failure
+        :type stop_on_error: bool
+        :return: result of every command that ran, in order
+        :rtype: list[CommandResult]
+        """
+        return self._console_pool.execute_batch(commands, timeout, stop_on_error)
+
+    @property
+    def console_round_trips(self) -> int:
+        """Number of console round trips made by the station operations.
+
+        :return: commands and batches executed on the console pool
+        :rtype: int
+        """
+        return self._console_pool.round_trips
+
+    def _dut_groups(
+        self, duts: Sequence[AndroidTemplate]
+    ) -> list[list[AndroidTemplate]]:
+        """Split DUTs into one group per pooled console.
+
+        :param duts: DUTs to split
+        :type duts: Sequence[AndroidTemplate]
+        :return: non-empty groups of DUTs
+        :rtype: list[list[AndroidTemplate]]
+        """
+        size = self._console_pool.size
+        return [list(duts[index::size]) for index in range(min(size, len(duts)))]
+
+    def _connect_to_duts(self, duts: Sequence[AndroidTemplate]) -> None:
+        """Connect adb to DUTs in a single round trip.
+
+        :param duts: DUTs to connect to
+        :type duts: Sequence[AndroidTemplate]
+        """
+        results = self.execute_batch([f"adb connect {dut.adb_serial}" for dut in duts])
+        for result in results:
+            if not result.ok or "connected to" not in result.output:
+                _LOGGER.warning("%s failed: %s", result.command, result.output)
 
     @hookimpl
     def boardfarm_skip_boot(self, device_manager: DeviceManager) -> None:
@@ -68,7 +152,33 @@ class AndroidTestStation(LinuxDevice, ATSTemplate):
             self.device_type,
         )
         self._connect()
-        dut = device_manager.get_device_by_type(
+        duts = device_manager.get_devices_by_type(
             AndroidTemplate,  # type:ignore[type-abstract]
         )
-        self._connect_to_dut(dut)
+        with ThreadPoolExecutor(
+            max_workers=self._console_pool.size, thread_name_prefix="mobilefarm-ats"
+        ) as executor:
+            list(
+                executor.map(
+                    self._connect_to_duts, self._dut_groups(list(duts.values()))
+                )
+            )
+
+    @hookimpl
+    async def boardfarm_skip_boot_async(self, device_manager: DeviceManager) -> None:
+        """Boot Android Test Station asynchronously with skip-boot option."""
+        _LOGGER.info(
+            "Initializing %s(%s) device with skip-boot option",
+            self.device_name,
+            self.device_type,
+        )
+        await self._connect_async()
+        duts = device_manager.get_devices_by_type(
+            AndroidTemplate,  # type:ignore[type-abstract]
+        )
+        await asyncio.gather(
+            *(
+                run_blocking(self._connect_to_duts, group)
+                for group in self._dut_groups(list(duts.values()))
+            )
+        )
@@ -1,22 +1,40 @@
 """MobileFarm Cuttlefish device module."""
 
+from __future__ import annotations
+
 import logging
 import re
-import shlex
 import time
 from argparse import Namespace
+from typing import TYPE_CHECKING, Any, Callable
 
 import pexpect
 from boardfarm3 import hookimpl
 from boardfarm3.devices.base_devices import LinuxDevice
-from boardfarm3.exceptions import DeviceConnectionError
+from boardfarm3.exceptions import DeviceBootFailure
 from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 from boardfarm3.lib.connection_factory import connection_factory
 from boardfarm3.lib.device_manager import DeviceManager
 
+from mobilefarm.lib import adb_transfer
+from mobilefarm.lib.adb_readiness import AdbBootWatcher, BootPhases
+from mobilefarm.lib.adb_transfer import DEFAULT_PARALLELISM
+from mobilefarm.lib.device_descriptor import CuttlefishDescriptor
+from mobilefarm.lib.device_state import DEFAULT_STATE_FILE, DeviceStateStore
+from mobilefarm.lib.update_engine import (
+    UpdateEngineError,
+    UpdateEngineEvent,
+    UpdateEngineMonitor,
+)
+from mobilefarm.lib.utils import run_blocking
 from mobilefarm.templates.android import AndroidTemplate
 from mobilefarm.templates.ota_server import OTAServerTemplate
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.adb_transfer import LocalPath, TransferReport
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -33,17 +51,25 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         """
         super().__init__(config, cmdline_args)
         self._config = config
+        self._descriptor = CuttlefishDescriptor.from_config(config)
         self._console: BoardfarmPexpect
         self._shell_prompt = [r".*\/ \$"]
         self._ota_url: str
+        self._boot_phases: BootPhases | None = None
+        self._last_ota: dict[str, Any] | None = None
+        self._ota_phase_timings: dict[str, float] = {}
+        self._reported_progress: tuple[str | None, int] = (None, -1)
+        self._state_store = DeviceStateStore(
+            config.get("device_state_file", DEFAULT_STATE_FILE)
+        )
 
     def _create_console_connection(self) -> BoardfarmPexpect:
         """Create a console connection instance."""
         return connection_factory(
             connection_type=str(self._config.get("connection_type")),
             connection_name=f"{self.device_name}.console",
-            conn_command=self._conn_parts[0],
-            args=self._conn_parts[1:],
+            conn_command=self._descriptor.conn_command,
+            args=list(self._descriptor.conn_args),
             save_console_logs=self._cmdline_args.save_console_logs,
             shell_prompt=self._shell_prompt,
         )
@@ -65,7 +91,7 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         :return: app package name
         :rtype: str
         """
-        return self._config.get("app_package", "com.android.settings")
+        return self._descriptor.app_package
 
     @property
     def app_activity(self) -> str:
@@ -74,7 +100,7 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         :return: app activity
         :rtype: str
         """
-        return self._config.get("app_activity", ".Settings")
+        return self._descriptor.app_activity
 
     @property
     def console(self) -> BoardfarmPexpect:
@@ -85,6 +111,34 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         """
         return self._console
 
+    @property
+    def boot_phases(self) -> BootPhases | None:
+        """Timestamps of the boot phases of the last reboot.
+
+        :return: boot phases, None if the device was not rebooted
+        :rtype: BootPhases | None
+        """
+        return self._boot_phases
+
+    @property
+    def ota_phase_timings(self) -> dict[str, float]:
+        """Time spent in each update_engine phase during the last OTA update.
+
+        :return: seconds per phase (download, verify, finalize)
+        :rtype: dict[str, float]
+        """
+        return self._ota_phase_timings
+
+    @property
+    def last_ota(self) -> dict[str, Any] | None:
+        """Summary of the OTA update applied during the last boot.
+
+        :return: package kind, source and target builds, duration and time
+            saved by an incremental package, None if no update was applied
+        :rtype: dict[str, Any] | None
+        """
+        return self._last_ota
+
     @property
     def build_id(self) -> str:
         """Returns the build ID of the Cuttlefish image.
@@ -92,7 +146,7 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         :return: build ID
         :rtype: str
         """
-        return self._config["software"]["build_id"]
+        return self._descriptor.build_id
 
     @property
     def target(self) -> str:
@@ -101,7 +155,7 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         :return: target device
         :rtype: str
         """
-        return self._config["software"]["target"]
+        return self._descriptor.target
 
     @property
     def artifact_name(self) -> str:
@@ -110,16 +164,80 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         :return: OTA artifact name
         :rtype: str
         """
-        return f"{self.target.split('-')[0]}-ota-{self.build_id}.zip"
+        return self._descriptor.artifact_name
 
-    @property
-    def _conn_parts(self) -> list[str]:
-        """Return the tokenized connection command.
+    def ota_artifact_name(self, build_id: str) -> str:
+        """Return the full OTA artifact name of a build.
+
+        :param build_id: Build ID to update the device to
+        :type build_id: str
+        :return: OTA artifact name
+        :rtype: str
+        """
+        return f"{self._descriptor.product}-ota-{build_id}.zip"
+
+    def incremental_artifact_name(self, source_build_id: str, build_id: str) -> str:
+        """Return the incremental OTA artifact name from a source build.
+
+        :param source_build_id: Build ID the device currently runs
+        :type source_build_id: str
+        :param build_id: Build ID to update the device to
+        :type build_id: str
+        :return: incremental OTA artifact name
+        :rtype: str
+        """
+        return (
+            f"{self._descriptor.product}-incremental-{source_build_id}-{build_id}.zip"
+        )
+
+    def get_build_info(self) -> dict[str, str]:
+        """Return the fingerprint, build ID and slot the device runs.
+
+        The build ID is read from the ``software.build_id_property`` system
+        property, ``ro.build.version.incremental`` by default, which holds
+        the build server ID on Cuttlefish builds (``ro.build.id`` holds the
+        release tag).
+
+        :return: ``fingerprint``, ``build_id`` and ``slot`` values, empty if
+            unknown
+        :rtype: dict[str, str]
+        """
+        build_property = self._config["software"].get(
+            "build_id_property", "ro.build.version.incremental"
+        )
+        output = self._console.execute_command(
+            f'echo "BUILD|$(getprop ro.build.fingerprint)|'
+            f'$(getprop {build_property})|$(getprop ro.boot.slot_suffix)"'
+        )
+        matches = re.findall(
+            r"BUILD\|([^|\r\n]*)\|([^|\r\n]*)\|([^|\r\n]*)", output
+        )
+        if not matches:
+            return {"fingerprint": "", "build_id": "", "slot": ""}
+        fingerprint, build_id, slot = (value.strip() for value in matches[-1])
+        return {"fingerprint": fingerprint, "build_id": build_id, "slot": slot}
+
+    def _installed_build_id(self, build_info: dict[str, str]) -> str:
+        """Return the build ID the device runs, using its last-known state.
+
+        The system property does not always hold the build ID used to fetch
+        artifacts, so the build ID recorded after the last update applies as
+        long as the device still runs the same fingerprint from the same slot.
 
-        :return: tokenized connection command
-        :rtype: list[str]
+        :param build_info: current fingerprint, build ID and slot
+        :type build_info: dict[str, str]
+        :return: installed build ID, empty if unknown
+        :rtype: str
         """
-        return shlex.split(self._config["conn_cmd"])
+        known = self._state_store.device(self.device_name)
+        if (
+            known.get("build_id")
+            and build_info["fingerprint"]
+            and known.get("fingerprint") == build_info["fingerprint"]
+            and known.get("slot") == build_info["slot"]
+        ):
+            return known["build_id"]
+        return build_info["build_id"]
 
     @property
     def adb_serial(self) -> str:
@@ -128,16 +246,7 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         :return: The ADB target for connecting to the device, in host:port format
         :rtype: str
         """
-        command = shlex.split(self._conn_parts[2])
-        try:
-            connect_index = command.index("connect")
-            return command[connect_index + 1]
-        except (ValueError, IndexError) as exc:
-            err_msg = (
-                f"Unable to extract adb serial from connection command: "
-                f"{self._config['conn_cmd']}"
-            )
-            raise ValueError(err_msg) from exc
+        return self._descriptor.adb_serial
 
     def get_interactive_consoles(self) -> dict[str, BoardfarmPexpect]:
         """Get interactive consoles from device.
@@ -147,6 +256,56 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         """
         return {"cuttlefish": self._console}
 
+    def push(
+        self,
+        sources: LocalPath | Sequence[LocalPath],
+        destination: str,
+        parallelism: int = DEFAULT_PARALLELISM,
+        checksum: bool = False,
+    ) -> TransferReport:
+        """Copy local files and directories to the Cuttlefish device over ADB sync.
+
+        :param sources: local files and directories
+        :type sources: LocalPath | Sequence[LocalPath]
+        :param destination: destination path, or directory if it ends with
+            ``/`` or several sources are given
+        :type destination: str
+        :param parallelism: maximum number of concurrent transfers
+        :type parallelism: int
+        :param checksum: compare digests instead of modification times
+        :type checksum: bool
+        :return: transferred and skipped files
+        :rtype: TransferReport
+        """
+        return adb_transfer.push(
+            self.adb, sources, destination, parallelism, checksum
+        )
+
+    def pull(
+        self,
+        sources: str | Sequence[str],
+        destination: LocalPath,
+        parallelism: int = DEFAULT_PARALLELISM,
+        checksum: bool = False,
+    ) -> TransferReport:
+        """Copy files and directories of the Cuttlefish device over ADB sync.
+
+        :param sources: files and directories on the device
+        :type sources: str | Sequence[str]
+        :param destination: local destination path, or directory if it is an
+            existing directory or several sources are given
+        :type destination: LocalPath
+        :param parallelism: maximum number of concurrent transfers
+        :type parallelism: int
+        :param checksum: compare digests instead of modification times
+        :type checksum: bool
+        :return: transferred and skipped files
+        :rtype: TransferReport
+        """
+        return adb_transfer.pull(
+            self.adb, sources, destination, parallelism, checksum
+        )
+
     @hookimpl
     def boardfarm_skip_boot(self) -> None:
         """Boot Cuttlefish with skip-boot option."""
@@ -157,6 +316,16 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         )
         self._connect_to_console()
 
+    @hookimpl
+    async def boardfarm_skip_boot_async(self) -> None:
+        """Boot Cuttlefish asynchronously with skip-boot option."""
+        _LOGGER.info(
+            "Initializing %s(%s) device with skip-boot option",
+            self.device_name,
+            self.device_type,
+        )
+        await run_blocking(self._connect_to_console)
+
     @hookimpl
     def boardfarm_shutdown_device(self) -> None:
         """Boardfarm hook implementation to shutdown Cuttlefish."""
@@ -175,28 +344,267 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
             self.device_name,
             self.device_type,
         )
+        self._boot(device_manager)
+
+    @hookimpl
+    async def boardfarm_device_boot_async(self, device_manager: DeviceManager) -> None:
+        """Boot cuttlefish device asynchronously and trigger OTA update if configured.
+
+        Device boot hooks run after the server boot hooks, so the OTA server is
+        ready by the time the Cuttlefish devices request their packages. The
+        console work of each device runs on its own worker thread, so a whole
+        fleet boots in about the time of its slowest device.
+
+        :param device_manager: device manager instance
+        :type device_manager: DeviceManager
+        """
+        _LOGGER.info(
+            "Booting %s(%s) device",
+            self.device_name,
+            self.device_type,
+        )
+        await run_blocking(self._boot, device_manager)
+
+    def _boot(self, device_manager: DeviceManager) -> None:
+        """Connect to the device and apply the configured OTA update.
+
+        :param device_manager: device manager instance
+        :type device_manager: DeviceManager
+        """
         ota_server = device_manager.get_device_by_type(
             OTAServerTemplate,  # type:ignore[type-abstract]
         )
         self._connect_to_console()
-        self._ota_url, self._ota_offset, self._ota_size, self._ota_properties = (
-            ota_server.serve_ota_package(
+        self.apply_ota(ota_server)
+
+    def apply_ota(
+        self,
+        ota_server: OTAServerTemplate,
+        build_id: str | None = None,
+        on_event: Callable[[UpdateEngineEvent], None] | None = None,
+    ) -> bool:
+        """Update the device to a build over OTA, unless it already runs it.
+
+        The console must be connected.
+
+        :param ota_server: OTA server serving the packages
+        :type ota_server: OTAServerTemplate
+        :param build_id: Build ID to update the device to, the configured
+            build if None
+        :type build_id: str | None
+        :param on_event: callable receiving the update_engine status updates
+        :type on_event: Callable[[UpdateEngineEvent], None] | None
+        :return: True if an update was applied, False if it was skipped
+        :rtype: bool
+        """
+        build_id = build_id or self.build_id
+        secondary_payload = self._config.get("secondary_payload", False)
+        build_info = self.get_build_info()
+        source_build_id = self._installed_build_id(build_info)
+        if source_build_id == build_id and not self._config["software"].get(
+            "force_ota", False
+        ):
+            _LOGGER.info(
+                "%s already runs build %s (%s), skipping OTA",
+                self.device_name,
+                build_id,
+                build_info["fingerprint"],
+            )
+            self._last_ota = None
+            self._state_store.update_device(
+                self.device_name, **{**build_info, "build_id": build_id}
+            )
+            return False
+        served = None
+        artifact_name = self.incremental_artifact_name(source_build_id, build_id)
+        if (
+            self._config["software"].get("incremental_ota", True)
+            and source_build_id
+            and source_build_id != build_id
+            and not self._incremental_unusable(source_build_id, build_id)
+        ):
+            served = ota_server.serve_incremental_ota_package(
                 target=self.target,
-                build_id=self.build_id,
-                artifact_name=self.artifact_name,
-                secondary_payload=self._config.get("secondary_payload", False),
+                source_build_id=source_build_id,
+                build_id=build_id,
+                artifact_name=artifact_name,
+                secondary_payload=secondary_payload,
             )
-        )
-        self._trigger_ota_update()
+        kind = "full" if served is None else "incremental"
+        started = time.monotonic()
+        if served is not None:
+            try:
+                self._apply_served_ota(
+                    ota_server, served, build_id, artifact_name, on_event
+                )
+            except UpdateEngineError as exc:
+                _LOGGER.warning(
+                    "Incremental OTA %s failed on %s, retrying with the full "
+                    "package: %s",
+                    artifact_name,
+                    self.device_name,
+                    exc,
+                )
+                self._mark_incremental_unusable(source_build_id, build_id)
+                served = None
+                kind = "full"
+                started = time.monotonic()
+        if served is None:
+            artifact_name = self.ota_artifact_name(build_id)
+            served = ota_server.serve_ota_package(
+                target=self.target,
+                build_id=build_id,
+                artifact_name=artifact_name,
+                secondary_payload=secondary_payload,
+            )
+            try:
+                self._apply_served_ota(
+                    ota_server, served, build_id, artifact_name, on_event
+                )
+            except UpdateEngineError as exc:
+                err_msg = f"OTA update of {self.device_name} failed: {exc}"
+                raise DeviceBootFailure(err_msg) from exc
         self._wait_for_reboot()
+        updated_info = self.get_build_info()
+        if updated_info["slot"] and updated_info["slot"] == build_info["slot"]:
+            _LOGGER.warning(
+                "%s still boots from slot %s after the OTA",
+                self.device_name,
+                updated_info["slot"],
+            )
+        # the reflash invalidates the app versions cached by provision_apps
+        self._state_store.update_device(
+            self.device_name, **{**updated_info, "build_id": build_id}, apps={}
+        )
+        self._record_ota(kind, source_build_id, build_id, time.monotonic() - started)
+        return True
+
+    def _apply_served_ota(
+        self,
+        ota_server: OTAServerTemplate,
+        served: tuple[str, int, int, bytes],
+        build_id: str,
+        artifact_name: str,
+        on_event: Callable[[UpdateEngineEvent], None] | None,
+    ) -> None:
+        """Apply a served OTA package and release it on the OTA server.
+
+        :param ota_server: OTA server serving the package
+        :type ota_server: OTAServerTemplate
+        :param served: URL of the served OTA package, payload offset, payload
+            size, payload properties
+        :type served: tuple[str, int, int, bytes]
+        :param build_id: Build ID of the package
+        :type build_id: str
+        :param artifact_name: Name of the OTA artifact
+        :type artifact_name: str
+        :param on_event: callable receiving the update_engine status updates
+        :type on_event: Callable[[UpdateEngineEvent], None] | None
+        """
+        self._ota_url, self._ota_offset, self._ota_size, self._ota_properties = served
+        try:
+            self._trigger_ota_update(on_event)
+        finally:
+            ota_server.release_ota_package(self.target, build_id, artifact_name)
+
+    def _incremental_unusable(self, source_build_id: str, build_id: str) -> bool:
+        """Tell whether an incremental package failed to apply before.
+
+        :param source_build_id: Build ID the package updates from
+        :type source_build_id: str
+        :param build_id: Build ID the package updates to
+        :type build_id: str
+        :return: True if the package failed on a device of the host
+        :rtype: bool
+        """
+        unusable = self._state_store.read().get("unusable_incrementals", {})
+        return f"{source_build_id}:{build_id}" in unusable.get(self.target, [])
+
+    def _mark_incremental_unusable(self, source_build_id: str, build_id: str) -> None:
+        """Record that an incremental package failed to apply.
+
+        The devices of the host update from the full package instead.
+
+        :param source_build_id: Build ID the package updates from
+        :type source_build_id: str
+        :param build_id: Build ID the package updates to
+        :type build_id: str
+        """
+        with self._state_store.update() as state:
+            unusable = state.setdefault("unusable_incrementals", {}).setdefault(
+                self.target, []
+            )
+            if f"{source_build_id}:{build_id}" not in unusable:
+                unusable.append(f"{source_build_id}:{build_id}")
+
+    def _record_ota(
+        self, kind: str, source_build_id: str, build_id: str, seconds: float
+    ) -> None:
+        """Record the duration of an OTA update in the device state store.
+
+        The time saved by an incremental package is estimated against the
+        last full update of the same target on any device of the host.
+
+        :param kind: "full" or "incremental"
+        :type kind: str
+        :param source_build_id: Build ID the device ran before the update
+        :type source_build_id: str
+        :param build_id: Build ID the device was updated to
+        :type build_id: str
+        :param seconds: duration of the update and reboot, in seconds
+        :type seconds: float
+        """
+        with self._state_store.update() as state:
+            durations = state.setdefault("ota_durations", {}).setdefault(
+                self.target, {}
+            )
+            full_seconds = durations.get("full")
+            durations[kind] = seconds
+            time_saved = (
+                max(full_seconds - seconds, 0.0)
+                if kind == "incremental" and full_seconds is not None
+                else None
+            )
+            self._last_ota = {
+                "kind": kind,
+                "source_build_id": source_build_id,
+                "build_id": build_id,
+                "seconds": seconds,
+                "payload_bytes": self._ota_size,
+                "phases": self._ota_phase_timings,
+                "time_saved": time_saved,
+            }
+            device = state.setdefault("devices", {}).setdefault(self.device_name, {})
+            device["last_ota"] = self._last_ota
+            device["total_time_saved"] = device.get("total_time_saved", 0.0) + (
+                time_saved or 0.0
+            )
+        _LOGGER.info(
+            "%s OTA of %s from %s to %s took %.0fs%s",
+            kind.capitalize(),
+            self.device_name,
+            source_build_id or "unknown build",
+            build_id,
+            seconds,
+            f", {time_saved:.0f}s less than the last full OTA"
+            if time_saved is not None
+            else "",
+        )
 
-    def _trigger_ota_update(self) -> None:
+    def _trigger_ota_update(
+        self, on_event: Callable[[UpdateEngineEvent], None] | None = None
+    ) -> None:
         """Trigger A/B OTA update using update_engine_client.
 
         Parses the OTA zip locally to extract payload offset, size and
         payload_properties headers. The device fetches the zip directly
         from the OTA server over HTTP using the --http-url pattern from
         the AOSP ota_from_target_files script.
+
+        :param on_event: callable receiving the update_engine status updates
+        :type on_event: Callable[[UpdateEngineEvent], None] | None
+        :raises DeviceBootFailure: if the update stalls or times out
+        :raises UpdateEngineError: if update_engine fails to apply the payload
         """
         self._console.execute_command("stty cols 10000")
         update_cmd = (
@@ -213,11 +621,54 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
             self._ota_offset,
             self._ota_size,
         )
-        success_pattern = re.escape(
-            "onPayloadApplicationComplete(ErrorCode::kSuccess (0))"
-        )
+
+        def _on_event(event: UpdateEngineEvent) -> None:
+            self._log_ota_progress(event)
+            if on_event is not None:
+                on_event(event)
+
+        monitor = UpdateEngineMonitor(on_event=_on_event)
+        self._reported_progress = (None, -1)
         self._console.sendline(update_cmd)
-        self._console.expect(success_pattern, timeout=1800)
+        try:
+            monitor.follow(
+                self._console,
+                stall_timeout=self._config.get("ota_stall_timeout", 300),
+                timeout=self._config.get("ota_timeout", 1800),
+                prompts=self._shell_prompt,
+            )
+        except TimeoutError as exc:
+            self._console.sendcontrol("c")
+            err_msg = f"OTA update of {self.device_name} failed: {exc}"
+            raise DeviceBootFailure(err_msg) from exc
+        finally:
+            self._ota_phase_timings = monitor.phase_timings
+        _LOGGER.info(
+            "%s OTA phases: %s",
+            self.device_name,
+            ", ".join(
+                f"{phase} {seconds:.0f}s"
+                for phase, seconds in self._ota_phase_timings.items()
+            ),
+        )
+
+    def _log_ota_progress(self, event: UpdateEngineEvent) -> None:
+        """Log update_engine progress on every phase change and every 10%.
+
+        :param event: update_engine status update
+        :type event: UpdateEngineEvent
+        """
+        step = int(event.progress * 10)
+        if (event.status, step) == self._reported_progress:
+            return
+        self._reported_progress = event.status, step
+        _LOGGER.info(
+            "%s OTA: %s %.0f%% after %.0fs",
+            self.device_name,
+            event.phase or event.status,
+            event.progress * 100,
+            event.elapsed,
+        )
 
     def _wait_for_reboot(self) -> None:
         """Reboot into the updated slot and wait for the shell prompt."""
@@ -226,38 +677,26 @@ class CuttleFish(LinuxDevice, AndroidTemplate):
         self._console.expect([pexpect.EOF, pexpect.TIMEOUT], timeout=10)
         self._console.close()
         self._wait_for_adb_online(timeout=600)
-        self._connect_to_console()
-        _LOGGER.info("Device back online after OTA, build_id=%s", self.build_id)
+        _LOGGER.info("%s back online after OTA", self.device_name)
 
     def _wait_for_adb_online(self, timeout: int = 300) -> None:
-        """Wait for the device to be online over ADB.
+        """Wait for the device to finish booting and reconnect the console.
 
         :param timeout: maximum time to wait for the device to be online, in seconds
         :type timeout: int
         """
         _LOGGER.info("Waiting for %s to be online over ADB", self.device_name)
-
-        deadline = time.monotonic() + timeout
-        poll_interval = 5
-
-        while time.monotonic() < deadline:
-            try:
-                probe = self._create_console_connection()
-                probe.login_to_server()
-                probe.sendline("uptime")
-                index = probe.expect(self._shell_prompt, timeout=5)
-                if index == 0:
-                    _LOGGER.info("%s is online over ADB", self.device_name)
-                    probe.close()
-                    return
-            except DeviceConnectionError as e:
-                _LOGGER.warning(
-                    "Waiting for device %s to be online over ADB: %s",
-                    self.device_name,
-                    str(e),
-                )
-            finally:
-                probe.close()
-            time.sleep(poll_interval)
-        err_msg = f"Timed out waiting for {self.device_name} to be online over ADB after {timeout} seconds"
-        raise TimeoutError(err_msg)
+        watcher = AdbBootWatcher(self.adb_serial)
+        if not watcher.wait_for_disconnect():
+            _LOGGER.warning("%s did not drop off ADB after reboot", self.device_name)
+        self._boot_phases = watcher.wait_for_boot(timeout=timeout)
+        self._connect_to_console()
+        self._boot_phases.shell_ready = time.monotonic()
+        _LOGGER.info(
+            "%s boot phases: %s",
+            self.device_name,
+            ", ".join(
+                f"{phase} after {elapsed:.1f}s"
+                for phase, elapsed in self._boot_phases.durations().items()
+            ),
+        )
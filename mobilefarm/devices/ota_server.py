@@ -1,17 +1,51 @@
 """MobileFarm OTA server module."""
 
+from __future__ import annotations
+
 import ast
+import json
 import logging
+import re
+import shlex
+import threading
 from argparse import Namespace
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING
 
+import pexpect
 from boardfarm3 import hookimpl
 from boardfarm3.devices.base_devices import LinuxDevice
 from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 
+from mobilefarm.lib import ota_download, ota_http_server
+from mobilefarm.lib.console_pool import DEFAULT_POOL_SIZE, ConsolePool
+from mobilefarm.lib.ota_cache import (
+    DEFAULT_CACHE_BUDGET_GB,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_SERVE_DIR,
+    OTAArtifactCache,
+)
+from mobilefarm.lib.ota_zip import parse_ota_payload, parse_ota_payload_url
+from mobilefarm.lib.utils import run_blocking
 from mobilefarm.templates.ota_server import OTAServerTemplate
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from types import ModuleType
+
+    from mobilefarm.lib.console_batch import CommandResult
+
 _LOGGER = logging.getLogger(__name__)
 
+_HTTP_SERVER_PID_FILE = "/tmp/mobilefarm_ota_http_server.pid"  # noqa: S108
+_HTTP_SERVER_LOG_FILE = "/tmp/mobilefarm_ota_http_server.log"  # noqa: S108
+_STOP_HTTP_SERVER_COMMAND = (
+    f"test -f {_HTTP_SERVER_PID_FILE} && "
+    f"kill $(cat {_HTTP_SERVER_PID_FILE}) 2>/dev/null; "
+    f"rm -f {_HTTP_SERVER_PID_FILE}"
+)
+
 
 class OTAServer(LinuxDevice, OTAServerTemplate):
     """MobileFarm OTA server device."""
@@ -25,17 +59,54 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
         :type cmdline_args: Namespace
         """
         super().__init__(config, cmdline_args)
+        # fetches, cache operations and metadata parses of concurrently
+        # booting Cuttlefish devices each lease a console of the pool
+        self._console_pool = ConsolePool(
+            self, config.get("console_pool_size", DEFAULT_POOL_SIZE)
+        )
+        # operations on one artifact are serialized, other artifacts proceed
+        self._artifact_locks: dict[str, threading.Lock] = {}
+        self._artifact_locks_lock = threading.Lock()
+        # concurrent serve_ota_package calls for one package share a fetch
+        self._ota_in_flight: dict[tuple, Future] = {}
+        self._ota_in_flight_lock = threading.Lock()
+        self._serve_dir = config.get("ota_serve_dir", DEFAULT_SERVE_DIR)
+        self._ota_cache = OTAArtifactCache(
+            self,
+            cache_dir=config.get("ota_cache_dir", DEFAULT_CACHE_DIR),
+            serve_dir=self._serve_dir,
+            budget_bytes=int(
+                config.get("ota_cache_budget_gb", DEFAULT_CACHE_BUDGET_GB) * 1024**3
+            ),
+            verify_on_hit=config.get("ota_cache_verify_on_hit", False),
+        )
+        self._ota_metadata: dict[tuple[str, bool], tuple[int, int, str]] = {}
+        # local mount of the serving directory, e.g. when the OTA server is
+        # the boardfarm host itself or its serving directory is NFS-mounted
+        self._local_serve_dir = config.get("ota_local_serve_dir")
+        self._installed_helpers: set[str] = set()
+        self._missing_incrementals: set[tuple[str, str, str]] = set()
 
     @hookimpl
     def boardfarm_server_boot(self) -> None:
         """Boardfarm hook implementation to boot OTA server."""
         _LOGGER.info("Booting %s(%s) device", self.device_name, self.device_type)
         self._connect()
+        self._start_http_server()
+
+    @hookimpl
+    async def boardfarm_server_boot_async(self) -> None:
+        """Boardfarm hook implementation to boot OTA server asynchronously."""
+        _LOGGER.info("Booting %s(%s) device", self.device_name, self.device_type)
+        await self._connect_async()
+        await run_blocking(self._start_http_server)
 
     @hookimpl
     def boardfarm_shutdown_device(self) -> None:
         """Boardfarm hook implementation to shutdown OTA server."""
         _LOGGER.info("Shutdown %s(%s) device", self.device_name, self.device_type)
+        self._stop_http_server()
+        self._console_pool.close()
         self._disconnect()
 
     @property
@@ -47,6 +118,56 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
         """
         return self._console
 
+    @property
+    def ota_cache_stats(self) -> dict[str, int]:
+        """OTA artifact cache hit and miss counts.
+
+        :return: hits and misses of the OTA artifact cache
+        :rtype: dict[str, int]
+        """
+        return self._ota_cache.stats
+
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Execute a command on a console leased from the console pool.
+
+        :param command: command to execute
+        :type command: str
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :return: output of the command
+        :rtype: str
+        """
+        return self._console_pool.execute_command(command, timeout)
+
+    def execute_batch(
+        self,
+        commands: Sequence[str],
+        timeout: int = -1,
+        stop_on_error: bool = False,
+    ) -> list[CommandResult]:
+        """Execute commands in one round trip on a console of the console pool.
+
+        :param commands: shell commands, run in order
+        :type commands: Sequence[str]
+        :param timeout: timeout of the whole batch in seconds, the console
+            default if -1
+        :type timeout: int
+        :param stop_on_error: skip the remaining commands after a failure
+        :type stop_on_error: bool
+        :return: result of every command that ran, in order
+        :rtype: list[CommandResult]
+        """
+        return self._console_pool.execute_batch(commands, timeout, stop_on_error)
+
+    @property
+    def console_round_trips(self) -> int:
+        """Number of console round trips made by the OTA server operations.
+
+        :return: commands and batches executed on the console pool
+        :rtype: int
+        """
+        return self._console_pool.round_trips
+
     def get_interactive_consoles(self) -> dict[str, BoardfarmPexpect]:
         """Get interactive consoles from device.
 
@@ -55,10 +176,87 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
         """
         return {"ota_server": self._console}
 
+    def ota_http_stats(self) -> dict[str, dict[str, float]]:
+        """Per-device transfer statistics of the managed OTA HTTP server.
+
+        :return: statistics per client address, empty if the managed server
+            is not enabled
+        :rtype: dict[str, dict[str, float]]
+        """
+        if not self._config.get("ota_http_server", False):
+            return {}
+        port = self._config.get("ota_http_port", 80)
+        output = self.execute_command(
+            f"curl -s http://127.0.0.1:{port}{ota_http_server.STATS_PATH}"
+        )
+        try:
+            return json.loads(output)
+        except ValueError:
+            _LOGGER.warning("Invalid OTA HTTP server statistics: %s", output)
+            return {}
+
+    def _start_http_server(self) -> None:
+        """Launch the managed OTA HTTP server if enabled with ``ota_http_server``.
+
+        The server serves the serving directory on ``ota_http_port`` and is
+        restarted if already running, e.g. from a previous session.
+
+        :raises ValueError: if the server exits right after starting
+        """
+        if not self._config.get("ota_http_server", False):
+            return
+        script = self._install_helper(
+            ota_http_server,
+            self._config.get(
+                "ota_http_server_path",
+                "/tmp/mobilefarm_ota_http_server.py",  # noqa: S108
+            ),
+        )
+        port = self._config.get("ota_http_port", 80)
+        command = (
+            f"python3 {shlex.quote(script)} --root {shlex.quote(self._serve_dir)} "
+            f"--port {port} "
+            f"--max-connections {self._config.get('ota_http_max_connections', 256)} "
+            f"--max-connections-per-client "
+            f"{self._config.get('ota_http_max_connections_per_client', 8)} "
+            f"--client-rate-mib {self._config.get('ota_http_client_rate_mib', 0)}"
+        )
+        _, result = self.execute_batch(
+            [
+                _STOP_HTTP_SERVER_COMMAND,
+                f"nohup {command} > {_HTTP_SERVER_LOG_FILE} 2>&1 & "
+                f"echo $! > {_HTTP_SERVER_PID_FILE}; sleep 1; "
+                f"kill -0 $(cat {_HTTP_SERVER_PID_FILE}) || "
+                f"{{ cat {_HTTP_SERVER_LOG_FILE}; false; }}",
+            ]
+        )
+        if not result.ok:
+            err_msg = (
+                f"Failed to start the OTA HTTP server on port {port}: {result.output}"
+            )
+            raise ValueError(err_msg)
+        _LOGGER.info("OTA HTTP server serving %s on port %s", self._serve_dir, port)
+
+    def _stop_http_server(self) -> None:
+        """Stop the managed OTA HTTP server if it is running."""
+        if not self._config.get("ota_http_server", False):
+            return
+        self.execute_command(_STOP_HTTP_SERVER_COMMAND)
+
     def fetch_ota_package(
         self, target: str, build_id: str, artifact_name: str, output: str
-    ) -> None:
-        """Fetch OTA package from using `fetch_artifact` CLI command.
+    ) -> str | None:
+        """Fetch OTA package with the range downloader or `fetch_artifact`.
+
+        If the ``ota_artifact_url`` config key holds a URL template, the
+        package is downloaded with parallel, resumable HTTP range requests,
+        checked against the size announced by the build server, and the
+        digest computed by the downloader is returned.
+        `fetch_artifact` is the fallback if the template is missing or the
+        download fails. Either way, the package is checked against the digest
+        published at the ``ota_artifact_sha256_url`` URL template, if set.
+        The fetch runs on a console leased from the console pool, so that it
+        does not hold up the other operations on the OTA server.
 
         :param target: Target device
         :type target: str
@@ -68,15 +266,224 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
         :type artifact_name: str
         :param output: Output file name for the fetched OTA package
         :type output: str
-        :raises NotImplementedError: if not implemented
+        :return: SHA-256 digest the package was verified against, None if it
+            was fetched with `fetch_artifact` without an expected digest
+        :rtype: str | None
+        :raises ValueError: if the package cannot be fetched
+        :raises pexpect.TIMEOUT: if ``fetch_artifact`` does not complete in
+            ``ota_fetch_timeout`` seconds
         """
-        result = self._console.execute_command(
-            f"test -f {output} && echo EXISTS || echo MISSING", timeout=10
+        with self._console_pool.lease() as console:
+            return self._fetch_ota_package(
+                console, target, build_id, artifact_name, output
+            )
+
+    def _fetch_ota_package(  # noqa: PLR0913
+        self,
+        console: BoardfarmPexpect,
+        target: str,
+        build_id: str,
+        artifact_name: str,
+        output: str,
+    ) -> str | None:
+        commands = []
+        fields = {
+            "target": target,
+            "build_id": build_id,
+            "artifact_name": artifact_name,
+        }
+        checksum_template = self._config.get("ota_artifact_sha256_url")
+        checksum = (
+            self._fetch_checksum(console, checksum_template.format(**fields))
+            if checksum_template
+            else None
         )
-        if "EXISTS" in result:
-            return
-        fetch_command = f"fetch_artifact -target {target} -build_id {build_id} -artifact {artifact_name} -output {output}"
-        self._console.execute_command(fetch_command, timeout=60)
+        url_template = self._config.get("ota_artifact_url")
+        if url_template is not None:
+            try:
+                return self._download_ota_package(
+                    console, url_template.format(**fields), output, checksum
+                )
+            except (ValueError, pexpect.TIMEOUT) as exc:
+                _LOGGER.warning(
+                    "Range download of %s failed, falling back to fetch_artifact: %s",
+                    artifact_name,
+                    exc,
+                )
+                commands.append(
+                    f"rm -f {shlex.quote(output)} {shlex.quote(output + '.ranges')}"
+                )
+        quoted = shlex.quote(output)
+        commands.append(
+            f"test -f {quoted} || fetch_artifact -target {shlex.quote(target)} "
+            f"-build_id {shlex.quote(build_id)} "
+            f"-artifact {shlex.quote(artifact_name)} -output {quoted}"
+        )
+        if checksum is not None:
+            commands.append(
+                f'[ "$(sha256sum {quoted} | cut -d" " -f1)" = {checksum} ] || '
+                f"{{ echo SHA-256 mismatch, expected {checksum}; "
+                f"rm -f {quoted}; false; }}"
+            )
+        results = self._console_pool.execute_batch(
+            commands,
+            timeout=self._config.get("ota_fetch_timeout", 60),
+            stop_on_error=True,
+            console=console,
+        )
+        if len(results) != len(commands) or not results[-1].ok:
+            err_msg = f"Failed to fetch {artifact_name}: {results[-1].output.strip()}"
+            raise ValueError(err_msg)
+        return checksum
+
+    def _fetch_checksum(self, console: BoardfarmPexpect, checksum_url: str) -> str:
+        """Fetch the expected SHA-256 digest of an OTA package.
+
+        :param console: console leased for the fetch
+        :type console: BoardfarmPexpect
+        :param checksum_url: URL of the expected SHA-256 digest
+        :type checksum_url: str
+        :return: lowercase hexadecimal SHA-256 digest
+        :rtype: str
+        :raises ValueError: if the URL does not hold a SHA-256 digest
+        """
+        checksum = self._console_pool.execute_command(
+            f"curl -fsSL {shlex.quote(checksum_url)} | cut -d' ' -f1",
+            timeout=30,
+            console=console,
+        ).strip()
+        if not re.fullmatch(r"[0-9a-fA-F]{64}", checksum):
+            err_msg = f"Invalid SHA-256 digest from {checksum_url}: {checksum}"
+            raise ValueError(err_msg)
+        return checksum.lower()
+
+    def serve_incremental_ota_package(  # noqa: PLR0913
+        self,
+        target: str,
+        source_build_id: str,
+        build_id: str,
+        artifact_name: str,
+        secondary_payload: bool = False,
+    ) -> tuple[str, int, int, bytes] | None:
+        """Serve an incremental OTA package if the build server has one.
+
+        The package is fetched and cached like a full package. Packages that
+        cannot be fetched, because the build server has none or the fetch
+        fails or times out, are remembered for the session so that other
+        devices fall back to the full package right away.
+
+        :param target: Target device
+        :type target: str
+        :param source_build_id: Build ID the device currently runs
+        :type source_build_id: str
+        :param build_id: Build ID to update the device to
+        :type build_id: str
+        :param artifact_name: Name of the incremental OTA artifact to fetch
+        :type artifact_name: str
+        :param secondary_payload: Use secondary payload entries if True
+        :type secondary_payload: bool
+        :return: URL of the served OTA package, payload offset, payload size,
+            payload properties, or None if no incremental package is available
+        :rtype: tuple[str, int, int, bytes] | None
+        """
+        key = (target, build_id, artifact_name)
+        if key in self._missing_incrementals:
+            return None
+        try:
+            return self.serve_ota_package(
+                target, build_id, artifact_name, secondary_payload
+            )
+        except (ValueError, pexpect.TIMEOUT) as exc:
+            _LOGGER.info(
+                "No incremental OTA package %s from %s: %s",
+                artifact_name,
+                source_build_id,
+                exc,
+            )
+            self._missing_incrementals.add(key)
+            return None
+
+    def _install_helper(self, module: ModuleType, path: str) -> str:
+        """Copy a standalone mobilefarm module to the OTA server, once per session.
+
+        :param module: module to copy
+        :type module: ModuleType
+        :param path: destination path on the OTA server
+        :type path: str
+        :return: path of the module on the OTA server
+        :rtype: str
+        """
+        if path not in self._installed_helpers:
+            self.scp_local_file_to_device(module.__file__, path)
+            self._installed_helpers.add(path)
+        return path
+
+    def _download_ota_package(
+        self,
+        console: BoardfarmPexpect,
+        url: str,
+        output: str,
+        checksum: str | None,
+    ) -> str:
+        """Download an OTA package on the OTA server with the range downloader.
+
+        Progress lines printed by the downloader are read from the console
+        and logged. The download fails if no progress is reported for
+        ``ota_download_stall_timeout`` seconds.
+
+        :param console: console leased for the download
+        :type console: BoardfarmPexpect
+        :param url: URL of the OTA package
+        :type url: str
+        :param output: path of the downloaded package on the OTA server
+        :type output: str
+        :param checksum: expected SHA-256 digest, optional
+        :type checksum: str | None
+        :return: SHA-256 digest of the downloaded package
+        :rtype: str
+        :raises ValueError: if the download fails
+        """
+        downloader = self._config.get(
+            "ota_downloader_path", "/tmp/mobilefarm_ota_download.py"  # noqa: S108
+        )
+        command = (
+            f"python3 {shlex.quote(self._install_helper(ota_download, downloader))} "
+            f"--connections {self._config.get('ota_download_connections', 4)} "
+        )
+        if checksum is not None:
+            command += f"--sha256 {checksum} "
+        command += f"{shlex.quote(url)} {shlex.quote(output)}"
+        stall_timeout = self._config.get("ota_download_stall_timeout", 120)
+        _LOGGER.info("Downloading %s to %s", url, output)
+        console.sendline(command)
+        try:
+            while True:
+                index = console.expect(
+                    [
+                        r"PROGRESS (\d+) (\d+)",
+                        r"DOWNLOAD (OK|FAILED)([^\r\n]*)",
+                    ],
+                    timeout=stall_timeout,
+                )
+                if index == 1:
+                    break
+                done, total = (int(value) for value in console.match.groups())
+                _LOGGER.info(
+                    "Downloaded %d/%s MiB of %s",
+                    done // 1024**2,
+                    total // 1024**2 if total else "?",
+                    url,
+                )
+        except pexpect.TIMEOUT:
+            console.sendcontrol("c")
+            console.expect(self._shell_prompt)
+            raise
+        status, detail = console.match.groups()
+        console.expect(self._shell_prompt)
+        if status != "OK":
+            err_msg = f"Failed to download {url}:{detail}"
+            raise ValueError(err_msg)
+        return detail.strip()
 
     @hookimpl
     def boardfarm_skip_boot(self) -> None:
@@ -87,21 +494,152 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
             self.device_type,
         )
         self._connect()
+        self._start_http_server()
+
+    @hookimpl
+    async def boardfarm_skip_boot_async(self) -> None:
+        """Boot OTA server asynchronously with skip-boot option."""
+        _LOGGER.info(
+            "Initializing %s(%s) device with skip-boot option",
+            self.device_name,
+            self.device_type,
+        )
+        await self._connect_async()
+        await run_blocking(self._start_http_server)
 
     def _parse_ota_metadata(
         self, artifact_name: str, secondary: bool
-    ) -> tuple[int, int, list[str]]:
+    ) -> tuple[int, int, str]:
+        """Parse the OTA metadata in-process if the OTA zip is reachable.
+
+        The OTA zip is memory mapped from ``ota_local_serve_dir`` if set, or
+        read with HTTP range requests from its served URL if
+        ``ota_metadata_over_http`` is set, which is the default with the
+        managed OTA HTTP server. Otherwise, or if both fail, the parser runs
+        on the OTA server.
+
+        :param artifact_name: path of the OTA zip on the OTA server
+        :type artifact_name: str
+        :param secondary: use the secondary payload entries if True
+        :type secondary: bool
+        :return: payload offset, payload size, payload properties
+        :rtype: tuple[int, int, str]
+        """
+        if self._local_serve_dir is not None:
+            local_path = Path(self._local_serve_dir) / Path(artifact_name).name
+            if local_path.is_file():
+                return parse_ota_payload(local_path, secondary)
+            _LOGGER.warning("%s is not reachable locally", local_path)
+        if self._config.get(
+            "ota_metadata_over_http", self._config.get("ota_http_server", False)
+        ):
+            url = self._served_url(Path(artifact_name).name)
+            try:
+                return parse_ota_payload_url(url, secondary, timeout=10)
+            except (OSError, ValueError) as exc:
+                _LOGGER.warning("Failed to parse %s over HTTP: %s", url, exc)
+        return self._parse_ota_metadata_remote(artifact_name, secondary)
+
+    def _served_url(self, artifact_name: str) -> str:
+        """Return the URL an OTA package is served at.
+
+        :param artifact_name: name of the OTA artifact
+        :type artifact_name: str
+        :return: URL of the artifact on the OTA HTTP server
+        :rtype: str
+        """
+        server_ip = self._config["ipaddr"]
+        port = self._config.get("ota_http_port", 80)
+        return f"http://{server_ip}:{port}/{artifact_name}"
+
+    def _parse_ota_metadata_remote(
+        self, artifact_name: str, secondary: bool
+    ) -> tuple[int, int, str]:
+        """Run the OTA metadata parser on the OTA server.
+
+        The parser may print either a JSON object with ``offset``, ``size``
+        and ``properties`` keys or the legacy ``offset, size, b'...'`` line.
+
+        :param artifact_name: path of the OTA zip on the OTA server
+        :type artifact_name: str
+        :param secondary: use the secondary payload entries if True
+        :type secondary: bool
+        :return: payload offset, payload size, payload properties
+        :rtype: tuple[int, int, str]
+        """
         secondary_flag = "--secondary" if secondary else ""
-        output = self._console.execute_command(
+        output = self.execute_command(
             f"python3 /usr/local/bin/parse_ota_metadata.py "
             f"{artifact_name} {secondary_flag}",
             timeout=30,
         )
-        offset, size, headers_raw = output.split(",", 2)
-        headers_raw = ast.literal_eval(headers_raw.strip())
-        headers_raw += b"USER_AGENT=Dalvik (something, something)\n"
-        headers_raw += b"NETWORK_ID=0\n"
-        return int(offset.strip()), int(size.strip()), headers_raw.decode("utf-8")
+        try:
+            metadata = json.loads(output)
+        except ValueError:
+            offset, size, headers_raw = output.split(",", 2)
+            headers = ast.literal_eval(headers_raw.strip()).decode("utf-8")
+            return int(offset.strip()), int(size.strip()), headers
+        return int(metadata["offset"]), int(metadata["size"]), metadata["properties"]
+
+    def _get_ota_metadata(
+        self, cached_path: str, ota_zip_path: str, secondary: bool
+    ) -> tuple[int, int, str]:
+        """Return the payload metadata of an OTA zip, parsing it only once.
+
+        Parsed metadata is memoized in memory and in a sidecar next to the
+        cached artifact, keyed by the artifact digest and the payload kind.
+
+        :param cached_path: path of the OTA zip in the artifact cache
+        :type cached_path: str
+        :param ota_zip_path: path of the published OTA zip
+        :type ota_zip_path: str
+        :param secondary: use the secondary payload entries if True
+        :type secondary: bool
+        :return: payload offset, payload size, payload properties
+        :rtype: tuple[int, int, str]
+        """
+        digest = self._ota_cache.digest(cached_path)
+        if (digest, secondary) in self._ota_metadata:
+            return self._ota_metadata[digest, secondary]
+        index = self._ota_cache.read_metadata(cached_path)
+        index_key = f"{digest}:{'secondary' if secondary else 'primary'}"
+        entry = index.get(index_key)
+        if entry is None:
+            offset, size, properties = self._parse_ota_metadata(
+                ota_zip_path, secondary
+            )
+            index[index_key] = {
+                "offset": offset,
+                "size": size,
+                "properties": properties,
+            }
+            self._ota_cache.write_metadata(cached_path, index)
+        else:
+            offset, size, properties = (
+                entry["offset"],
+                entry["size"],
+                entry["properties"],
+            )
+        self._ota_metadata[digest, secondary] = offset, size, properties
+        return offset, size, properties
+
+    def _artifact_lock(
+        self, target: str, build_id: str, artifact_name: str
+    ) -> threading.Lock:
+        """Return the lock serializing the cache operations on one artifact.
+
+        :param target: Target device
+        :type target: str
+        :param build_id: Build ID of the OTA package
+        :type build_id: str
+        :param artifact_name: Name of the OTA artifact
+        :type artifact_name: str
+        :return: lock of the artifact
+        :rtype: threading.Lock
+        """
+        path = self._ota_cache.path_for(target, build_id, artifact_name)
+        with self._artifact_locks_lock:
+            return self._artifact_locks.setdefault(path, threading.Lock())
 
     def serve_ota_package(
         self,
@@ -112,6 +650,11 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
     ) -> tuple[str, int, int, bytes]:
         """Fetch OTA package and place it in /tftpboot for serving.
 
+        Concurrent calls for the same package share a single fetch: the first
+        caller serves the package and the others wait for its result. The
+        package stays leased in the artifact cache, and is not evicted, until
+        :meth:`release_ota_package` is called once per successful call.
+
         :param target: Target device
         :type target: str
         :param build_id: Build ID of the OTA package to fetch
@@ -124,21 +667,99 @@ class OTAServer(LinuxDevice, OTAServerTemplate):
             payload properties
         :rtype: tuple[str, int, int, bytes]
         """
-        self.fetch_ota_package(
-            target=target,
-            build_id=build_id,
-            artifact_name=artifact_name,
-            output=artifact_name,
-        )
-        self._console.execute_command(f"mv {artifact_name} /tftpboot/")
-        self._console.execute_command(f"chmod 644 /tftpboot/{artifact_name}")
+        path = self._ota_cache.path_for(target, build_id, artifact_name)
+        self._ota_cache.acquire(path)
+        try:
+            return self._serve_single_flight(
+                target, build_id, artifact_name, secondary_payload
+            )
+        except BaseException:
+            self._ota_cache.release(path)
+            raise
+
+    def release_ota_package(
+        self, target: str, build_id: str, artifact_name: str
+    ) -> None:
+        """Release the cache lease taken by :meth:`serve_ota_package`.
 
-        ota_zip_path = f"/tftpboot/{artifact_name}"
-        offset, size, properties = self._parse_ota_metadata(
-            ota_zip_path, secondary_payload
+        :param target: Target device
+        :type target: str
+        :param build_id: Build ID of the OTA package
+        :type build_id: str
+        :param artifact_name: Name of the OTA artifact
+        :type artifact_name: str
+        """
+        self._ota_cache.release(
+            self._ota_cache.path_for(target, build_id, artifact_name)
         )
 
-        server_ip = self._config["ipaddr"]
-        port = self._config.get("ota_http_port", 80)
-        url = f"http://{server_ip}:{port}/{artifact_name}"
-        return url, offset, size, properties
+    def _serve_single_flight(
+        self,
+        target: str,
+        build_id: str,
+        artifact_name: str,
+        secondary_payload: bool,
+    ) -> tuple[str, int, int, bytes]:
+        key = (target, build_id, artifact_name, secondary_payload)
+        with self._ota_in_flight_lock:
+            future = self._ota_in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._ota_in_flight[key] = Future()
+        if not leader:
+            _LOGGER.info("Waiting for the in-flight fetch of %s", artifact_name)
+            return future.result()
+        try:
+            result = self._serve_ota_package(
+                target, build_id, artifact_name, secondary_payload
+            )
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._ota_in_flight_lock:
+                del self._ota_in_flight[key]
+        future.set_result(result)
+        return result
+
+    def _serve_ota_package(
+        self,
+        target: str,
+        build_id: str,
+        artifact_name: str,
+        secondary_payload: bool,
+    ) -> tuple[str, int, int, bytes]:
+        """Fetch OTA package through the artifact cache and publish it for serving.
+
+        :param target: Target device
+        :type target: str
+        :param build_id: Build ID of the OTA package to fetch
+        :type build_id: str
+        :param artifact_name: Name of the OTA artifact to fetch
+        :type artifact_name: str
+        :param secondary_payload: Use secondary payload entries if True
+        :type secondary_payload: bool
+        :return: URL of the served OTA package, payload offset, payload size,
+            payload properties
+        :rtype: tuple[str, int, int, bytes]
+        """
+        with self._artifact_lock(target, build_id, artifact_name):
+            cached_path = self._ota_cache.ensure(
+                target,
+                build_id,
+                artifact_name,
+                fetch=lambda output: self.fetch_ota_package(
+                    target=target,
+                    build_id=build_id,
+                    artifact_name=artifact_name,
+                    output=output,
+                ),
+            )
+            ota_zip_path = self._ota_cache.publish(cached_path)
+            offset, size, properties = self._get_ota_metadata(
+                cached_path, ota_zip_path, secondary_payload
+            )
+        properties += "USER_AGENT=Dalvik (something, something)\n"
+        properties += "NETWORK_ID=0\n"
+
+        return self._served_url(artifact_name), offset, size, properties
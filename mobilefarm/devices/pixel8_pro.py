@@ -9,13 +9,20 @@ from boardfarm3 import hookimpl
 from boardfarm3.devices.base_devices import LinuxDevice
 from boardfarm3.lib.connection_factory import connection_factory
 
+from mobilefarm.lib import adb_transfer
+from mobilefarm.lib.adb_transfer import DEFAULT_PARALLELISM
+from mobilefarm.lib.device_descriptor import AndroidDeviceDescriptor
+from mobilefarm.lib.utils import run_blocking
 from mobilefarm.templates.android import AndroidTemplate
 
 if TYPE_CHECKING:
     from argparse import Namespace
+    from collections.abc import Sequence
 
     from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 
+    from mobilefarm.lib.adb_transfer import LocalPath, TransferReport
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -32,6 +39,7 @@ class Pixel8Pro(LinuxDevice, AndroidTemplate):
         """
         super().__init__(config, cmdline_args)
         self._config = config
+        self._descriptor = AndroidDeviceDescriptor.from_config(config)
         self._console: BoardfarmPexpect | None = None
         self._shell_prompt = [r".*\/ \$"]
 
@@ -39,7 +47,7 @@ class Pixel8Pro(LinuxDevice, AndroidTemplate):
         self._console = connection_factory(
             connection_type=str(self._config.get("connection_type")),
             connection_name=f"{self.device_name}.console",
-            conn_command=self._config["conn_cmd"][0],
+            conn_command=self._descriptor.conn_command,
             save_console_logs=self._cmdline_args.save_console_logs,
             shell_prompt=self._shell_prompt,
         )
@@ -72,10 +80,24 @@ class Pixel8Pro(LinuxDevice, AndroidTemplate):
         self._disconnect()
 
     @hookimpl
-    def boardfarm_server_boot_async(self) -> None:
+    async def boardfarm_server_boot_async(self) -> None:
         """Boot Google Pixel 8 Pro asynchronously."""
-        err_msg = "Asynchronous boot not supported for Pixel 8 Pro"
-        raise NotImplementedError(err_msg)
+        _LOGGER.info(
+            "Booting %s(%s) device",
+            self.device_name,
+            self.device_type,
+        )
+        await run_blocking(self._connect_to_console)
+
+    @hookimpl
+    async def boardfarm_skip_boot_async(self) -> None:
+        """Boot Google Pixel 8 Pro asynchronously with skip-boot option."""
+        _LOGGER.info(
+            "Initializing %s(%s) device with skip-boot option",
+            self.device_name,
+            self.device_type,
+        )
+        await run_blocking(self._connect_to_console)
 
     @property
     def console(self) -> BoardfarmPexpect:
@@ -103,12 +125,72 @@ class Pixel8Pro(LinuxDevice, AndroidTemplate):
         """
         return self._config
 
+    @property
+    def adb_serial(self) -> str:
+        """Return the ADB serial number of the device.
+
+        :return: ADB serial number taken from the ``-s`` option of the
+            connection command
+        :rtype: str
+        """
+        return self._descriptor.adb_serial
+
     @property
     def app_package(self) -> str:
         """Device app package."""
-        return self._config.get("app_package", "com.android.settings")
+        return self._descriptor.app_package
 
     @property
     def app_activity(self) -> str:
         """Device app activity."""
-        return self._config.get("app_activity", ".Settings")
+        return self._descriptor.app_activity
+
+    def push(
+        self,
+        sources: LocalPath | Sequence[LocalPath],
+        destination: str,
+        parallelism: int = DEFAULT_PARALLELISM,
+        checksum: bool = False,
+    ) -> TransferReport:
+        """Copy local files and directories to the Pixel 8 Pro over ADB sync.
+
+        :param sources: local files and directories
+        :type sources: LocalPath | Sequence[LocalPath]
+        :param destination: destination path, or directory if it ends with
+            ``/`` or several sources are given
+        :type destination: str
+        :param parallelism: maximum number of concurrent transfers
+        :type parallelism: int
+        :param checksum: compare digests instead of modification times
+        :type checksum: bool
+        :return: transferred and skipped files
+        :rtype: TransferReport
+        """
+        return adb_transfer.push(
+            self.adb, sources, destination, parallelism, checksum
+        )
+
+    def pull(
+        self,
+        sources: str | Sequence[str],
+        destination: LocalPath,
+        parallelism: int = DEFAULT_PARALLELISM,
+        checksum: bool = False,
+    ) -> TransferReport:
+        """Copy files and directories of the Pixel 8 Pro over ADB sync.
+
+        :param sources: files and directories on the device
+        :type sources: str | Sequence[str]
+        :param destination: local destination path, or directory if it is an
+            existing directory or several sources are given
+        :type destination: LocalPath
+        :param parallelism: maximum number of concurrent transfers
+        :type parallelism: int
+        :param checksum: compare digests instead of modification times
+        :type checksum: bool
+        :return: transferred and skipped files
+        :rtype: TransferReport
+        """
+        return adb_transfer.pull(
+            self.adb, sources, destination, parallelism, checksum
+        )
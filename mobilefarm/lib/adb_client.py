@@ -0,0 +1,635 @@
+"""Mobilefarm ADB server protocol client.
+
+The client talks to the adb server over its TCP smart socket, the same way
+the ``adb`` command line tool does, instead of driving ``adb shell`` through
+a pexpect console. Shell commands return their exit code without any prompt
+matching, and files move over the ``sync:`` service in binary chunks.
+
+Each request is a 4-digit hexadecimal length followed by the service name,
+answered with ``OKAY`` or ``FAIL`` and a length-prefixed message. Device
+services are requested on a connection first switched to the device with
+``host:transport:<serial>``.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import socket
+import stat
+import struct
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_ADB_SERVER_HOST = "127.0.0.1"
+DEFAULT_ADB_SERVER_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+SYNC_DATA_MAX = 64 * 1024
+
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+_SHELL_EXIT = 3
+_SHELL_HEADER = struct.Struct("<BI")
+_SYNC_HEADER = struct.Struct("<4sI")
+_SYNC_STAT = struct.Struct("<4sIII")
+# id, error, dev, ino, mode, nlink, uid, gid, size, atime, mtime, ctime
+_SYNC_STAT_V2 = struct.Struct("<4sIQQIIIIQqqq")
+_LEGACY_EXIT_MARKER = b"__mobilefarm_exit__:"
+
+
+class AdbError(Exception):
+    """The adb server or device refused a request."""
+
+
+@dataclass(frozen=True)
+class ShellResult:
+    """Outcome of a shell command run over ADB."""
+
+    exit_code: int
+    stdout: bytes
+    stderr: bytes
+
+    @property
+    def ok(self) -> bool:
+        """Whether the command succeeded.
+
+        :return: True if the exit code is 0
+        :rtype: bool
+        """
+        return self.exit_code == 0
+
+    @property
+    def output(self) -> str:
+        """Decoded standard output followed by standard error.
+
+        :return: command output, stripped
+        :rtype: str
+        """
+        return (self.stdout + self.stderr).decode("utf-8", "replace").strip()
+
+
+@dataclass(frozen=True)
+class FileStat:
+    """Mode, size and modification time of a file on a device."""
+
+    mode: int
+    size: int
+    mtime: int
+
+    @property
+    def exists(self) -> bool:
+        """Whether the file exists.
+
+        :return: False if the device reported an all-zero stat
+        :rtype: bool
+        """
+        return self.mode != 0
+
+    @property
+    def is_dir(self) -> bool:
+        """Whether the file is a directory.
+
+        :return: True for a directory
+        :rtype: bool
+        """
+        return stat.S_ISDIR(self.mode)
+
+
+class AdbClient:
+    """Client of an adb server."""
+
+    def __init__(
+        self,
+        host: str = DEFAULT_ADB_SERVER_HOST,
+        port: int = DEFAULT_ADB_SERVER_PORT,
+        timeout: float = 30,
+    ) -> None:
+        """Initialize the client.
+
+        :param host: adb server host
+        :type host: str
+        :param port: adb server port
+        :type port: int
+        :param timeout: socket timeout of every request, in seconds
+        :type timeout: float
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def version(self) -> int:
+        """Return the protocol version of the adb server.
+
+        :return: adb server version
+        :rtype: int
+        """
+        return int(self._host_query("host:version"), 16)
+
+    def devices(self) -> dict[str, str]:
+        """Return the devices known to the adb server.
+
+        :return: state of every device, by serial
+        :rtype: dict[str, str]
+        """
+        devices = {}
+        for line in self._host_query("host:devices").splitlines():
+            serial, _, state = line.partition("\t")
+            if serial:
+                devices[serial] = state.strip()
+        return devices
+
+    def connect(self, address: str) -> str:
+        """Connect the adb server to a network device.
+
+        :param address: device address, host:port
+        :type address: str
+        :return: message of the adb server
+        :rtype: str
+        :raises AdbError: if the connection failed
+        """
+        message = self._host_query(f"host:connect:{address}")
+        if "connected to" not in message:
+            err_msg = f"Failed to connect to {address}: {message}"
+            raise AdbError(err_msg)
+        return message
+
+    def disconnect(self, address: str) -> str:
+        """Disconnect the adb server from a network device.
+
+        :param address: device address, host:port
+        :type address: str
+        :return: message of the adb server
+        :rtype: str
+        """
+        return self._host_query(f"host:disconnect:{address}")
+
+    def get_state(self, serial: str) -> str:
+        """Return the state of a device.
+
+        :param serial: device serial
+        :type serial: str
+        :return: device state, e.g. device, offline or recovery
+        :rtype: str
+        """
+        return self._host_query(f"host-serial:{serial}:get-state")
+
+    def features(self, serial: str) -> set[str]:
+        """Return the features shared by the adb server and a device.
+
+        :param serial: device serial
+        :type serial: str
+        :return: feature names, e.g. shell_v2 or stat_v2
+        :rtype: set[str]
+        """
+        features = self._host_query(f"host-serial:{serial}:features")
+        return {feature for feature in features.split(",") if feature}
+
+    def device(self, serial: str) -> AdbDevice:
+        """Return a handle on a device.
+
+        :param serial: device serial, host:port for network devices
+        :type serial: str
+        :return: device handle
+        :rtype: AdbDevice
+        """
+        return AdbDevice(self, serial)
+
+    def open(self, service: str, serial: str | None = None) -> socket.socket:
+        """Open a connection to a service.
+
+        :param service: service name
+        :type service: str
+        :param serial: device the service runs on, a host service if None
+        :type serial: str | None
+        :return: connected socket, owned by the caller
+        :rtype: socket.socket
+        """
+        connection = socket.create_connection((self.host, self.port), self.timeout)
+        try:
+            if serial is not None:
+                _request(connection, f"host:transport:{serial}")
+            _request(connection, service)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def _host_query(self, service: str) -> str:
+        with contextlib.closing(self.open(service)) as connection:
+            return _read_message(connection)
+
+
+class AdbDevice:
+    """Shell and file transfer services of one device.
+
+    Every call opens its own connection to the adb server, so a device
+    handle can be shared by threads.
+    """
+
+    def __init__(self, client: AdbClient, serial: str) -> None:
+        """Initialize the device handle.
+
+        :param client: client of the adb server the device is attached to
+        :type client: AdbClient
+        :param serial: device serial
+        :type serial: str
+        """
+        self.client = client
+        self.serial = serial
+        self._features: set[str] | None = None
+
+    @property
+    def features(self) -> set[str]:
+        """Features shared by the adb server and the device, queried once.
+
+        :return: feature names
+        :rtype: set[str]
+        """
+        if self._features is None:
+            self._features = self.client.features(self.serial)
+        return self._features
+
+    def shell(self, command: str, timeout: float | None = None) -> ShellResult:
+        """Run a shell command on the device.
+
+        The shell v2 protocol separates stdout and stderr and carries the
+        exit code. Devices without it get the exit code appended to the
+        output behind a marker, and their stderr mixed in stdout.
+
+        :param command: shell command
+        :type command: str
+        :param timeout: maximum duration of the command in seconds, the
+            client timeout if None
+        :type timeout: float | None
+        :return: exit code and output of the command
+        :rtype: ShellResult
+        :raises TimeoutError: if the command does not complete in time
+        """
+        if timeout is None:
+            timeout = self.client.timeout
+        deadline = time.monotonic() + timeout
+        if "shell_v2" in self.features:
+            connection = self.client.open(f"shell,v2,raw:{command}", self.serial)
+            with contextlib.closing(connection):
+                return _read_shell_v2(connection, deadline, command)
+        connection = self.client.open(
+            f"shell:{command}; echo {_LEGACY_EXIT_MARKER.decode()}$?", self.serial
+        )
+        with contextlib.closing(connection):
+            output = _read_until_eof(connection, deadline, command)
+        body, marker, exit_code = output.rpartition(_LEGACY_EXIT_MARKER)
+        if not marker:
+            return ShellResult(exit_code=-1, stdout=output, stderr=b"")
+        exit_code = exit_code.strip()
+        return ShellResult(
+            exit_code=int(exit_code) if exit_code.isdigit() else -1,
+            stdout=body.replace(b"\r\n", b"\n"),
+            stderr=b"",
+        )
+
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Run a shell command and return its output, like a console would.
+
+        :param command: shell command
+        :type command: str
+        :param timeout: timeout in seconds, the client timeout if -1
+        :type timeout: int
+        :return: standard output and standard error of the command
+        :rtype: str
+        """
+        return self.shell(command, None if timeout == -1 else timeout).output
+
+    @contextlib.contextmanager
+    def sync(self) -> Generator[SyncSession, None, None]:
+        """Open a file transfer session on the device.
+
+        :yields: sync session, closed on exit
+        """
+        session = SyncSession(
+            self.client.open("sync:", self.serial), "stat_v2" in self.features
+        )
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def stat(self, path: str) -> FileStat:
+        """Return the stat of a file on the device.
+
+        :param path: path on the device
+        :type path: str
+        :return: file stat, all zero if the file does not exist
+        :rtype: FileStat
+        """
+        with self.sync() as session:
+            return session.stat(path)
+
+    def push(
+        self, local: str | os.PathLike, remote: str, mode: int | None = None
+    ) -> int:
+        """Copy a local file to the device.
+
+        :param local: local file
+        :type local: str | os.PathLike
+        :param remote: destination path on the device
+        :type remote: str
+        :param mode: permissions of the file on the device, those of the
+            local file if None
+        :type mode: int | None
+        :return: number of bytes sent
+        :rtype: int
+        """
+        with self.sync() as session:
+            return session.push(local, remote, mode)
+
+    def pull(self, remote: str, local: str | os.PathLike) -> int:
+        """Copy a file of the device to a local file.
+
+        :param remote: path on the device
+        :type remote: str
+        :param local: local destination file
+        :type local: str | os.PathLike
+        :return: number of bytes received
+        :rtype: int
+        """
+        with self.sync() as session:
+            return session.pull(remote, local)
+
+
+class SyncSession:
+    """``sync:`` service connection, carrying any number of transfers."""
+
+    def __init__(self, connection: socket.socket, stat_v2: bool = False) -> None:
+        """Initialize the session.
+
+        :param connection: connection on which the sync service was opened
+        :type connection: socket.socket
+        :param stat_v2: use the 64-bit ``STA2`` stat request, needed for
+            files of 4 GiB and more
+        :type stat_v2: bool
+        """
+        self._connection = connection
+        self._stat_v2 = stat_v2
+
+    def stat(self, path: str) -> FileStat:
+        """Return the stat of a file on the device.
+
+        :param path: path on the device
+        :type path: str
+        :return: file stat, all zero if the file does not exist
+        :rtype: FileStat
+        :raises AdbError: if the device answers with an unexpected packet
+        """
+        if self._stat_v2:
+            self._send_request(b"STA2", path.encode())
+            fields = _SYNC_STAT_V2.unpack(
+                _recv_exact(self._connection, _SYNC_STAT_V2.size)
+            )
+            reply, error = fields[0], fields[1]
+            mode, size, mtime = fields[4], fields[8], fields[10]
+            if error:
+                mode = size = mtime = 0
+        else:
+            self._send_request(b"STAT", path.encode())
+            reply, mode, size, mtime = _SYNC_STAT.unpack(
+                _recv_exact(self._connection, _SYNC_STAT.size)
+            )
+        if reply not in (b"STAT", b"STA2"):
+            err_msg = f"Unexpected reply {reply!r} to the stat of {path}"
+            raise AdbError(err_msg)
+        return FileStat(mode=mode, size=size, mtime=mtime)
+
+    def push(
+        self, local: str | os.PathLike, remote: str, mode: int | None = None
+    ) -> int:
+        """Stream a local file to the device in chunks.
+
+        The modification time of the local file is set on the device copy,
+        so that unchanged files can be recognized with :meth:`stat`.
+
+        :param local: local file
+        :type local: str | os.PathLike
+        :param remote: destination path on the device
+        :type remote: str
+        :param mode: permissions of the file on the device, those of the
+            local file if None
+        :type mode: int | None
+        :return: number of bytes sent
+        :rtype: int
+        """
+        with open(local, "rb") as file:
+            local_stat = os.fstat(file.fileno())
+            if mode is None:
+                mode = stat.S_IMODE(local_stat.st_mode)
+            return self.push_stream(
+                file, remote, stat.S_IFREG | mode, int(local_stat.st_mtime)
+            )
+
+    def push_stream(self, file: BinaryIO, remote: str, mode: int, mtime: int) -> int:
+        """Stream the content of a file object to the device.
+
+        :param file: readable binary file object
+        :type file: BinaryIO
+        :param remote: destination path on the device
+        :type remote: str
+        :param mode: file type and permissions of the file on the device
+        :type mode: int
+        :param mtime: modification time of the file on the device
+        :type mtime: int
+        :return: number of bytes sent
+        :rtype: int
+        :raises AdbError: if the device refuses the file
+        """
+        self._send_request(b"SEND", f"{remote},{mode}".encode())
+        sent = 0
+        while True:
+            chunk = file.read(SYNC_DATA_MAX)
+            if not chunk:
+                break
+            self._connection.sendall(_SYNC_HEADER.pack(b"DATA", len(chunk)) + chunk)
+            sent += len(chunk)
+        self._connection.sendall(_SYNC_HEADER.pack(b"DONE", mtime))
+        reply, length = _SYNC_HEADER.unpack(
+            _recv_exact(self._connection, _SYNC_HEADER.size)
+        )
+        if reply != b"OKAY":
+            message = _recv_exact(self._connection, length).decode("utf-8", "replace")
+            err_msg = f"Failed to push {remote}: {message}"
+            raise AdbError(err_msg)
+        return sent
+
+    def pull(self, remote: str, local: str | os.PathLike) -> int:
+        """Stream a file of the device to a local file.
+
+        The data is written to a temporary sibling file, renamed over the
+        destination once complete.
+
+        :param remote: path on the device
+        :type remote: str
+        :param local: local destination file
+        :type local: str | os.PathLike
+        :return: number of bytes received
+        :rtype: int
+        """
+        partial = f"{os.fspath(local)}.partial"
+        try:
+            with open(partial, "wb") as file:
+                received = self.pull_stream(remote, file)
+            os.replace(partial, local)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(partial)
+            raise
+        return received
+
+    def pull_stream(self, remote: str, file: BinaryIO) -> int:
+        """Stream a file of the device into a file object.
+
+        :param remote: path on the device
+        :type remote: str
+        :param file: writable binary file object
+        :type file: BinaryIO
+        :return: number of bytes received
+        :rtype: int
+        :raises AdbError: if the device cannot send the file
+        """
+        self._send_request(b"RECV", remote.encode())
+        received = 0
+        while True:
+            reply, length = _SYNC_HEADER.unpack(
+                _recv_exact(self._connection, _SYNC_HEADER.size)
+            )
+            if reply == b"DONE":
+                return received
+            if reply != b"DATA":
+                message = _recv_exact(self._connection, length).decode(
+                    "utf-8", "replace"
+                )
+                err_msg = f"Failed to pull {remote}: {message}"
+                raise AdbError(err_msg)
+            file.write(_recv_exact(self._connection, length))
+            received += length
+
+    def close(self) -> None:
+        """End the session."""
+        with contextlib.suppress(OSError):
+            self._connection.sendall(_SYNC_HEADER.pack(b"QUIT", 0))
+        self._connection.close()
+
+    def _send_request(self, request: bytes, path: bytes) -> None:
+        self._connection.sendall(_SYNC_HEADER.pack(request, len(path)) + path)
+
+
+def _request(connection: socket.socket, service: str) -> None:
+    """Send a service request and check that it is accepted.
+
+    :param connection: connection to the adb server
+    :type connection: socket.socket
+    :param service: service name
+    :type service: str
+    :raises AdbError: if the request is refused
+    """
+    payload = service.encode()
+    connection.sendall(f"{len(payload):04x}".encode() + payload)
+    status = _recv_exact(connection, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        err_msg = f"{service}: {_read_message(connection)}"
+        raise AdbError(err_msg)
+    err_msg = f"Unexpected adb server status {status!r} for {service}"
+    raise AdbError(err_msg)
+
+
+def _read_message(connection: socket.socket) -> str:
+    length = int(_recv_exact(connection, 4), 16)
+    return _recv_exact(connection, length).decode("utf-8", "replace")
+
+
+def _recv_exact(connection: socket.socket, size: int) -> bytes:
+    """Receive exactly size bytes.
+
+    :param connection: connected socket
+    :type connection: socket.socket
+    :param size: number of bytes
+    :type size: int
+    :return: received bytes
+    :rtype: bytes
+    :raises AdbError: if the connection closes first
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(min(size - len(data), 1024 * 1024))
+        if not chunk:
+            err_msg = f"adb connection closed after {len(data)}/{size} bytes"
+            raise AdbError(err_msg)
+        data += chunk
+    return bytes(data)
+
+
+def _set_deadline(connection: socket.socket, deadline: float, command: str) -> None:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        err_msg = f"Shell command timed out: {command}"
+        raise TimeoutError(err_msg)
+    connection.settimeout(remaining)
+
+
+def _read_shell_v2(
+    connection: socket.socket, deadline: float, command: str
+) -> ShellResult:
+    """Read shell v2 packets until the exit packet.
+
+    :param connection: connection of the shell service
+    :type connection: socket.socket
+    :param deadline: monotonic time by which the command must exit
+    :type deadline: float
+    :param command: shell command, for error messages
+    :type command: str
+    :return: exit code and output of the command
+    :rtype: ShellResult
+    :raises TimeoutError: if the command does not exit in time
+    :raises AdbError: if the connection closes before the exit packet
+    """
+    stdout = bytearray()
+    stderr = bytearray()
+    try:
+        while True:
+            _set_deadline(connection, deadline, command)
+            packet_id, length = _SHELL_HEADER.unpack(
+                _recv_exact(connection, _SHELL_HEADER.size)
+            )
+            data = _recv_exact(connection, length)
+            if packet_id == _SHELL_STDOUT:
+                stdout += data
+            elif packet_id == _SHELL_STDERR:
+                stderr += data
+            elif packet_id == _SHELL_EXIT:
+                return ShellResult(
+                    exit_code=data[0] if data else -1,
+                    stdout=bytes(stdout),
+                    stderr=bytes(stderr),
+                )
+    except socket.timeout as exc:
+        err_msg = f"Shell command timed out: {command}"
+        raise TimeoutError(err_msg) from exc
+
+
+def _read_until_eof(connection: socket.socket, deadline: float, command: str) -> bytes:
+    output = bytearray()
+    try:
+        while True:
+            _set_deadline(connection, deadline, command)
+            chunk = connection.recv(SYNC_DATA_MAX)
+            if not chunk:
+                return bytes(output)
+            output += chunk
+    except socket.timeout as exc:
+        err_msg = f"Shell command timed out: {command}"
+        raise TimeoutError(err_msg) from exc
@@ -0,0 +1,157 @@
+"""Mobilefarm ADB boot readiness watcher."""
+
+from __future__ import annotations
+
+import logging
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+_BOOT_COMPLETED_LOOP = (
+    'while [ "$(getprop sys.boot_completed)" != "1" ]; do sleep 1; done; echo ready'
+)
+
+
+@dataclass
+class BootPhases:
+    """Monotonic timestamps of the boot phases of an Android device."""
+
+    started: float = field(default_factory=time.monotonic)
+    adb_visible: float | None = None
+    boot_completed: float | None = None
+    shell_ready: float | None = None
+
+    def durations(self) -> dict[str, float]:
+        """Return the time from the start of the wait to each reached phase.
+
+        :return: mapping of phase name to seconds since the start
+        :rtype: dict[str, float]
+        """
+        phases = {
+            "adb_visible": self.adb_visible,
+            "boot_completed": self.boot_completed,
+            "shell_ready": self.shell_ready,
+        }
+        return {
+            name: timestamp - self.started
+            for name, timestamp in phases.items()
+            if timestamp is not None
+        }
+
+
+class AdbBootWatcher:
+    """Wait for an Android device to come back after a reboot.
+
+    Rather than logging in to a fresh console every few seconds, the watcher
+    blocks in ``adb wait-for-device`` until the device is visible to the adb
+    server and then in a single ``adb shell`` that returns as soon as
+    ``sys.boot_completed`` is set. Each step is retried with exponential
+    backoff and jitter while the device is still going down or coming up.
+    """
+
+    def __init__(
+        self,
+        serial: str,
+        adb: str = "adb",
+        initial_delay: float = 0.5,
+        max_delay: float = 10.0,
+    ) -> None:
+        """Initialize the watcher.
+
+        :param serial: ADB serial, host:port for network devices
+        :type serial: str
+        :param adb: adb executable
+        :type adb: str
+        :param initial_delay: first retry delay, in seconds
+        :type initial_delay: float
+        :param max_delay: maximum retry delay, in seconds
+        :type max_delay: float
+        """
+        self._serial = serial
+        self._adb = adb
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+
+    def wait_for_disconnect(self, timeout: float = 60) -> bool:
+        """Wait until the device drops off ADB, e.g. after a reboot request.
+
+        Without this a device that has not gone down yet would still report
+        the ``sys.boot_completed`` of the previous boot.
+
+        :param timeout: maximum time to wait, in seconds
+        :type timeout: float
+        :return: True if the device disconnected in time
+        :rtype: bool
+        """
+        output = self._run(
+            "-s", self._serial, "wait-for-disconnect", timeout=timeout
+        )
+        return output is not None
+
+    def wait_for_boot(self, timeout: float = 300) -> BootPhases:
+        """Wait until the device is visible over ADB and has finished booting.
+
+        :param timeout: maximum time to wait, in seconds
+        :type timeout: float
+        :return: timestamps of the reached boot phases
+        :rtype: BootPhases
+        :raises TimeoutError: if the device does not finish booting in time
+        """
+        phases = BootPhases()
+        deadline = phases.started + timeout
+        self._retry(self._wait_for_device, deadline)
+        phases.adb_visible = time.monotonic()
+        _LOGGER.info("%s is visible over ADB", self._serial)
+        self._retry(self._wait_for_boot_completed, deadline)
+        phases.boot_completed = time.monotonic()
+        _LOGGER.info("%s has completed boot", self._serial)
+        return phases
+
+    def _retry(self, step: Callable[[float], bool], deadline: float) -> None:
+        delay = self._initial_delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                err_msg = (
+                    f"Timed out waiting for {self._serial} to be online over ADB"
+                )
+                raise TimeoutError(err_msg)
+            if step(remaining):
+                return
+            time.sleep(min(delay * random.uniform(0.5, 1.5), remaining))  # noqa: S311
+            delay = min(delay * 2, self._max_delay)
+
+    def _run(self, *args: str, timeout: float) -> str | None:
+        try:
+            result = subprocess.run(  # noqa: S603
+                [self._adb, *args],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                check=False,
+            )
+        except subprocess.TimeoutExpired:
+            return None
+        if result.returncode != 0:
+            _LOGGER.debug("adb %s failed: %s", " ".join(args), result.stderr.strip())
+            return None
+        return result.stdout
+
+    def _wait_for_device(self, remaining: float) -> bool:
+        if ":" in self._serial:
+            # network devices have to be reconnected after a reboot
+            self._run("connect", self._serial, timeout=min(remaining, 10))
+        output = self._run(
+            "-s", self._serial, "wait-for-device", timeout=min(remaining, 30)
+        )
+        return output is not None
+
+    def _wait_for_boot_completed(self, remaining: float) -> bool:
+        output = self._run(
+            "-s", self._serial, "shell", _BOOT_COMPLETED_LOOP, timeout=remaining
+        )
+        return output is not None and "ready" in output
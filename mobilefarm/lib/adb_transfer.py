@@ -0,0 +1,402 @@
+"""Mobilefarm parallel file transfers to and from Android devices."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import posixpath
+import queue
+import shlex
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from operator import methodcaller
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Tuple, Union
+
+from mobilefarm.lib.adb_client import AdbError
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.adb_client import AdbDevice, FileStat, SyncSession
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PARALLELISM = 4
+
+LocalPath = Union[str, "os.PathLike[str]"]
+# name, size and callable transferring one file over a sync session
+_Transfer = Tuple[str, int, Callable[["SyncSession"], int]]
+
+
+@dataclass
+class TransferReport:
+    """Files copied or skipped by a push or a pull."""
+
+    transferred: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    bytes_transferred: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Transfer throughput.
+
+        :return: bytes per second, 0 if nothing was transferred
+        :rtype: float
+        """
+        return self.bytes_transferred / self.seconds if self.seconds else 0.0
+
+
+def push(
+    adb: AdbDevice,
+    sources: LocalPath | Sequence[LocalPath],
+    destination: str,
+    parallelism: int = DEFAULT_PARALLELISM,
+    checksum: bool = False,
+) -> TransferReport:
+    """Copy local files and directories to a device.
+
+    A single file is copied to ``destination`` unless it ends with ``/``.
+    Otherwise every source is copied into the ``destination`` directory,
+    directories with their whole tree. Files whose copy on the device has
+    the same size and modification time, or the same SHA-256 digest if
+    ``checksum`` is set, are skipped. The others are streamed over up to
+    ``parallelism`` sync connections at once.
+
+    :param adb: ADB handle of the device
+    :type adb: AdbDevice
+    :param sources: local files and directories
+    :type sources: LocalPath | Sequence[LocalPath]
+    :param destination: destination path or directory on the device
+    :type destination: str
+    :param parallelism: maximum number of concurrent transfers
+    :type parallelism: int
+    :param checksum: compare digests instead of modification times
+    :type checksum: bool
+    :return: transferred and skipped files, on the device
+    :rtype: TransferReport
+    :raises FileNotFoundError: if a source does not exist
+    """
+    started = time.monotonic()
+    pairs = _local_files(sources, destination)
+    report = TransferReport()
+    with adb.sync() as session:
+        remote_stats = {remote: session.stat(remote) for _, remote in pairs}
+    candidates = [
+        (local, remote)
+        for local, remote in pairs
+        if _same_size(local.stat().st_size, remote_stats[remote])
+    ]
+    if checksum:
+        remote_digests = _remote_digests(adb, [remote for _, remote in candidates])
+        unchanged = {
+            remote
+            for local, remote in candidates
+            if remote_digests.get(remote) == _local_digest(local)
+        }
+    else:
+        unchanged = {
+            remote
+            for local, remote in candidates
+            if remote_stats[remote].mtime == int(local.stat().st_mtime)
+        }
+    transfers: list[_Transfer] = []
+    for local, remote in pairs:
+        if remote in unchanged:
+            report.skipped.append(remote)
+        else:
+            transfers.append(
+                (remote, local.stat().st_size, methodcaller("push", local, remote))
+            )
+    _run_parallel(adb, transfers, parallelism, report)
+    report.seconds = time.monotonic() - started
+    _log_report("Pushed", adb, report)
+    return report
+
+
+def pull(
+    adb: AdbDevice,
+    sources: str | Sequence[str],
+    destination: LocalPath,
+    parallelism: int = DEFAULT_PARALLELISM,
+    checksum: bool = False,
+) -> TransferReport:
+    """Copy files and directories of a device to the local host.
+
+    A single file is copied to ``destination`` unless it is an existing
+    directory. Otherwise every source is copied into the ``destination``
+    directory, directories with their whole tree. Local files with the same
+    size and modification time as on the device, or the same SHA-256
+    digest if ``checksum`` is set, are skipped. Pulled files get the
+    modification time of the device copy, so that a repeated pull copies
+    nothing.
+
+    :param adb: ADB handle of the device
+    :type adb: AdbDevice
+    :param sources: files and directories on the device
+    :type sources: str | Sequence[str]
+    :param destination: local destination path or directory
+    :type destination: LocalPath
+    :param parallelism: maximum number of concurrent transfers
+    :type parallelism: int
+    :param checksum: compare digests instead of modification times
+    :type checksum: bool
+    :return: transferred and skipped files, on the device
+    :rtype: TransferReport
+    """
+    started = time.monotonic()
+    report = TransferReport()
+    with adb.sync() as session:
+        pairs = _remote_files(adb, session, sources, Path(destination))
+    candidates = [
+        (remote, local, remote_stat)
+        for remote, local, remote_stat in pairs
+        if local.is_file() and _same_size(local.stat().st_size, remote_stat)
+    ]
+    if checksum:
+        remote_digests = _remote_digests(adb, [remote for remote, _, _ in candidates])
+        unchanged = {
+            remote
+            for remote, local, _ in candidates
+            if remote_digests.get(remote) == _local_digest(local)
+        }
+    else:
+        unchanged = {
+            remote
+            for remote, local, remote_stat in candidates
+            if int(local.stat().st_mtime) == remote_stat.mtime
+        }
+    transfers: list[_Transfer] = []
+    for remote, local, remote_stat in pairs:
+        if remote in unchanged:
+            report.skipped.append(remote)
+        else:
+            transfers.append(
+                (
+                    remote,
+                    remote_stat.size,
+                    partial(
+                        _pull_file, remote=remote, local=local, mtime=remote_stat.mtime
+                    ),
+                )
+            )
+    _run_parallel(adb, transfers, parallelism, report)
+    report.seconds = time.monotonic() - started
+    _log_report("Pulled", adb, report)
+    return report
+
+
+def _pull_file(session: SyncSession, remote: str, local: Path, mtime: int) -> int:
+    """Pull one file and give it the modification time of the device copy.
+
+    :param session: sync session of the device
+    :type session: SyncSession
+    :param remote: path on the device
+    :type remote: str
+    :param local: local destination file
+    :type local: Path
+    :param mtime: modification time of the device copy
+    :type mtime: int
+    :return: number of bytes received
+    :rtype: int
+    """
+    local.parent.mkdir(parents=True, exist_ok=True)
+    received = session.pull(remote, local)
+    os.utime(local, (mtime, mtime))
+    return received
+
+
+def _local_files(
+    sources: LocalPath | Sequence[LocalPath], destination: str
+) -> list[tuple[Path, str]]:
+    """Map local files to their destination on the device.
+
+    :param sources: local files and directories
+    :type sources: LocalPath | Sequence[LocalPath]
+    :param destination: destination path or directory on the device
+    :type destination: str
+    :return: local file and device path pairs
+    :rtype: list[tuple[Path, str]]
+    :raises FileNotFoundError: if a source does not exist
+    """
+    paths = (
+        [Path(sources)]
+        if isinstance(sources, (str, os.PathLike))
+        else [Path(source) for source in sources]
+    )
+    if len(paths) == 1 and paths[0].is_file() and not destination.endswith("/"):
+        return [(paths[0], destination)]
+    pairs = []
+    for path in paths:
+        if path.is_file():
+            pairs.append((path, posixpath.join(destination, path.name)))
+        elif path.is_dir():
+            pairs.extend(
+                (
+                    file,
+                    posixpath.join(
+                        destination, path.name, *file.relative_to(path).parts
+                    ),
+                )
+                for file in sorted(path.rglob("*"))
+                if file.is_file()
+            )
+        else:
+            err_msg = f"No such file or directory: {path}"
+            raise FileNotFoundError(err_msg)
+    return pairs
+
+
+def _remote_files(
+    adb: AdbDevice,
+    session: SyncSession,
+    sources: str | Sequence[str],
+    destination: Path,
+) -> list[tuple[str, Path, FileStat]]:
+    """Map files of the device to their local destination.
+
+    :param adb: ADB handle of the device
+    :type adb: AdbDevice
+    :param session: sync session of the device
+    :type session: SyncSession
+    :param sources: files and directories on the device
+    :type sources: str | Sequence[str]
+    :param destination: local destination path or directory
+    :type destination: Path
+    :return: device path, local file and device stat triples
+    :rtype: list[tuple[str, Path, FileStat]]
+    :raises AdbError: if a source does not exist
+    """
+    paths = [sources] if isinstance(sources, str) else list(sources)
+    stats = {path: session.stat(path) for path in paths}
+    for path, remote_stat in stats.items():
+        if not remote_stat.exists:
+            err_msg = f"No such file or directory on {adb.serial}: {path}"
+            raise AdbError(err_msg)
+    if len(paths) == 1 and not stats[paths[0]].is_dir and not destination.is_dir():
+        return [(paths[0], destination, stats[paths[0]])]
+    triples = []
+    for path, remote_stat in stats.items():
+        name = posixpath.basename(path.rstrip("/"))
+        if not remote_stat.is_dir:
+            triples.append((path, destination / name, remote_stat))
+            continue
+        listing = adb.shell(f"find {shlex.quote(path)} -type f")
+        for file in sorted(filter(None, listing.stdout.decode().splitlines())):
+            relative = posixpath.relpath(file, path)
+            local = destination.joinpath(name, *relative.split("/"))
+            triples.append((file, local, session.stat(file)))
+    return triples
+
+
+def _same_size(local_size: int, remote_stat: FileStat) -> bool:
+    return (
+        remote_stat.exists
+        and not remote_stat.is_dir
+        and remote_stat.size == local_size
+    )
+
+
+def _remote_digests(adb: AdbDevice, paths: list[str]) -> dict[str, str]:
+    """Compute SHA-256 digests on the device, in one shell command.
+
+    :param adb: ADB handle of the device
+    :type adb: AdbDevice
+    :param paths: files on the device
+    :type paths: list[str]
+    :return: hexadecimal digest of every readable file, by path
+    :rtype: dict[str, str]
+    """
+    if not paths:
+        return {}
+    result = adb.shell(
+        f"sha256sum {' '.join(shlex.quote(path) for path in paths)}",
+        timeout=max(adb.client.timeout, 600),
+    )
+    digests = {}
+    for line in result.stdout.decode("utf-8", "replace").splitlines():
+        digest, _, path = line.partition("  ")
+        if path:
+            digests[path] = digest
+    return digests
+
+
+def _local_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _run_parallel(
+    adb: AdbDevice,
+    transfers: list[_Transfer],
+    parallelism: int,
+    report: TransferReport,
+) -> None:
+    """Run transfers on up to ``parallelism`` sync sessions at once.
+
+    Every worker keeps one sync session for all the files it takes from a
+    shared queue, largest first, so that a big file does not end up last.
+
+    :param adb: ADB handle of the device
+    :type adb: AdbDevice
+    :param transfers: name, size and transfer callable of every file
+    :type transfers: list[_Transfer]
+    :param parallelism: maximum number of concurrent transfers
+    :type parallelism: int
+    :param report: report updated with the transferred files
+    :type report: TransferReport
+    :raises BaseException: the first error of a worker, once all stopped
+    """
+    if not transfers:
+        return
+    pending: queue.Queue[_Transfer] = queue.Queue()
+    for transfer in sorted(transfers, key=lambda transfer: -transfer[1]):
+        pending.put(transfer)
+    lock = threading.Lock()
+    errors: list[BaseException] = []
+
+    def _worker() -> None:
+        try:
+            with adb.sync() as session:
+                while not errors:
+                    try:
+                        name, _, run = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    count = run(session)
+                    with lock:
+                        report.transferred.append(name)
+                        report.bytes_transferred += count
+        except BaseException as exc:  # noqa: BLE001  # pylint: disable=broad-except
+            with lock:
+                errors.append(exc)
+
+    workers = [
+        threading.Thread(target=_worker, name=f"mobilefarm-adb-transfer-{index}")
+        for index in range(min(max(parallelism, 1), len(transfers)))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[0]
+
+
+def _log_report(action: str, adb: AdbDevice, report: TransferReport) -> None:
+    _LOGGER.info(
+        "%s %d files (%d MiB at %.1f MiB/s) on %s, %d unchanged files skipped",
+        action,
+        len(report.transferred),
+        report.bytes_transferred // 1024**2,
+        report.throughput / 1024**2,
+        adb.serial,
+        len(report.skipped),
+    )
@@ -0,0 +1,134 @@
+"""Mobilefarm APK installation on Android devices."""
+
+from __future__ import annotations
+
+import logging
+import posixpath
+import re
+import shlex
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from mobilefarm.lib.adb_client import AdbError
+
+if TYPE_CHECKING:
+    from mobilefarm.templates.android import AndroidTemplate
+
+_LOGGER = logging.getLogger(__name__)
+
+STAGING_DIR = "/data/local/tmp/mobilefarm-apks"
+INSTALL_TIMEOUT = 600
+
+_PACKAGE_VERSION_PATTERN = re.compile(r"^package:(\S+) versionCode:(\d+)", re.M)
+
+
+@dataclass(frozen=True)
+class AppPackage:
+    """APK set of one app version, a base APK and its optional splits."""
+
+    package: str
+    version_code: int
+    apks: tuple[Path, ...]
+    grant_permissions: bool = False
+
+    def __post_init__(self) -> None:
+        """Normalize the APK paths.
+
+        :raises ValueError: if there is no APK or two APKs share a file name
+        """
+        apks = tuple(Path(apk) for apk in self.apks)
+        if not apks:
+            err_msg = f"No APK given for {self.package}"
+            raise ValueError(err_msg)
+        if len({apk.name for apk in apks}) != len(apks):
+            err_msg = f"APK file names of {self.package} must be unique: {apks}"
+            raise ValueError(err_msg)
+        object.__setattr__(self, "apks", apks)
+
+
+@dataclass
+class ProvisioningResult:
+    """Outcome of the app provisioning of one device."""
+
+    device_name: str
+    status: str = "pending"
+    installed: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+    error: str | None = None
+
+
+def installed_versions(device: AndroidTemplate) -> dict[str, int]:
+    """Return the version code of every package installed on a device.
+
+    :param device: Android device
+    :type device: AndroidTemplate
+    :return: version codes, by package name
+    :rtype: dict[str, int]
+    :raises AdbError: if the package manager fails
+    """
+    result = device.adb.shell("pm list packages --show-versioncode")
+    if not result.ok:
+        err_msg = (
+            f"Failed to list the packages of {device.adb_serial}: "
+            f"{result.output}"
+        )
+        raise AdbError(err_msg)
+    return {
+        package: int(version_code)
+        for package, version_code in _PACKAGE_VERSION_PATTERN.findall(
+            result.stdout.decode("utf-8", "replace")
+        )
+    }
+
+
+def install_app(device: AndroidTemplate, app: AppPackage) -> None:
+    """Install or update an app on a device.
+
+    The APKs are pushed to a staging directory, then installed with
+    ``pm install`` if there is a single one, or in one package manager
+    session, as ``adb install-multiple`` does, if there are splits. The
+    staging directory is removed in the same shell command.
+
+    :param device: Android device
+    :type device: AndroidTemplate
+    :param app: APK set to install
+    :type app: AppPackage
+    :raises AdbError: if the installation fails
+    """
+    staging_dir = posixpath.join(STAGING_DIR, app.package)
+    device.push(app.apks, f"{staging_dir}/")
+    remote_apks = [posixpath.join(staging_dir, apk.name) for apk in app.apks]
+    result = device.adb.shell(
+        f"{_install_script(app, remote_apks)}; mf_rc=$?; "
+        f"rm -rf {shlex.quote(staging_dir)}; exit $mf_rc",
+        timeout=INSTALL_TIMEOUT,
+    )
+    if not result.ok or "Success" not in result.output:
+        err_msg = (
+            f"Failed to install {app.package} {app.version_code} on "
+            f"{device.adb_serial}: {result.output}"
+        )
+        raise AdbError(err_msg)
+    _LOGGER.info(
+        "Installed %s %d on %s", app.package, app.version_code, device.adb_serial
+    )
+
+
+def _install_script(app: AppPackage, remote_apks: list[str]) -> str:
+    options = "-r -g" if app.grant_permissions else "-r"
+    if len(remote_apks) == 1:
+        return f"pm install {options} {shlex.quote(remote_apks[0])}"
+    # pm install-create prints "Success: created install session [<id>]"
+    writes = " && ".join(
+        f"pm install-write $mf_session {shlex.quote(posixpath.basename(apk))} "
+        f"{shlex.quote(apk)}"
+        for apk in remote_apks
+    )
+    return (
+        f"mf_session=$(pm install-create {options}) && "
+        "mf_session=${mf_session##*\\[} && mf_session=${mf_session%%]*} && "
+        f"{{ {writes} && pm install-commit $mf_session || "
+        "{ pm install-abandon $mf_session; false; }; }"
+    )
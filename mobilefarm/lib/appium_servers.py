@@ -0,0 +1,122 @@
+"""Mobilefarm Appium server scheduling."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from mobilefarm.templates.android import AndroidTemplate
+
+DEFAULT_APPIUM_SERVER = "http://localhost:4723"
+SYSTEM_PORT_BASE = 8200
+MJPEG_SERVER_PORT_BASE = 7810
+
+
+@dataclass(frozen=True)
+class AppiumEndpoint:
+    """Appium server and device-side ports assigned to one Android device."""
+
+    url: str
+    udid: str | None = None
+    system_port: int | None = None
+    mjpeg_server_port: int | None = None
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> AppiumEndpoint:
+        """Build the endpoint from a device configuration.
+
+        :param config: device configuration
+        :type config: dict[str, Any]
+        :return: endpoint described by the ``appium_server``, ``udid``,
+            ``system_port`` and ``mjpeg_server_port`` config keys
+        :rtype: AppiumEndpoint
+        """
+        return cls(
+            url=config.get("appium_server", DEFAULT_APPIUM_SERVER),
+            udid=config.get("udid"),
+            system_port=config.get("system_port"),
+            mjpeg_server_port=config.get("mjpeg_server_port"),
+        )
+
+    def capabilities(self) -> dict[str, Any]:
+        """Return the capabilities binding a session to this endpoint.
+
+        :return: udid, systemPort and mjpegServerPort capabilities
+        :rtype: dict[str, Any]
+        """
+        capabilities: dict[str, Any] = {}
+        if self.udid is not None:
+            capabilities["udid"] = self.udid
+        if self.system_port is not None:
+            capabilities["systemPort"] = self.system_port
+        if self.mjpeg_server_port is not None:
+            capabilities["mjpegServerPort"] = self.mjpeg_server_port
+        return capabilities
+
+
+class AppiumServerScheduler:
+    """Assign Appium servers and ports to the Android devices of a farm.
+
+    Every device gets a slot from its position in the inventory, sorted by
+    device name, so that the assignment is identical in every pytest-xdist
+    worker. The slot selects the Appium server (round robin over
+    ``servers``) and offsets the UiAutomator2 ``systemPort`` and
+    ``mjpegServerPort`` so that sessions of different devices never collide
+    on one host. An ``appium_server`` key in a device config pins that
+    device to the given server.
+    """
+
+    def __init__(
+        self,
+        devices: Iterable[AndroidTemplate],
+        servers: Iterable[str] = (DEFAULT_APPIUM_SERVER,),
+        system_port_base: int = SYSTEM_PORT_BASE,
+        mjpeg_server_port_base: int = MJPEG_SERVER_PORT_BASE,
+    ) -> None:
+        """Initialize the scheduler.
+
+        :param devices: Android devices of the farm
+        :type devices: Iterable[AndroidTemplate]
+        :param servers: Appium server URLs shared by the devices
+        :type servers: Iterable[str]
+        :param system_port_base: first UiAutomator2 system port
+        :type system_port_base: int
+        :param mjpeg_server_port_base: first MJPEG server port
+        :type mjpeg_server_port_base: int
+        :raises ValueError: if no Appium server is given
+        """
+        self._servers = list(servers)
+        if not self._servers:
+            err_msg = "At least one Appium server is required"
+            raise ValueError(err_msg)
+        self._endpoints: dict[str, AppiumEndpoint] = {}
+        ordered = sorted(devices, key=lambda device: device.device_name)
+        for slot, device in enumerate(ordered):
+            self._endpoints[device.device_name] = AppiumEndpoint(
+                url=device.config.get(
+                    "appium_server", self._servers[slot % len(self._servers)]
+                ),
+                udid=device.adb_serial,
+                system_port=device.config.get("system_port", system_port_base + slot),
+                mjpeg_server_port=device.config.get(
+                    "mjpeg_server_port", mjpeg_server_port_base + slot
+                ),
+            )
+
+    def endpoint_for(self, device: AndroidTemplate) -> AppiumEndpoint:
+        """Return the endpoint assigned to a device.
+
+        :param device: Android device
+        :type device: AndroidTemplate
+        :return: Appium endpoint of the device
+        :rtype: AppiumEndpoint
+        :raises KeyError: if the device is not scheduled
+        """
+        try:
+            return self._endpoints[device.device_name]
+        except KeyError as exc:
+            err_msg = f"No Appium server scheduled for {device.device_name}"
+            raise KeyError(err_msg) from exc
@@ -0,0 +1,169 @@
+"""Mobilefarm batched console command execution."""
+
+from __future__ import annotations
+
+import re
+import secrets
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
+
+_EXIT_CODE_PATTERN = re.compile(r"^(.*?)\r?\n?@mf:(\d+)@\s*$", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    """Outcome of one command of a batch."""
+
+    command: str
+    exit_code: int
+    output: str
+
+    @property
+    def ok(self) -> bool:
+        """Whether the command succeeded.
+
+        :return: True if the exit code is 0
+        :rtype: bool
+        """
+        return self.exit_code == 0
+
+
+def batch_script(
+    commands: Sequence[str], token: str, stop_on_error: bool = False
+) -> str:
+    """Build the one-line shell script running a batch of commands.
+
+    The output of every command is framed by markers carrying the batch
+    token, the command index and its exit code. The markers are printed
+    with ``printf`` format strings, so that they never appear verbatim in
+    the echo of the script itself.
+
+    :param commands: shell commands, run in order
+    :type commands: Sequence[str]
+    :param token: random token identifying the batch
+    :type token: str
+    :param stop_on_error: skip the remaining commands after a failure
+    :type stop_on_error: bool
+    :return: shell script
+    :rtype: str
+    """
+    parts = ["mf_rc=0"]
+    for index, command in enumerate(commands):
+        block = (
+            f"printf '\\n@%s:%d@\\n' {token} {index}; {{ {command}; }} 2>&1; "
+            f"mf_rc=$?; printf '\\n@%s:%d:%d@\\n' {token} {index} $mf_rc"
+        )
+        if stop_on_error:
+            block = f'if [ "$mf_rc" = 0 ]; then {block}; fi'
+        parts.append(block)
+    parts.append(f"printf '\\n@%s:done@\\n' {token}")
+    return "; ".join(parts)
+
+
+def parse_batch_output(
+    commands: Sequence[str], token: str, output: str
+) -> list[CommandResult]:
+    """Split the console output of a batch into per-command results.
+
+    :param commands: shell commands of the batch
+    :type commands: Sequence[str]
+    :param token: token of the batch
+    :type token: str
+    :param output: console output of the batch
+    :type output: str
+    :return: result of every command that ran, in order
+    :rtype: list[CommandResult]
+    """
+    pattern = re.compile(
+        rf"@{token}:(\d+)@\r?\n(.*?)\r?\n@{token}:\1:(\d+)@", re.DOTALL
+    )
+    return [
+        CommandResult(
+            command=commands[int(match.group(1))],
+            exit_code=int(match.group(3)),
+            output=match.group(2).replace("\r", "").strip(),
+        )
+        for match in pattern.finditer(output)
+    ]
+
+
+def execute_batch(
+    console: BoardfarmPexpect,
+    commands: Sequence[str],
+    shell_prompt: list[str],
+    timeout: int = -1,
+    stop_on_error: bool = False,
+) -> list[CommandResult]:
+    """Run a sequence of commands on a console in a single round trip.
+
+    Only the markers printed after each command are matched, not the echo
+    of the script, so a long batch wrapped by the terminal is still parsed.
+
+    :param console: console of a shell
+    :type console: BoardfarmPexpect
+    :param commands: shell commands, run in order
+    :type commands: Sequence[str]
+    :param shell_prompt: shell prompt patterns of the console
+    :type shell_prompt: list[str]
+    :param timeout: timeout of the whole batch in seconds, the console
+        default if -1
+    :type timeout: int
+    :param stop_on_error: skip the remaining commands after a failure
+    :type stop_on_error: bool
+    :return: result of every command that ran, in order
+    :rtype: list[CommandResult]
+    """
+    if not commands:
+        return []
+    token = f"mf{secrets.token_hex(4)}"
+    console.sendline(batch_script(commands, token, stop_on_error))
+    console.expect(rf"@{token}:done@", timeout=timeout)
+    output = console.before
+    console.expect(shell_prompt)
+    return parse_batch_output(commands, token, output)
+
+
+def execute_sequentially(
+    console: BoardfarmPexpect,
+    commands: Sequence[str],
+    timeout: int = -1,
+    stop_on_error: bool = False,
+) -> list[CommandResult]:
+    """Run a sequence of commands on a console one round trip at a time.
+
+    Fallback of :func:`execute_batch` for consoles whose shell prompt is not
+    known.
+
+    :param console: console of a shell
+    :type console: BoardfarmPexpect
+    :param commands: shell commands, run in order
+    :type commands: Sequence[str]
+    :param timeout: timeout of every command in seconds, the console
+        default if -1
+    :type timeout: int
+    :param stop_on_error: skip the remaining commands after a failure
+    :type stop_on_error: bool
+    :return: result of every command that ran, in order
+    :rtype: list[CommandResult]
+    """
+    results = []
+    for command in commands:
+        output = console.execute_command(
+            f"{{ {command}; }} 2>&1; printf '\\n@mf:%d@\\n' $?", timeout
+        )
+        match = _EXIT_CODE_PATTERN.search(output)
+        results.append(
+            CommandResult(
+                command=command,
+                exit_code=int(match.group(2)) if match else -1,
+                output=(match.group(1) if match else output).replace("\r", "").strip(),
+            )
+        )
+        if stop_on_error and not results[-1].ok:
+            break
+    return results
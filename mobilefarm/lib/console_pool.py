@@ -0,0 +1,229 @@
+"""Mobilefarm pool of shell consoles to one host."""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+import pexpect
+from boardfarm3.lib.connection_factory import connection_factory
+
+from mobilefarm.lib.console_batch import execute_batch
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Sequence
+
+    from boardfarm3.devices.base_devices import LinuxDevice
+    from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
+
+    from mobilefarm.lib.console_batch import CommandResult
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+
+
+class ConsolePool:
+    """Shell consoles to a Linux device, leased one operation at a time.
+
+    The main console of a device runs every command one after the other, so
+    a long artifact fetch holds up everything else on the host. The pool
+    opens up to ``size`` additional shell sessions with the connection
+    settings of the device, lazily on the first leases, and hands each one
+    to a single operation at a time. Operations leasing consoles from the
+    same pool run concurrently, the others wait for a free console.
+
+    A console whose operation fails with a pexpect error is closed instead
+    of being handed back, as its output may still be pending.
+
+    The commands and batches run with :meth:`execute_command` and
+    :meth:`execute_batch` are counted as console round trips.
+    """
+
+    def __init__(self, device: LinuxDevice, size: int = DEFAULT_POOL_SIZE) -> None:
+        """Initialize the pool.
+
+        :param device: device the consoles connect to
+        :type device: LinuxDevice
+        :param size: maximum number of pooled consoles
+        :type size: int
+        :raises ValueError: if size is lower than 1
+        """
+        if size < 1:
+            err_msg = f"Console pool size must be at least 1, got {size}"
+            raise ValueError(err_msg)
+        self._device = device
+        self._size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: list[BoardfarmPexpect] = []
+        self._leased: set[BoardfarmPexpect] = set()
+        self._closing: set[BoardfarmPexpect] = set()
+        self._opened = 0
+        self._round_trips = 0
+
+    @property
+    def size(self) -> int:
+        """Maximum number of pooled consoles.
+
+        :return: pool size
+        :rtype: int
+        """
+        return self._size
+
+    @property
+    def round_trips(self) -> int:
+        """Number of console round trips made through the pool.
+
+        :return: commands and batches executed
+        :rtype: int
+        """
+        return self._round_trips
+
+    @contextlib.contextmanager
+    def lease(self) -> Generator[BoardfarmPexpect, None, None]:
+        """Lease a console for one operation, waiting for a free one.
+
+        :yields: console logged in to the device
+        """
+        self._slots.acquire()
+        try:
+            with self._lock:
+                console = self._idle.pop() if self._idle else None
+            if console is None:
+                console = self._open()
+            with self._lock:
+                self._leased.add(console)
+            broken = False
+            try:
+                yield console
+            except pexpect.ExceptionPexpect:
+                broken = True
+                raise
+            finally:
+                if broken:
+                    self._discard(console)
+                else:
+                    self._release(console)
+        finally:
+            self._slots.release()
+
+    def execute_command(
+        self,
+        command: str,
+        timeout: int = -1,
+        console: BoardfarmPexpect | None = None,
+    ) -> str:
+        """Execute a command on a leased console.
+
+        :param command: command to execute
+        :type command: str
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :param console: console already leased by the caller, a console is
+            leased for the command if None
+        :type console: BoardfarmPexpect | None
+        :return: output of the command
+        :rtype: str
+        """
+        if console is None:
+            with self.lease() as leased:
+                return self.execute_command(command, timeout, leased)
+        self._count_round_trip()
+        return console.execute_command(command, timeout)
+
+    def execute_batch(
+        self,
+        commands: Sequence[str],
+        timeout: int = -1,
+        stop_on_error: bool = False,
+        console: BoardfarmPexpect | None = None,
+    ) -> list[CommandResult]:
+        """Execute a sequence of commands on a leased console in one round trip.
+
+        :param commands: shell commands, run in order
+        :type commands: Sequence[str]
+        :param timeout: timeout of the whole batch in seconds, the console
+            default if -1
+        :type timeout: int
+        :param stop_on_error: skip the remaining commands after a failure
+        :type stop_on_error: bool
+        :param console: console already leased by the caller, a console is
+            leased for the batch if None
+        :type console: BoardfarmPexpect | None
+        :return: result of every command that ran, in order
+        :rtype: list[CommandResult]
+        """
+        if not commands:
+            return []
+        if console is None:
+            with self.lease() as leased:
+                return self.execute_batch(commands, timeout, stop_on_error, leased)
+        self._count_round_trip()
+        return execute_batch(
+            console,
+            commands,
+            self._device._shell_prompt,  # noqa: SLF001  # pylint: disable=protected-access
+            timeout,
+            stop_on_error,
+        )
+
+    def close(self) -> None:
+        """Close the idle consoles and the leased ones once handed back."""
+        with self._lock:
+            consoles, self._idle = self._idle, []
+            self._closing |= self._leased
+        for console in consoles:
+            self._close(console)
+
+    def _count_round_trip(self) -> None:
+        with self._lock:
+            self._round_trips += 1
+
+    def _open(self) -> BoardfarmPexpect:
+        device = self._device
+        with self._lock:
+            self._opened += 1
+            index = self._opened
+        _LOGGER.debug("Opening pooled console %d to %s", index, device.device_name)
+        # pylint: disable=protected-access
+        console = connection_factory(
+            device.config.get("connection_type"),
+            f"{device.device_name}.pool{index}",
+            username=device._username,  # noqa: SLF001
+            password=device._password,  # noqa: SLF001
+            ip_addr=device._ipaddr,  # noqa: SLF001
+            port=device._port,  # noqa: SLF001
+            shell_prompt=device._shell_prompt,  # noqa: SLF001
+            save_console_logs=device._cmdline_args.save_console_logs,  # noqa: SLF001
+        )
+        try:
+            console.login_to_server(password=device._password)  # noqa: SLF001
+            # This fixes the terminal prompt on long lines
+            console.execute_command("stty columns 400; export TERM=xterm")
+        except Exception:
+            self._close(console)
+            raise
+        return console
+
+    def _release(self, console: BoardfarmPexpect) -> None:
+        with self._lock:
+            self._leased.discard(console)
+            if console not in self._closing and console.isalive():
+                self._idle.append(console)
+                return
+            self._closing.discard(console)
+        self._close(console)
+
+    def _discard(self, console: BoardfarmPexpect) -> None:
+        with self._lock:
+            self._leased.discard(console)
+            self._closing.discard(console)
+        self._close(console)
+
+    @staticmethod
+    def _close(console: BoardfarmPexpect) -> None:
+        with contextlib.suppress(pexpect.ExceptionPexpect, OSError):
+            console.close()
@@ -0,0 +1,114 @@
+"""Mobilefarm Android device descriptors."""
+
+from __future__ import annotations
+
+import shlex
+from dataclasses import dataclass
+from typing import Any
+
+DEFAULT_APP_PACKAGE = "com.android.settings"
+DEFAULT_APP_ACTIVITY = ".Settings"
+
+
+def _malformed(config: dict[str, Any], reason: str) -> ValueError:
+    return ValueError(
+        f"Malformed conn_cmd of {config.get('name', 'device')} ({reason}): "
+        f"{config.get('conn_cmd')!r}"
+    )
+
+
+# dataclass(slots=True) needs Python 3.10, hence the explicit __slots__
+@dataclass(frozen=True)
+class AndroidDeviceDescriptor:
+    """Values derived once from the configuration of an Android device."""
+
+    __slots__ = (
+        "adb_serial",
+        "app_activity",
+        "app_package",
+        "conn_args",
+        "conn_command",
+    )
+
+    conn_command: str
+    conn_args: tuple[str, ...]
+    adb_serial: str
+    app_package: str
+    app_activity: str
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> AndroidDeviceDescriptor:
+        """Build the descriptor of a device reached with ``adb -s <serial>``.
+
+        :param config: device configuration, whose ``conn_cmd`` is a list
+            starting with the adb command
+        :type config: dict[str, Any]
+        :return: device descriptor
+        :rtype: AndroidDeviceDescriptor
+        :raises ValueError: if ``conn_cmd`` has no ``-s <serial>`` option
+        """
+        conn_cmd = config.get("conn_cmd")
+        if not isinstance(conn_cmd, list) or not conn_cmd:
+            raise _malformed(config, "expected a non-empty list")
+        try:
+            command = shlex.split(conn_cmd[0])
+            adb_serial = command[command.index("-s") + 1]
+        except (ValueError, IndexError) as exc:
+            raise _malformed(config, "no adb -s <serial> option") from exc
+        return cls(
+            conn_command=conn_cmd[0],
+            conn_args=(),
+            adb_serial=adb_serial,
+            app_package=config.get("app_package", DEFAULT_APP_PACKAGE),
+            app_activity=config.get("app_activity", DEFAULT_APP_ACTIVITY),
+        )
+
+
+@dataclass(frozen=True)
+class CuttlefishDescriptor(AndroidDeviceDescriptor):
+    """Values derived once from the configuration of a Cuttlefish device."""
+
+    __slots__ = ("artifact_name", "build_id", "product", "target")
+
+    build_id: str | None
+    target: str | None
+    product: str | None
+    artifact_name: str | None
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> CuttlefishDescriptor:
+        """Build the descriptor of a device reached with ``adb connect``.
+
+        :param config: device configuration, whose ``conn_cmd`` is a command
+            string such as ``bash -c 'adb connect <host:port> && adb shell'``
+        :type config: dict[str, Any]
+        :return: device descriptor
+        :rtype: CuttlefishDescriptor
+        :raises ValueError: if ``conn_cmd`` does not connect to a host:port
+        """
+        conn_cmd = config.get("conn_cmd")
+        if not isinstance(conn_cmd, str):
+            raise _malformed(config, "expected a command string")
+        try:
+            conn_parts = shlex.split(conn_cmd)
+            command = shlex.split(conn_parts[2])
+            adb_serial = command[command.index("connect") + 1]
+        except (ValueError, IndexError) as exc:
+            raise _malformed(config, "no adb connect <host:port> command") from exc
+        software = config.get("software", {})
+        build_id = software.get("build_id")
+        target = software.get("target")
+        product = target.split("-")[0] if target else None
+        return cls(
+            conn_command=conn_parts[0],
+            conn_args=tuple(conn_parts[1:]),
+            adb_serial=adb_serial,
+            app_package=config.get("app_package", DEFAULT_APP_PACKAGE),
+            app_activity=config.get("app_activity", DEFAULT_APP_ACTIVITY),
+            build_id=build_id,
+            target=target,
+            product=product,
+            artifact_name=(
+                f"{product}-ota-{build_id}.zip" if product and build_id else None
+            ),
+        )
@@ -0,0 +1,202 @@
+"""Mobilefarm Android device leasing."""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import logging
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Callable
+
+from mobilefarm.templates.android import AndroidTemplate
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    from boardfarm3.lib.device_manager import DeviceManager
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_LEASE_DIR = Path(tempfile.gettempdir()) / "mobilefarm-leases"
+
+
+class DeviceLeaseAllocator:
+    """Hand out Android devices exclusively to concurrent test processes.
+
+    A lease is an exclusive ``flock`` on ``<lease_dir>/<device name>.lock``.
+    The lock belongs to the open file, so the kernel drops it as soon as the
+    leasing process exits, even if a pytest-xdist worker crashes, and the
+    device becomes available to the other workers again without any
+    cleanup.
+    """
+
+    def __init__(
+        self,
+        device_manager: DeviceManager,
+        lease_dir: Path = DEFAULT_LEASE_DIR,
+    ) -> None:
+        """Initialize the allocator.
+
+        :param device_manager: device manager holding the Android devices
+        :type device_manager: DeviceManager
+        :param lease_dir: directory holding the lease lock files, shared by
+            all the processes leasing devices on this host
+        :type lease_dir: Path
+        """
+        self._device_manager = device_manager
+        self._lease_dir = lease_dir
+        self._lease_dir.mkdir(parents=True, exist_ok=True)
+
+    def candidates(self, env_req: dict[str, Any] | None = None) -> list[AndroidTemplate]:
+        """Return the Android devices matching an environment requirement.
+
+        :param env_req: ``env_req`` marker content, any Android device
+            matches if None or if it does not name a model
+        :type env_req: dict[str, Any] | None
+        :return: matching devices
+        :rtype: list[AndroidTemplate]
+        """
+        models = {
+            requirement.get("model")
+            for requirement in (env_req or {}).get("environment_def", {}).values()
+            if isinstance(requirement, dict) and "model" in requirement
+        }
+        devices = self._device_manager.get_devices_by_type(
+            AndroidTemplate  # type:ignore[type-abstract]
+        ).values()
+        return [
+            device for device in devices if not models or device.device_type in models
+        ]
+
+    @contextlib.contextmanager
+    def lease(
+        self,
+        env_req: dict[str, Any] | None = None,
+        timeout: float = 3600,
+    ) -> Generator[AndroidTemplate, None, None]:
+        """Lease a free Android device matching an environment requirement.
+
+        :param env_req: ``env_req`` marker content of the test
+        :type env_req: dict[str, Any] | None
+        :param timeout: maximum time to wait for a free device, in seconds
+        :type timeout: float
+        :yields: the leased device, released on exit
+        :raises ValueError: if no device matches the requirement
+        :raises TimeoutError: if no matching device becomes free in time
+        """
+        candidates = self.candidates(env_req)
+        if not candidates:
+            err_msg = f"No Android device matches the requirement {env_req}"
+            raise ValueError(err_msg)
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        while True:
+            # start from a random device so that workers spread over the farm
+            offset = random.randrange(len(candidates))  # noqa: S311
+            for device in candidates[offset:] + candidates[:offset]:
+                lock_file = self._try_lock(device)
+                if lock_file is None:
+                    continue
+                _LOGGER.info("Leased %s to process %d", device.device_name, os.getpid())
+                try:
+                    yield device
+                finally:
+                    lock_file.close()
+                    _LOGGER.info("Released lease on %s", device.device_name)
+                return
+            if time.monotonic() >= deadline:
+                err_msg = (
+                    f"No free Android device among "
+                    f"{[device.device_name for device in candidates]} "
+                    f"after {timeout} seconds"
+                )
+                raise TimeoutError(err_msg)
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+
+    def _try_lock(self, device: AndroidTemplate) -> IO[str] | None:
+        lock_file = (self._lease_dir / f"{device.device_name}.lock").open(
+            "a+", encoding="utf-8"
+        )
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        lock_file.truncate(0)
+        lock_file.write(
+            f"{os.getpid()} {os.environ.get('PYTEST_XDIST_WORKER', 'master')}\n"
+        )
+        lock_file.flush()
+        return lock_file
+
+
+class WorkerDeviceLease:
+    """Keep the device leased by a test process across its tests.
+
+    A pytest-xdist worker holds at most one device. The device is kept
+    leased as long as the tests of the worker match it, so the Appium
+    sessions pooled on it stay valid. It is released, after calling
+    ``on_release``, only when a test needs a device it does not match or
+    when the worker ends, and only then can another worker lease it.
+    Holding a single device keeps two workers from waiting on each other.
+    """
+
+    def __init__(
+        self,
+        allocator: DeviceLeaseAllocator,
+        on_release: Callable[[AndroidTemplate], None] | None = None,
+    ) -> None:
+        """Initialize the worker lease.
+
+        :param allocator: allocator leasing the devices
+        :type allocator: DeviceLeaseAllocator
+        :param on_release: called with the device just before its lease is
+            handed back
+        :type on_release: Callable[[AndroidTemplate], None] | None
+        """
+        self._allocator = allocator
+        self._on_release = on_release
+        self._leases = contextlib.ExitStack()
+        self._device: AndroidTemplate | None = None
+
+    def device_for(
+        self,
+        env_req: dict[str, Any] | None = None,
+        timeout: float = 3600,
+    ) -> AndroidTemplate:
+        """Return a leased device matching an environment requirement.
+
+        :param env_req: ``env_req`` marker content of the test
+        :type env_req: dict[str, Any] | None
+        :param timeout: maximum time to wait for a free device, in seconds
+        :type timeout: float
+        :return: the device held by the worker if it matches, else a newly
+            leased one
+        :rtype: AndroidTemplate
+        """
+        if self._device is not None:
+            if any(
+                device is self._device for device in self._allocator.candidates(env_req)
+            ):
+                return self._device
+            self.release()
+        self._device = self._leases.enter_context(
+            self._allocator.lease(env_req, timeout)
+        )
+        return self._device
+
+    def release(self) -> None:
+        """Hand the held device back to the allocator."""
+        if self._device is None:
+            return
+        device, self._device = self._device, None
+        try:
+            if self._on_release is not None:
+                self._on_release(device)
+        finally:
+            self._leases.close()
@@ -0,0 +1,91 @@
+"""Mobilefarm persistent device state."""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = Path(tempfile.gettempdir()) / "mobilefarm-device-state.json"
+
+
+class DeviceStateStore:
+    """Last-known state of the farm devices, kept across test sessions.
+
+    The state is a JSON document shared by every process on the host. It is
+    updated under an exclusive ``flock`` on a sibling ``.lock`` file and
+    replaced atomically, so concurrent pytest-xdist workers never see a
+    partially written file.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STATE_FILE) -> None:
+        """Initialize the store.
+
+        :param path: path of the JSON state file
+        :type path: Path
+        """
+        self._path = Path(path)
+        self._lock_path = self._path.with_name(f"{self._path.name}.lock")
+
+    def read(self) -> dict[str, Any]:
+        """Return the whole state.
+
+        :return: state document, empty if missing or unreadable
+        :rtype: dict[str, Any]
+        """
+        try:
+            state = json.loads(self._path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def device(self, device_name: str) -> dict[str, Any]:
+        """Return the last-known state of a device.
+
+        :param device_name: device name
+        :type device_name: str
+        :return: device state, empty if unknown
+        :rtype: dict[str, Any]
+        """
+        return self.read().get("devices", {}).get(device_name, {})
+
+    @contextlib.contextmanager
+    def update(self) -> Generator[dict[str, Any], None, None]:
+        """Modify the state in place, under an exclusive lock.
+
+        :yields: state document, written back on exit
+        """
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock_path.open("a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            state = self.read()
+            yield state
+            descriptor, temporary = tempfile.mkstemp(
+                dir=self._path.parent, prefix=f".{self._path.name}."
+            )
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                json.dump(state, file, indent=2, sort_keys=True)
+            os.replace(temporary, self._path)
+
+    def update_device(self, device_name: str, **fields: Any) -> None:  # noqa: ANN401
+        """Merge fields into the last-known state of a device.
+
+        :param device_name: device name
+        :type device_name: str
+        :param fields: fields to set
+        :type fields: Any
+        """
+        with self.update() as state:
+            state.setdefault("devices", {}).setdefault(device_name, {}).update(
+                fields
+            )
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import base64
 import contextlib
 import logging
 from datetime import datetime, timezone
@@ -11,14 +12,23 @@ from typing import TYPE_CHECKING, Any
 from appium import webdriver
 from appium.options.android.uiautomator2.base import UiAutomator2Options
 from boardfarm3.lib.utils import get_pytest_name
-from selenium.webdriver.support.wait import WebDriverWait
 
+from mobilefarm.lib.appium_servers import AppiumEndpoint
+from mobilefarm.lib.screenshot import (
+    CapturePolicy,
+    ScreenshotPipeline,
+    UiStabilizer,
+)
 from mobilefarm.lib.utils import get_capabilities
 
 if TYPE_CHECKING:
+    from collections.abc import Generator
+
     from appium.webdriver.webdriver import WebDriver
     from selenium.webdriver.remote.webelement import WebElement
 
+    from mobilefarm.lib.session_pool import AppiumSessionPool
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -27,39 +37,84 @@ class ScreenshotMixin:  # pylint: disable=too-few-public-methods
 
     screenshot_path: str
     _driver: WebDriver
+    _pipeline: ScreenshotPipeline | None = None
+    _stabilizer: UiStabilizer
+    _policy: CapturePolicy
 
-    def _wait_for_ui_update(self, timeout: int = 2) -> None:
-        """Wait for the UI hierarchy to stabilize."""
-        with contextlib.suppress(Exception):
-            WebDriverWait(self._driver, timeout).until(
-                lambda d: (
-                    d.page_source is not None
-                    and d.current_package == self._driver.current_package
-                )
-            )
+    @property
+    def stabilization_timings(self) -> dict[str, tuple[int, float]]:
+        """Number of calls and total time spent per UI stabilization strategy.
 
-        with contextlib.suppress(Exception):
-            self._driver.execute_script("mobile: waitForIdleSync", {"timeout": 5000})
+        :return: mapping of strategy name to (calls, total seconds)
+        :rtype: dict[str, tuple[int, float]]
+        """
+        return self._stabilizer.timings
 
-    def capture_screenshot(self, name: str) -> None:
-        """Capture a screenshot with a timestamped filename."""
-        self._wait_for_ui_update()
+    def _wait_for_ui_update(self) -> str | None:
+        """Wait for the UI to stabilize.
 
+        :return: the settled frame as base64 PNG if the strategy fetched one
+        :rtype: str | None
+        """
+        return self._stabilizer.wait(self._driver)
+
+    def capture_screenshot(self, name: str, before_action: bool = False) -> None:
+        """Capture a screenshot with a timestamped filename.
+
+        When a background pipeline is attached the frame is captured on the
+        pipeline workers. "Before" frames still block until they have been
+        fetched so that they never show the result of the action.
+
+        :param name: screenshot name
+        :type name: str
+        :param before_action: True if the frame must be taken before an action
+        :type before_action: bool
+        """
+        if not self._policy.should_capture(before_action):
+            return
         timestamp = datetime.now(tz=timezone.utc).strftime("%Y%m%d_%H%M%S%f")
         file_path = Path(self.screenshot_path) / f"{timestamp}_{name}.png"
 
+        if self._pipeline is not None:
+            self._pipeline.submit(
+                file_path,
+                prepare=self._wait_for_ui_update,
+                wait_for_fetch=before_action,
+            )
+            return
+
+        frame = self._wait_for_ui_update()
         try:
-            self._driver.get_screenshot_as_file(str(file_path))
-            _LOGGER.debug("Screenshot saved: %s", file_path)
+            if frame is None:
+                frame = self._driver.get_screenshot_as_base64()
+            self._policy.sink.write(file_path, base64.b64decode(frame))
         except OSError as exc:
             _LOGGER.warning("Failed to capture screenshot: %s", exc)
 
+    @contextlib.contextmanager
+    def _capture_around(self, action: str) -> Generator[None, None, None]:
+        """Capture screenshots before and after an action.
+
+        :param action: action name used in the screenshot names
+        :type action: str
+        :yields: None
+        """
+        self.capture_screenshot(f"before_{action}", before_action=True)
+        yield
+        self.capture_screenshot(f"after_{action}")
+
 
 class AppiumElementProxy(ScreenshotMixin):
     """Proxy around Appium WebElement to intercept actions."""
 
     def __init__(
-        self, element: WebElement, driver: WebDriver, screenshot_path: str
+        self,
+        element: WebElement,
+        driver: WebDriver,
+        screenshot_path: str,
+        pipeline: ScreenshotPipeline | None = None,
+        stabilizer: UiStabilizer | None = None,
+        policy: CapturePolicy | None = None,
     ) -> None:
         """Initialize element proxy.
 
@@ -69,16 +124,26 @@ class AppiumElementProxy(ScreenshotMixin):
         :type driver: WebDriver
         :param screenshot_path: Directory to store screenshots
         :type screenshot_path: str
+        :param pipeline: background screenshot pipeline, captures in the
+            calling thread if None
+        :type pipeline: ScreenshotPipeline | None
+        :param stabilizer: UI stabilization strategy run before each
+            screenshot, defaults to ``idle_sync``
+        :type stabilizer: UiStabilizer | None
+        :param policy: screenshot capture policy, defaults to ``always``
+        :type policy: CapturePolicy | None
         """
         self._element = element
         self._driver = driver
         self.screenshot_path = screenshot_path
+        self._pipeline = pipeline
+        self._stabilizer = stabilizer or UiStabilizer()
+        self._policy = policy or CapturePolicy()
 
     def click(self) -> None:
         """Click the element with before/after screenshots."""
-        self.capture_screenshot("before_click")
-        self._element.click()
-        self.capture_screenshot("after_click")
+        with self._capture_around("click"):
+            self._element.click()
 
     def send_keys(self, value: str) -> None:
         """Send keys to the element with screenshots.
@@ -86,15 +151,13 @@ class AppiumElementProxy(ScreenshotMixin):
         :param value: Text to send
         :type value: str
         """
-        self.capture_screenshot("before_send_keys")
-        self._element.send_keys(value)
-        self.capture_screenshot("after_send_keys")
+        with self._capture_around("send_keys"):
+            self._element.send_keys(value)
 
     def clear(self) -> None:
         """Clear element value with screenshots."""
-        self.capture_screenshot("before_clear")
-        self._element.clear()
-        self.capture_screenshot("after_clear")
+        with self._capture_around("clear"):
+            self._element.clear()
 
     def __getattr__(self, name: str) -> Any:  # noqa: ANN401
         """Delegate attribute access to the underlying element.
@@ -110,16 +173,39 @@ class AppiumElementProxy(ScreenshotMixin):
 class AppiumDriverProxy(ScreenshotMixin):
     """Proxy around Appium WebDriver to intercept driver-level actions."""
 
-    def __init__(self, driver: WebDriver, screenshot_path: str) -> None:
+    def __init__(
+        self,
+        driver: WebDriver,
+        screenshot_path: str,
+        pipeline: ScreenshotPipeline | None = None,
+        stabilizer: UiStabilizer | None = None,
+        policy: CapturePolicy | None = None,
+        session_pool: AppiumSessionPool | None = None,
+    ) -> None:
         """Initialize driver proxy.
 
         :param driver: Appium WebDriver
         :type driver: WebDriver
         :param screenshot_path: Directory to store screenshots
         :type screenshot_path: str
+        :param pipeline: background screenshot pipeline, captures in the
+            calling thread if None
+        :type pipeline: ScreenshotPipeline | None
+        :param stabilizer: UI stabilization strategy run before each
+            screenshot, defaults to ``idle_sync``
+        :type stabilizer: UiStabilizer | None
+        :param policy: screenshot capture policy, defaults to ``always``
+        :type policy: CapturePolicy | None
+        :param session_pool: pool the session is handed back to on quit
+            instead of being ended
+        :type session_pool: AppiumSessionPool | None
         """
         self._driver = driver
         self.screenshot_path = screenshot_path
+        self._pipeline = pipeline
+        self._stabilizer = stabilizer or UiStabilizer()
+        self._policy = policy or CapturePolicy()
+        self._session_pool = session_pool
 
     def find_element(
         self, by: str, value: str | dict | None = None
@@ -134,7 +220,14 @@ class AppiumDriverProxy(ScreenshotMixin):
         :rtype: AppiumElementProxy
         """
         element = self._driver.find_element(by, value)
-        return AppiumElementProxy(element, self._driver, self.screenshot_path)
+        return AppiumElementProxy(
+            element,
+            self._driver,
+            self.screenshot_path,
+            self._pipeline,
+            self._stabilizer,
+            self._policy,
+        )
 
     def execute_script(self, script: str, *args: Any) -> Any:  # noqa: ANN401
         """Execute a script with screenshots.
@@ -147,9 +240,8 @@ class AppiumDriverProxy(ScreenshotMixin):
         :return: Script result
         :rtype: Any
         """
-        self.capture_screenshot("before_execute_script")
-        result = self._driver.execute_script(script, *args)
-        self.capture_screenshot("after_execute_script")
+        with self._capture_around("execute_script"):
+            result = self._driver.execute_script(script, *args)
         return result
 
     def tap(
@@ -162,9 +254,8 @@ class AppiumDriverProxy(ScreenshotMixin):
         :param duration: Duration of the tap in ms (optional)
         :type duration: int | None
         """
-        self.capture_screenshot("before_tap")
-        self._driver.tap(positions, duration)
-        self.capture_screenshot("after_tap")
+        with self._capture_around("tap"):
+            self._driver.tap(positions, duration)
 
     def swipe(  # noqa: PLR0913, RUF100
         self,
@@ -182,9 +273,8 @@ class AppiumDriverProxy(ScreenshotMixin):
         :param end_y: Ending Y coordinate
         :param duration: Swipe duration in ms
         """
-        self.capture_screenshot("before_swipe")
-        self._driver.swipe(start_x, start_y, end_x, end_y, duration)
-        self.capture_screenshot("after_swipe")
+        with self._capture_around("swipe"):
+            self._driver.swipe(start_x, start_y, end_x, end_y, duration)
 
     def activate_app(self, app_id: str) -> None:
         """Activate app with screenshots.
@@ -192,9 +282,8 @@ class AppiumDriverProxy(ScreenshotMixin):
         :param app_id: Application package name
         :type app_id: str
         """
-        self.capture_screenshot("before_activate_app")
-        self._driver.activate_app(app_id)
-        self.capture_screenshot("after_activate_app")
+        with self._capture_around("activate_app"):
+            self._driver.activate_app(app_id)
 
     def terminate_app(self, app_id: str) -> None:
         """Terminate app with screenshots.
@@ -202,14 +291,47 @@ class AppiumDriverProxy(ScreenshotMixin):
         :param app_id: Application package name
         :type app_id: str
         """
-        self.capture_screenshot("before_terminate_app")
-        self._driver.terminate_app(app_id)
-        self.capture_screenshot("after_terminate_app")
+        with self._capture_around("terminate_app"):
+            self._driver.terminate_app(app_id)
+
+    def save_buffered_screenshots(self) -> int:
+        """Write the screenshots held back by the ``on_failure`` policy to disk.
+
+        :return: number of screenshots written
+        :rtype: int
+        """
+        if self._pipeline is not None:
+            self._pipeline.flush()
+        return self._policy.save_buffered()
+
+    def quit(self, reuse: bool = True) -> None:  # noqa: A003, RUF100
+        """Quit driver with final screenshot.
+
+        Pending background screenshots are flushed before the session ends.
+        Pooled sessions are handed back to their pool instead of being ended,
+        unless ``reuse`` is False.
 
-    def quit(self) -> None:  # noqa: A003, RUF100
-        """Quit driver with final screenshot."""
-        self.capture_screenshot("before_quit")
-        self._driver.quit()
+        :param reuse: hand a pooled session back to its pool, False to end
+            it, e.g. after a failed test left the app in an unknown state
+        :type reuse: bool
+        """
+        self.capture_screenshot("before_quit", before_action=True)
+        if self._pipeline is not None:
+            self._pipeline.close()
+        for strategy, (calls, elapsed) in self.stabilization_timings.items():
+            _LOGGER.info(
+                "UI stabilization %s: %d calls, %.3fs total, %.3fs average",
+                strategy,
+                calls,
+                elapsed,
+                elapsed / calls,
+            )
+        if self._session_pool is None:
+            self._driver.quit()
+        elif reuse:
+            self._session_pool.release(self._driver)
+        else:
+            self._session_pool.discard(self._driver)
 
     def __getattr__(self, name: str) -> object:
         """Delegate attribute access to the underlying driver."""
@@ -224,6 +346,17 @@ class AndroidGuiHelper:  # pylint: disable=too-few-public-methods
         config: dict[str, Any],
         default_delay: int = 20,
         output_dir: str | None = None,
+        background_capture: bool = False,
+        max_pending_screenshots: int = 8,
+        stabilization: str = "idle_sync",
+        stabilization_timeout: float = 2.0,
+        capture_policy: str = "always",
+        capture_every: int = 1,
+        ring_buffer_frames: int = 20,
+        ring_buffer_bytes: int = 64 * 1024**2,
+        deduplicate_screenshots: bool = False,
+        dedup_threshold: int = -1,
+        appium_endpoint: AppiumEndpoint | None = None,
     ) -> None:
         """Initialize GUI helper.
 
@@ -233,32 +366,110 @@ class AndroidGuiHelper:  # pylint: disable=too-few-public-methods
         :type default_delay: int
         :param output_dir: Output directory for screenshots
         :type output_dir: str | None
+        :param background_capture: capture screenshots on worker threads
+            instead of blocking the test thread
+        :type background_capture: bool
+        :param max_pending_screenshots: maximum number of queued screenshots
+            before actions block, used with background capture only
+        :type max_pending_screenshots: int
+        :param stabilization: UI stabilization strategy run before each
+            screenshot, one of ``idle_sync``, ``hierarchy_hash``,
+            ``screenshot_diff`` or ``none``
+        :type stabilization: str
+        :param stabilization_timeout: maximum time to wait for the UI to
+            settle before a screenshot, in seconds
+        :type stabilization_timeout: float
+        :param capture_policy: screenshot capture policy, one of ``always``,
+            ``every_nth``, ``after_only`` or ``on_failure``
+        :type capture_policy: str
+        :param capture_every: capture every n-th action with ``every_nth``
+        :type capture_every: int
+        :param ring_buffer_frames: number of frames kept in memory with
+            ``on_failure``
+        :type ring_buffer_frames: int
+        :param ring_buffer_bytes: memory budget of the ``on_failure`` ring
+            buffer, in bytes
+        :type ring_buffer_bytes: int
+        :param deduplicate_screenshots: store identical screenshots only once
+            and record the duplicates in a sidecar index
+        :type deduplicate_screenshots: bool
+        :param dedup_threshold: maximum average hash distance of
+            near-identical screenshots to skip too, negative (the default) to
+            skip identical ones only
+        :type dedup_threshold: int
+        :param appium_endpoint: Appium server and ports of the device,
+            defaults to the ``appium_server`` key of the config or
+            ``http://localhost:4723``
+        :type appium_endpoint: AppiumEndpoint | None
         """
         if output_dir is None:
             output_dir = Path.cwd().joinpath("results").as_posix()
 
         self._default_delay = default_delay
+        self._device_name = config.get("name")
+        self._background_capture = background_capture
+        self._max_pending_screenshots = max_pending_screenshots
+        self._stabilization = stabilization
+        self._stabilization_timeout = stabilization_timeout
+        self._policy = CapturePolicy(
+            capture_policy,
+            capture_every,
+            ring_buffer_frames,
+            ring_buffer_bytes,
+            deduplicate_screenshots,
+            dedup_threshold,
+        )
         self._test_name = get_pytest_name()
         self._screenshot_path = str(
             Path(output_dir).resolve().joinpath(self._test_name)
         )
         Path(self._screenshot_path).mkdir(parents=True, exist_ok=True)
-        self._capabilities = get_capabilities(config)
+        self._endpoint = appium_endpoint or AppiumEndpoint.from_config(config)
+        self._capabilities = {
+            **get_capabilities(config),
+            **self._endpoint.capabilities(),
+        }
         self._disable_log_messages_from_libraries()
 
-    def get_web_driver(self) -> AppiumDriverProxy:
+    def get_web_driver(
+        self, session_pool: AppiumSessionPool | None = None
+    ) -> AppiumDriverProxy:
         """Return wrapped Appium WebDriver.
 
+        :param session_pool: pool to take the session from, a new session is
+            started and ended with the driver if None
+        :type session_pool: AppiumSessionPool | None
         :return: Screenshot-enabled Appium driver
         :rtype: AppiumDriverProxy
         """
-        raw_driver = webdriver.Remote(
-            "http://localhost:4723",
-            options=UiAutomator2Options().load_capabilities(self._capabilities),
-        )
-        raw_driver.implicitly_wait(self._default_delay)
+        if session_pool is not None:
+            raw_driver = session_pool.acquire(
+                self._endpoint.url,
+                self._capabilities,
+                self._default_delay,
+                self._device_name,
+            )
+        else:
+            raw_driver = webdriver.Remote(
+                self._endpoint.url,
+                options=UiAutomator2Options().load_capabilities(self._capabilities),
+            )
+            raw_driver.implicitly_wait(self._default_delay)
 
-        return AppiumDriverProxy(raw_driver, self._screenshot_path)
+        pipeline = None
+        if self._background_capture:
+            pipeline = ScreenshotPipeline(
+                raw_driver, self._policy.sink, self._max_pending_screenshots
+            )
+        stabilizer = UiStabilizer(self._stabilization, self._stabilization_timeout)
+        return AppiumDriverProxy(
+            raw_driver,
+            self._screenshot_path,
+            pipeline,
+            stabilizer,
+            self._policy,
+            session_pool,
+        )
 
     def _disable_log_messages_from_libraries(self) -> None:
         """Disable logs from urllib3."""
@@ -0,0 +1,404 @@
+"""Mobilefarm OTA artifact cache."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shlex
+import socket
+import threading
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from mobilefarm.templates.ota_server import OTAServerTemplate
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "/var/cache/mobilefarm/ota"
+DEFAULT_SERVE_DIR = "/tftpboot"
+DEFAULT_CACHE_BUDGET_GB = 100
+DEFAULT_LEASE_TIMEOUT = 6 * 3600
+
+
+class OTAArtifactCache:
+    """Content-verified LRU cache of OTA artifacts on the OTA server host.
+
+    Artifacts are stored as ``<cache_dir>/<target>/<build_id>/<artifact_name>``
+    together with a ``.sha256`` file holding their digest: the digest the
+    download was verified against, or the digest computed on the OTA server
+    if the fetch had no expected digest. Downloads land in a ``.partial``
+    file first, so an interrupted fetch is never mistaken for a cached
+    artifact, and is kept for resuming if it has a ``.ranges`` download
+    state. Artifacts are published to the serving directory with a hard
+    link (a symbolic link if the directories are on different file systems)
+    instead of being moved out of the cache. The modification time of an
+    artifact is refreshed on every hit and the least recently used artifacts
+    are evicted once the cache outgrows its disk budget, except the
+    artifacts leased by a process serving them to devices. A lease is a file
+    in ``<artifact>.leases/`` named after the process, so that the processes
+    sharing the OTA server host see each other's leases. A
+    ``.metadata.json`` sidecar can hold data derived from the artifact,
+    keyed by its digest.
+
+    All the file operations run as commands on the OTA server, possibly on
+    several of its consoles at once. Commands are batched so that serving a
+    cached artifact takes two console round trips: one to check and touch
+    it, one to publish it and read its digest and metadata sidecar, which
+    are then kept in memory until the artifact is stored or evicted again.
+    """
+
+    def __init__(
+        self,
+        ota_server: OTAServerTemplate,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        serve_dir: str = DEFAULT_SERVE_DIR,
+        budget_bytes: int = DEFAULT_CACHE_BUDGET_GB * 1024**3,
+        verify_on_hit: bool = False,
+        lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+    ) -> None:
+        """Initialize the cache.
+
+        :param ota_server: OTA server running the file operations
+        :type ota_server: OTAServerTemplate
+        :param cache_dir: cache directory on the OTA server
+        :type cache_dir: str
+        :param serve_dir: directory served over HTTP
+        :type serve_dir: str
+        :param budget_bytes: disk budget of the cache, in bytes
+        :type budget_bytes: int
+        :param verify_on_hit: verify the checksum of cached artifacts on
+            every hit instead of only checking their size
+        :type verify_on_hit: bool
+        :param lease_timeout: age after which a lease left behind by a
+            crashed process is ignored, in seconds
+        :type lease_timeout: float
+        """
+        self._ota_server = ota_server
+        self._cache_dir = cache_dir.rstrip("/")
+        self._serve_dir = serve_dir.rstrip("/")
+        self._budget_bytes = budget_bytes
+        self._verify_on_hit = verify_on_hit
+        self._lease_timeout = lease_timeout
+        self._lease_name = f"{socket.gethostname()}-{os.getpid()}-{id(self):x}"
+        self._leases: dict[str, int] = {}
+        self._leases_lock = threading.Lock()
+        # digest and metadata sidecar of the published artifacts
+        self._known: dict[str, tuple[str, dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Cache hit and miss counts.
+
+        :return: hits and misses since the cache was created
+        :rtype: dict[str, int]
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def path_for(self, target: str, build_id: str, artifact_name: str) -> str:
+        """Return the cache path of an artifact.
+
+        :param target: build target
+        :type target: str
+        :param build_id: build ID
+        :type build_id: str
+        :param artifact_name: artifact name
+        :type artifact_name: str
+        :return: path of the artifact in the cache
+        :rtype: str
+        """
+        return f"{self._cache_dir}/{target}/{build_id}/{artifact_name}"
+
+    def ensure(
+        self,
+        target: str,
+        build_id: str,
+        artifact_name: str,
+        fetch: Callable[[str], str | None],
+    ) -> str:
+        """Return the cache path of an artifact, fetching it on a miss.
+
+        The digest returned by ``fetch`` is recorded as is. The artifact is
+        only hashed on the OTA server if ``fetch`` returns None.
+
+        :param target: build target
+        :type target: str
+        :param build_id: build ID
+        :type build_id: str
+        :param artifact_name: artifact name
+        :type artifact_name: str
+        :param fetch: callable downloading the artifact to the given path and
+            returning its SHA-256 digest, or None if unknown
+        :type fetch: Callable[[str], str | None]
+        :return: path of the artifact in the cache
+        :rtype: str
+        :raises ValueError: if the downloaded artifact cannot be stored
+        """
+        path = self.path_for(target, build_id, artifact_name)
+        quoted = shlex.quote(path)
+        # the artifact is only touched if it is valid
+        results = self._ota_server.execute_batch(
+            [self._lease_command(path), self._check_command(path), f"touch {quoted}"],
+            timeout=600,
+            stop_on_error=True,
+        )
+        if results[-1].ok and len(results) == 3:  # noqa: PLR2004
+            self.hits += 1
+            _LOGGER.info("OTA cache hit for %s", path)
+            return path
+
+        self.misses += 1
+        _LOGGER.info("OTA cache miss for %s", path)
+        self._known.pop(path, None)
+        partial = f"{path}.partial"
+        # a partial download with a range state file can be resumed
+        self._ota_server.execute_command(
+            f"mkdir -p {shlex.quote(path.rsplit('/', 1)[0])} && "
+            f"(test -f {shlex.quote(partial)}.ranges || rm -f {shlex.quote(partial)})"
+        )
+        digest = fetch(partial)
+        if digest is None:
+            _LOGGER.info("No expected digest for %s, hashing it", artifact_name)
+        record_digest = (
+            f"sha256sum {shlex.quote(partial)} | cut -d' ' -f1"
+            if digest is None
+            else f"echo {shlex.quote(digest)}"
+        )
+        results = self._ota_server.execute_batch(
+            [
+                f"test -s {shlex.quote(partial)} && "
+                f"{record_digest} > {quoted}.sha256 && "
+                f"stat -c %s {shlex.quote(partial)} > {quoted}.size && "
+                f"mv {shlex.quote(partial)} {quoted}",
+                self._list_command(),
+                self._list_leases_command(),
+            ],
+            timeout=600,
+            stop_on_error=True,
+        )
+        if not results[0].ok:
+            err_msg = (
+                f"Failed to store {artifact_name} in the OTA cache: {results[0].output}"
+            )
+            raise ValueError(err_msg)
+        self._evict(results[1].output, results[2].output, keep=path)
+        return path
+
+    def acquire(self, path: str) -> None:
+        """Lease a cached artifact to this process until :meth:`release`.
+
+        Leased artifacts are not evicted. The lease file is written by the
+        next :meth:`ensure` call for the artifact.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        """
+        with self._leases_lock:
+            self._leases[path] = self._leases.get(path, 0) + 1
+
+    def release(self, path: str) -> None:
+        """Release a lease taken with :meth:`acquire`.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        """
+        with self._leases_lock:
+            count = self._leases.pop(path, 0) - 1
+            if count > 0:
+                self._leases[path] = count
+                return
+        self._ota_server.execute_command(
+            f"rm -f {shlex.quote(f'{path}.leases/{self._lease_name}')}"
+        )
+
+    def publish(self, path: str) -> str:
+        """Link a cached artifact into the serving directory.
+
+        The digest and the metadata sidecar of the artifact are read in the
+        same round trip.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        :return: path of the published artifact
+        :rtype: str
+        :raises ValueError: if the artifact cannot be linked
+        """
+        published = f"{self._serve_dir}/{path.rsplit('/', 1)[1]}"
+        quoted = shlex.quote(path)
+        results = self._ota_server.execute_batch(
+            [
+                f"chmod 644 {quoted} && "
+                f"(ln -f {quoted} {shlex.quote(published)} || "
+                f"ln -sf {quoted} {shlex.quote(published)})",
+                f"cat {quoted}.sha256",
+                f"cat {quoted}.metadata.json 2>/dev/null",
+            ]
+        )
+        if not results[0].ok:
+            err_msg = f"Failed to publish {path} to {published}: {results[0].output}"
+            raise ValueError(err_msg)
+        _, digest, metadata = results
+        self._known[path] = digest.output.strip(), _parse_metadata(metadata.output)
+        return published
+
+    def digest(self, path: str) -> str:
+        """Return the SHA-256 digest recorded for a cached artifact.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        :return: hexadecimal SHA-256 digest
+        :rtype: str
+        """
+        if path in self._known:
+            return self._known[path][0]
+        return self._ota_server.execute_command(
+            f"cat {shlex.quote(path)}.sha256"
+        ).strip()
+
+    def read_metadata(self, path: str) -> dict[str, Any]:
+        """Read the metadata sidecar of a cached artifact.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        :return: sidecar content, empty if missing or unreadable
+        :rtype: dict[str, Any]
+        """
+        if path in self._known:
+            return dict(self._known[path][1])
+        return _parse_metadata(
+            self._ota_server.execute_command(
+                f"cat {shlex.quote(path)}.metadata.json 2>/dev/null"
+            )
+        )
+
+    def write_metadata(self, path: str, metadata: dict[str, Any]) -> None:
+        """Replace the metadata sidecar of a cached artifact.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        :param metadata: sidecar content
+        :type metadata: dict[str, Any]
+        """
+        self._ota_server.execute_command(
+            f"printf '%s\\n' {shlex.quote(json.dumps(metadata))} "
+            f"> {shlex.quote(path)}.metadata.json"
+        )
+        if path in self._known:
+            self._known[path] = self._known[path][0], dict(metadata)
+
+    def _check_command(self, path: str) -> str:
+        """Return the command succeeding if a cached artifact is valid.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        :return: shell command
+        :rtype: str
+        """
+        quoted = shlex.quote(path)
+        if self._verify_on_hit:
+            check = (
+                f'[ "$(sha256sum {quoted} | cut -d" " -f1)" = '
+                f'"$(cat {quoted}.sha256)" ]'
+            )
+        else:
+            check = f'[ "$(stat -c %s {quoted})" = "$(cat {quoted}.size)" ]'
+        return f"test -f {quoted} && test -f {quoted}.sha256 && {check}"
+
+    def _lease_command(self, path: str) -> str:
+        """Return the command writing the lease file of this process.
+
+        :param path: path of the artifact in the cache
+        :type path: str
+        :return: shell command
+        :rtype: str
+        """
+        leases = shlex.quote(f"{path}.leases")
+        return f"mkdir -p {leases} && touch {leases}/{shlex.quote(self._lease_name)}"
+
+    def _list_leases_command(self) -> str:
+        """Return the command listing the leased artifacts.
+
+        :return: shell command printing the lease directory of every artifact
+            with a lease younger than the lease timeout
+        :rtype: str
+        """
+        return (
+            f"find {shlex.quote(self._cache_dir)} -path '*.leases/*' -type f "
+            f"-mmin -{max(1, int(self._lease_timeout // 60))} -printf '%h\\n'"
+        )
+
+    def _list_command(self) -> str:
+        """Return the command listing the cached artifacts.
+
+        :return: shell command printing the modification time, size and path
+            of every artifact
+        :rtype: str
+        """
+        return (
+            f"find {shlex.quote(self._cache_dir)} -type f ! -name '*.sha256' "
+            f"! -name '*.size' ! -name '*.partial' ! -name '*.metadata.json' "
+            f"! -name '*.ranges' ! -path '*.leases/*' "
+            f"-printf '%T@ %s %p\\n'"
+        )
+
+    def _evict(self, listing: str, leases: str, keep: str) -> None:
+        """Remove the least recently used artifacts beyond the disk budget.
+
+        Artifacts leased by any process, or being fetched or served by this
+        one, are kept even if the cache stays over its budget.
+
+        :param listing: output of the :meth:`_list_command` command
+        :type listing: str
+        :param leases: output of the :meth:`_list_leases_command` command
+        :type leases: str
+        :param keep: artifact that must not be evicted
+        :type keep: str
+        """
+        with self._leases_lock:
+            in_use = {keep, *self._leases}
+        in_use.update(
+            line.strip().removesuffix(".leases")
+            for line in leases.splitlines()
+            if line.strip().endswith(".leases")
+        )
+        entries = []
+        for line in listing.splitlines():
+            parts = line.strip().split(" ", 2)
+            if len(parts) == 3 and parts[1].isdigit():  # noqa: PLR2004
+                entries.append((float(parts[0]), int(parts[1]), parts[2]))
+        total = sum(size for _, size, _ in entries)
+        removals = []
+        for _, size, path in sorted(entries):
+            if total <= self._budget_bytes:
+                break
+            if path in in_use:
+                continue
+            _LOGGER.info("Evicting %s from the OTA cache", path)
+            self._known.pop(path, None)
+            quoted = shlex.quote(path)
+            # published hard links would keep the data on disk
+            removals.append(
+                f"find {shlex.quote(self._serve_dir)} -maxdepth 1 "
+                f"\\( -samefile {quoted} -o -lname {quoted} \\) -delete; "
+                f"rm -f {quoted} {quoted}.sha256 {quoted}.size {quoted}.metadata.json; "
+                f"rm -rf {quoted}.leases"
+            )
+            total -= size
+        self._ota_server.execute_batch(removals)
+
+
+def _parse_metadata(output: str) -> dict[str, Any]:
+    """Parse the content of a metadata sidecar.
+
+    :param output: sidecar content
+    :type output: str
+    :return: sidecar content, empty if missing or unreadable
+    :rtype: dict[str, Any]
+    """
+    try:
+        metadata = json.loads(output)
+    except ValueError:
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
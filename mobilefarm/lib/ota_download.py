@@ -0,0 +1,356 @@
+"""Mobilefarm parallel, resumable HTTP range downloader.
+
+The module only depends on the standard library so that it can be copied to
+and run on the OTA server host::
+
+    python3 ota_download.py --connections 8 URL OUTPUT
+
+It prints ``PROGRESS <done> <total>`` lines while downloading and a final
+``DOWNLOAD OK <sha256>`` or ``DOWNLOAD FAILED <reason>`` line.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from typing import Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_CHUNK_SIZE = 32 * 1024 * 1024
+_READ_SIZE = 1024 * 1024
+_STATE_SUFFIX = ".ranges"
+
+
+class RangeDownloader:
+    """Download a file over parallel HTTP range requests.
+
+    The file is split in fixed-size chunks fetched by ``connections`` worker
+    threads and written in place at their offset. Completed chunks are
+    recorded in a ``<output>.ranges`` state file, so a download interrupted
+    for any reason resumes with the missing chunks only, as long as the
+    remote file size and ``ETag`` did not change. Servers without range
+    support, or not announcing the file size, are downloaded with a single
+    plain request.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        url: str,
+        output: str,
+        connections: int = DEFAULT_CONNECTIONS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        timeout: float = 30,
+        retries: int = 3,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> None:
+        """Initialize the downloader.
+
+        :param url: URL of the file to download
+        :type url: str
+        :param output: path of the downloaded file
+        :type output: str
+        :param connections: number of parallel connections
+        :type connections: int
+        :param chunk_size: size of the range requested at once, in bytes
+        :type chunk_size: int
+        :param timeout: socket timeout of each request, in seconds
+        :type timeout: float
+        :param retries: attempts per chunk before giving up
+        :type retries: int
+        :param progress: callable receiving the downloaded and total byte
+            counts, called from the worker threads
+        :type progress: Callable[[int, int], None] | None
+        """
+        self._url = url
+        self._output = output
+        self._state_path = f"{output}{_STATE_SUFFIX}"
+        self._connections = max(1, connections)
+        self._chunk_size = chunk_size
+        self._timeout = timeout
+        self._retries = retries
+        self._progress = progress
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+
+    def download(self, expected_sha256: str | None = None) -> str:
+        """Download the file, resuming a previous partial download.
+
+        :param expected_sha256: expected SHA-256 digest of the file
+        :type expected_sha256: str | None
+        :return: SHA-256 digest of the downloaded file
+        :rtype: str
+        :raises ValueError: if the downloaded file does not match the expected
+            size or digest
+        """
+        size, etag, ranges = self._probe()
+        self._total = size or 0
+        if ranges and size is not None:
+            self._download_ranges(size, etag)
+        else:
+            _LOGGER.info("%s does not support range requests", self._url)
+            self._download_whole()
+        actual_size = os.path.getsize(self._output)
+        # without a length, http.client detects a truncated chunked body
+        if size is not None and actual_size != size:
+            err_msg = f"Downloaded {actual_size} bytes instead of {size}"
+            raise ValueError(err_msg)
+        digest = _sha256(self._output)
+        if expected_sha256 is not None and digest != expected_sha256.lower():
+            self._discard()
+            err_msg = f"SHA-256 mismatch: expected {expected_sha256}, got {digest}"
+            raise ValueError(err_msg)
+        if os.path.exists(self._state_path):
+            os.remove(self._state_path)
+        return digest
+
+    def _probe(self) -> tuple[int | None, str, bool]:
+        """Return the size, ETag and range support of the remote file.
+
+        :return: size in bytes, None if the server does not send it, ETag and
+            True if ranges are supported
+        :rtype: tuple[int | None, str, bool]
+        """
+        request = urllib.request.Request(  # noqa: S310
+            self._url, headers={"Range": "bytes=0-0"}
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:  # noqa: S310
+            etag = response.headers.get("ETag", "")
+            content_range = response.headers.get("Content-Range", "")
+            if response.status == 206 and "/" in content_range:  # noqa: PLR2004
+                return int(content_range.rsplit("/", 1)[1]), etag, True
+            length = response.headers.get("Content-Length")
+            return (int(length) if length is not None else None), etag, False
+
+    def _load_state(self, size: int, etag: str) -> set[int]:
+        try:
+            with open(self._state_path, encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return set()
+        if (
+            state.get("size") != size
+            or state.get("etag") != etag
+            or state.get("chunk_size") != self._chunk_size
+            or not os.path.exists(self._output)
+        ):
+            _LOGGER.info("Discarding stale partial download of %s", self._output)
+            return set()
+        return set(state.get("done", []))
+
+    def _save_state(self, size: int, etag: str, done: set[int]) -> None:
+        state = {
+            "size": size,
+            "etag": etag,
+            "chunk_size": self._chunk_size,
+            "done": sorted(done),
+        }
+        temporary = f"{self._state_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temporary, self._state_path)
+
+    def _download_ranges(self, size: int, etag: str) -> None:
+        done = self._load_state(size, etag)
+        chunks = range((size + self._chunk_size - 1) // self._chunk_size)
+        if not done:
+            with open(self._output, "wb") as file:
+                file.truncate(size)
+            self._save_state(size, etag, done)
+        else:
+            _LOGGER.info(
+                "Resuming %s with %d of %d chunks done",
+                self._output,
+                len(done),
+                len(chunks),
+            )
+        self._done = sum(
+            min(self._chunk_size, size - index * self._chunk_size) for index in done
+        )
+        pending: queue.Queue[int] = queue.Queue()
+        for index in chunks:
+            if index not in done:
+                pending.put(index)
+        errors: list[Exception] = []
+        fd = os.open(self._output, os.O_WRONLY)
+        try:
+            workers = [
+                threading.Thread(
+                    target=self._worker,
+                    args=(fd, pending, size, etag, done, errors),
+                    daemon=True,
+                )
+                for _ in range(min(self._connections, max(1, pending.qsize())))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            os.close(fd)
+        if errors:
+            raise errors[0]
+
+    def _worker(  # noqa: PLR0913
+        self,
+        fd: int,
+        pending: queue.Queue[int],
+        size: int,
+        etag: str,
+        done: set[int],
+        errors: list[Exception],
+    ) -> None:
+        while not errors:
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            start = index * self._chunk_size
+            end = min(start + self._chunk_size, size) - 1
+            for attempt in range(1, self._retries + 1):
+                try:
+                    self._fetch_range(fd, start, end)
+                    break
+                except (OSError, ValueError) as exc:
+                    if attempt == self._retries:
+                        errors.append(exc)
+                        return
+                    _LOGGER.warning(
+                        "Range %d-%d failed (attempt %d): %s", start, end, attempt, exc
+                    )
+                    time.sleep(attempt)
+            with self._lock:
+                done.add(index)
+                self._save_state(size, etag, done)
+
+    def _fetch_range(self, fd: int, start: int, end: int) -> None:
+        """Download one byte range and write it at its offset.
+
+        :param fd: file descriptor of the output file
+        :type fd: int
+        :param start: first byte of the range
+        :type start: int
+        :param end: last byte of the range, inclusive
+        :type end: int
+        :raises ValueError: if the server returns another range
+        """
+        request = urllib.request.Request(  # noqa: S310
+            self._url, headers={"Range": f"bytes={start}-{end}"}
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:  # noqa: S310
+            content_range = response.headers.get("Content-Range", "")
+            if response.status != 206 or not content_range.startswith(  # noqa: PLR2004
+                f"bytes {start}-{end}/"
+            ):
+                err_msg = f"Unexpected response to range {start}-{end}: {content_range}"
+                raise ValueError(err_msg)
+            offset = start
+            while offset <= end:
+                data = response.read(min(_READ_SIZE, end + 1 - offset))
+                if not data:
+                    err_msg = f"Range {start}-{end} truncated at {offset}"
+                    raise ValueError(err_msg)
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+                self._advance(len(data))
+
+    def _download_whole(self) -> None:
+        self._done = 0
+        with urllib.request.urlopen(self._url, timeout=self._timeout) as response:  # noqa: S310
+            with open(self._output, "wb") as file:
+                while data := response.read(_READ_SIZE):
+                    file.write(data)
+                    self._advance(len(data))
+
+    def _advance(self, count: int) -> None:
+        with self._lock:
+            self._done += count
+            done = self._done
+        if self._progress is not None:
+            self._progress(done, self._total)
+
+    def _discard(self) -> None:
+        for path in (self._output, self._state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while data := file.read(_READ_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class _ProgressPrinter:
+    """Print throttled ``PROGRESS`` lines for the console reading them."""
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, done: int, total: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            # the total is 0 if the server did not send the file size
+            if now - self._last < self._interval and (done < total or not total):
+                return
+            self._last = now
+            sys.stdout.write(f"PROGRESS {done} {total}\n")
+            sys.stdout.flush()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Download a file from the command line.
+
+    :param argv: command line arguments, ``sys.argv`` if None
+    :type argv: list[str] | None
+    :return: exit code
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("output")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--sha256", help="expected SHA-256 digest")
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=5,
+        help="seconds between progress lines",
+    )
+    args = parser.parse_args(argv)
+    downloader = RangeDownloader(
+        args.url,
+        args.output,
+        connections=args.connections,
+        chunk_size=args.chunk_size,
+        timeout=args.timeout,
+        progress=_ProgressPrinter(args.progress_interval),
+    )
+    try:
+        digest = downloader.download(expected_sha256=args.sha256)
+    except Exception as exc:  # pylint: disable=broad-except  # noqa: BLE001
+        # the console reading the output waits for a final line
+        print(f"DOWNLOAD FAILED {type(exc).__name__}: {exc}", flush=True)  # noqa: T201
+        return 1
+    print(f"DOWNLOAD OK {digest}", flush=True)  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,503 @@
+"""Mobilefarm HTTP range server for OTA payload streaming.
+
+``update_engine_client --payload=<url> --offset --size`` streams the payload
+out of the OTA zip with HTTP range requests. This asyncio server answers
+them with ``sendfile`` and keeps connections alive between ranges. A
+per-client bandwidth cap and connection limits keep dozens of devices
+updating at once from starving each other. The module only depends on the
+standard library so that it can be copied to and run on the OTA server
+host::
+
+    python3 ota_http_server.py --root /tftpboot --port 8080
+
+Per-client throughput is logged periodically and served as JSON on
+``/_stats``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import email.utils
+import json
+import logging
+import os
+import posixpath
+import re
+import sys
+import time
+import urllib.parse
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, BinaryIO
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+DEFAULT_MAX_CONNECTIONS = 256
+DEFAULT_MAX_CONNECTIONS_PER_CLIENT = 8
+STATS_PATH = "/_stats"
+_MAX_HEADER_SIZE = 16 * 1024
+_SLICE_SIZE = 1024 * 1024
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+_REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    503: "Service Unavailable",
+}
+
+
+@dataclass
+class ClientStats:
+    """Transfer statistics of one client."""
+
+    requests: int = 0
+    bytes_sent: int = 0
+    seconds: float = 0.0
+    connections: int = 0
+    rejected: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """Average throughput while responses to the client are in progress.
+
+        ``seconds`` is the wall time during which at least one file response
+        to the client is being sent, from its first byte to its last one,
+        including the bandwidth cap waits but not the idle keep-alive time,
+        so that parallel connections are not counted twice.
+
+        :return: throughput in bytes per second
+        :rtype: float
+        """
+        return self.bytes_sent / self.seconds if self.seconds else 0.0
+
+
+class _TokenBucket:
+    """Limit the send rate of one client, shared by all its connections."""
+
+    def __init__(self, rate: float) -> None:
+        self._rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def consume(self, count: int) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._rate, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            self._tokens -= count
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self._rate)
+
+
+class OTAHttpServer:
+    """Serve the files of a directory with HTTP/1.1 range requests."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        root: str,
+        host: str = "0.0.0.0",  # noqa: S104
+        port: int = DEFAULT_PORT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_connections_per_client: int = DEFAULT_MAX_CONNECTIONS_PER_CLIENT,
+        client_rate: float = 0,
+        idle_timeout: float = 60,
+    ) -> None:
+        """Initialize the server.
+
+        :param root: directory to serve
+        :type root: str
+        :param host: address to listen on
+        :type host: str
+        :param port: port to listen on, 0 for any free port
+        :type port: int
+        :param max_connections: maximum number of open connections
+        :type max_connections: int
+        :param max_connections_per_client: maximum number of open connections
+            of one client address
+        :type max_connections_per_client: int
+        :param client_rate: bandwidth cap of one client address, in bytes per
+            second, 0 for no cap
+        :type client_rate: float
+        :param idle_timeout: time a kept-alive connection may stay idle, in
+            seconds
+        :type idle_timeout: float
+        """
+        self._root = os.path.abspath(root)
+        self._host = host
+        self._port = port
+        self._max_connections = max_connections
+        self._max_connections_per_client = max_connections_per_client
+        self._client_rate = client_rate
+        self._idle_timeout = idle_timeout
+        self._connections = 0
+        self._clients: dict[str, ClientStats] = {}
+        self._buckets: dict[str, _TokenBucket] = {}
+        self._responding: dict[str, tuple[int, float]] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def port(self) -> int:
+        """Port the server listens on.
+
+        :return: listening port
+        :rtype: int
+        """
+        if self._server is not None and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Return the transfer statistics of every client.
+
+        :return: statistics and throughput in MiB/s, per client address
+        :rtype: dict[str, dict[str, float]]
+        """
+        return {
+            client: {**asdict(stats), "mib_per_second": stats.throughput / 1024**2}
+            for client, stats in self._clients.items()
+        }
+
+    async def start(self) -> None:
+        """Start listening."""
+        self._server = await asyncio.start_server(
+            self._handle, self._host, self._port, limit=_MAX_HEADER_SIZE
+        )
+        _LOGGER.info("Serving %s on %s:%d", self._root, self._host, self.port)
+
+    async def serve_forever(self, stats_interval: float = 60) -> None:
+        """Serve until cancelled, logging client statistics periodically.
+
+        :param stats_interval: seconds between statistics logs, 0 to disable
+        :type stats_interval: float
+        """
+        if self._server is None:
+            await self.start()
+        reporter = (
+            asyncio.ensure_future(self._report_stats(stats_interval))
+            if stats_interval
+            else None
+        )
+        try:
+            async with self._server:  # type: ignore[union-attr]
+                await self._server.serve_forever()  # type: ignore[union-attr]
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+
+    def close(self) -> None:
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+
+    async def _report_stats(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for client, stats in self._clients.items():
+                _LOGGER.info(
+                    "%s: %d requests, %d MiB sent at %.1f MiB/s, %d connections",
+                    client,
+                    stats.requests,
+                    stats.bytes_sent // 1024**2,
+                    stats.throughput / 1024**2,
+                    stats.connections,
+                )
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        client = writer.get_extra_info("peername")[0]
+        stats = self._clients.setdefault(client, ClientStats())
+        if (
+            self._connections >= self._max_connections
+            or stats.connections >= self._max_connections_per_client
+        ):
+            stats.rejected += 1
+            await self._send_error(writer, 503, keep_alive=False)
+            writer.close()
+            return
+        self._connections += 1
+        stats.connections += 1
+        try:
+            while await self._handle_request(client, reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._connections -= 1
+            stats.connections -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _handle_request(
+        self, client: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> bool:
+        """Answer one request.
+
+        :param client: client address
+        :type client: str
+        :param reader: connection reader
+        :type reader: asyncio.StreamReader
+        :param writer: connection writer
+        :type writer: asyncio.StreamWriter
+        :return: True if the connection is kept alive
+        :rtype: bool
+        """
+        try:
+            head = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), self._idle_timeout
+            )
+        except asyncio.LimitOverrunError:
+            await self._send_error(writer, 400, keep_alive=False)
+            return False
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = request_line.split(" ")
+        except ValueError:
+            await self._send_error(writer, 400, keep_alive=False)
+            return False
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = (
+            connection != "close"
+            if version == "HTTP/1.1"
+            else connection == "keep-alive"
+        )
+        stats = self._clients[client]
+        stats.requests += 1
+        if method not in ("GET", "HEAD"):
+            await self._send_error(writer, 405, keep_alive)
+            return keep_alive
+        path = urllib.parse.unquote(urllib.parse.urlsplit(target).path)
+        if path == STATS_PATH:
+            body = json.dumps(self.stats()).encode()
+            await self._send_head(
+                writer, 200, {"Content-Type": "application/json"}, len(body), keep_alive
+            )
+            if method == "GET":
+                writer.write(body)
+                await writer.drain()
+            return keep_alive
+        file_path = self._resolve(path)
+        if file_path is None:
+            await self._send_error(writer, 404, keep_alive)
+            return keep_alive
+        with open(file_path, "rb") as file:
+            file_stat = os.fstat(file.fileno())
+            size = file_stat.st_size
+            extra_headers = {
+                "Accept-Ranges": "bytes",
+                "Content-Type": "application/octet-stream",
+                "Last-Modified": email.utils.formatdate(
+                    file_stat.st_mtime, usegmt=True
+                ),
+                "ETag": f'"{file_stat.st_mtime_ns:x}-{size:x}"',
+            }
+            status, start, length = 200, 0, size
+            if "range" in headers:
+                byte_range = _parse_range(headers["range"], size)
+                if byte_range is None:
+                    extra_headers["Content-Range"] = f"bytes */{size}"
+                    await self._send_error(writer, 416, keep_alive, extra_headers)
+                    return keep_alive
+                start, length = byte_range
+                status = 206
+                extra_headers["Content-Range"] = (
+                    f"bytes {start}-{start + length - 1}/{size}"
+                )
+            with self._timed(client):
+                await self._send_head(
+                    writer, status, extra_headers, length, keep_alive
+                )
+                if method == "GET":
+                    await self._send_file(client, writer, file, start, length)
+        return keep_alive
+
+    @contextlib.contextmanager
+    def _timed(self, client: str) -> Iterator[None]:
+        """Account the wall time of a file response to the client statistics.
+
+        :param client: client address
+        :type client: str
+        :yield: control while the response is sent
+        :rtype: Iterator[None]
+        """
+        count, since = self._responding.get(client, (0, time.monotonic()))
+        self._responding[client] = (count + 1, since)
+        try:
+            yield
+        finally:
+            count, since = self._responding.pop(client)
+            if count > 1:
+                self._responding[client] = (count - 1, since)
+            else:
+                self._clients[client].seconds += time.monotonic() - since
+
+    def _resolve(self, path: str) -> str | None:
+        """Map a request path to a served file.
+
+        Published artifacts may be symbolic links to a cache outside the
+        root, so the check is done on the normalized request path.
+
+        :param path: decoded request path
+        :type path: str
+        :return: file path, None if outside the root or not a file
+        :rtype: str | None
+        """
+        normalized = posixpath.normpath(path).lstrip("/")
+        if normalized.startswith("..") or "\0" in normalized:
+            return None
+        file_path = os.path.join(self._root, normalized)
+        return file_path if os.path.isfile(file_path) else None
+
+    async def _send_file(  # noqa: PLR0913
+        self,
+        client: str,
+        writer: asyncio.StreamWriter,
+        file: BinaryIO,
+        start: int,
+        length: int,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        stats = self._clients[client]
+        bucket = None
+        slice_size = _SLICE_SIZE
+        if self._client_rate:
+            bucket = self._buckets.setdefault(client, _TokenBucket(self._client_rate))
+            slice_size = max(64 * 1024, min(_SLICE_SIZE, int(self._client_rate / 10)))
+        offset, end = start, start + length
+        while offset < end:
+            count = min(slice_size, end - offset)
+            if bucket is not None:
+                await bucket.consume(count)
+            sent = await loop.sendfile(
+                writer.transport,
+                file,
+                offset,
+                count,
+            )
+            stats.bytes_sent += sent
+            offset += sent
+
+    async def _send_head(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        headers: dict[str, str],
+        length: int,
+        keep_alive: bool,
+    ) -> None:
+        lines = [
+            f"HTTP/1.1 {status} {_REASONS[status]}",
+            f"Date: {email.utils.formatdate(usegmt=True)}",
+            f"Content-Length: {length}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            *(f"{name}: {value}" for name, value in headers.items()),
+        ]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _send_error(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        keep_alive: bool,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        body = f"{status} {_REASONS[status]}\n".encode()
+        await self._send_head(
+            writer,
+            status,
+            {"Content-Type": "text/plain", **(headers or {})},
+            len(body),
+            keep_alive,
+        )
+        writer.write(body)
+        await writer.drain()
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single byte range.
+
+    :param header: Range header value
+    :type header: str
+    :param size: size of the file
+    :type size: int
+    :return: start and length of the range, None if not satisfiable
+    :rtype: tuple[int, int] | None
+    """
+    match = _RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return None
+        start = max(0, size - int(last))
+        return start, size - start
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end - start + 1
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the server from the command line.
+
+    :param argv: command line arguments, ``sys.argv`` if None
+    :type argv: list[str] | None
+    :return: exit code
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", required=True, help="directory to serve")
+    parser.add_argument("--host", default="0.0.0.0")  # noqa: S104
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS
+    )
+    parser.add_argument(
+        "--max-connections-per-client",
+        type=int,
+        default=DEFAULT_MAX_CONNECTIONS_PER_CLIENT,
+    )
+    parser.add_argument(
+        "--client-rate-mib",
+        type=float,
+        default=0,
+        help="bandwidth cap per client in MiB/s, 0 for no cap",
+    )
+    parser.add_argument("--stats-interval", type=float, default=60)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    server = OTAHttpServer(
+        args.root,
+        host=args.host,
+        port=args.port,
+        max_connections=args.max_connections,
+        max_connections_per_client=args.max_connections_per_client,
+        client_rate=args.client_rate_mib * 1024**2,
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(server.serve_forever(args.stats_interval))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
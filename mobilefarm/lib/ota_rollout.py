@@ -0,0 +1,385 @@
+"""Mobilefarm fleet OTA rollout."""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import logging.config
+import statistics
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import pexpect
+from boardfarm3.configs import LOGGING_CONFIG
+from boardfarm3.exceptions import DeviceBootFailure, DeviceConnectionError
+from boardfarm3.lib.boardfarm_config import get_json
+from boardfarm3.main import get_plugin_manager
+
+from mobilefarm.devices.cuttlefish import CuttleFish
+from mobilefarm.templates.ota_server import OTAServerTemplate
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from mobilefarm.lib.update_engine import UpdateEngineEvent
+
+_LOGGER = logging.getLogger(__name__)
+
+_ROLLOUT_ERRORS = (
+    DeviceBootFailure,
+    DeviceConnectionError,
+    TimeoutError,
+    ValueError,
+    OSError,
+    pexpect.ExceptionPexpect,
+)
+
+
+@dataclass
+class RolloutResult:
+    """Outcome of the rollout on one device."""
+
+    device_name: str
+    status: str = "pending"
+    attempts: int = 0
+    seconds: float = 0.0
+    download_seconds: float = 0.0
+    payload_bytes: int = 0
+    kind: str | None = None
+    error: str | None = None
+
+    @property
+    def throughput(self) -> float:
+        """Payload download throughput of the device.
+
+        :return: bytes per second, 0 if unknown
+        :rtype: float
+        """
+        if not self.download_seconds:
+            return 0.0
+        return self.payload_bytes / self.download_seconds
+
+
+class _BandwidthGate:
+    """Admit device downloads while they fit in the server bandwidth budget.
+
+    Every download reserves the expected per-device throughput, which is the
+    median observed so far (an even share of the budget at first), and
+    releases it as soon as update_engine leaves the download phase, so that
+    verifying and rebooting devices do not hold bandwidth.
+    """
+
+    def __init__(self, budget: float, parallelism: int) -> None:
+        self._budget = budget
+        self._initial_estimate = budget / parallelism
+        self._condition = threading.Condition()
+        self._reserved: dict[str, float] = {}
+        self._observed: list[float] = []
+
+    def acquire(self, device_name: str) -> None:
+        with self._condition:
+            while True:
+                estimate = (
+                    statistics.median(self._observed)
+                    if self._observed
+                    else self._initial_estimate
+                )
+                # a single download is always admitted, even above budget
+                if (
+                    not self._reserved
+                    or sum(self._reserved.values()) + estimate <= self._budget
+                ):
+                    self._reserved[device_name] = estimate
+                    return
+                self._condition.wait()
+
+    def release(self, device_name: str) -> None:
+        with self._condition:
+            if self._reserved.pop(device_name, None) is not None:
+                self._condition.notify_all()
+
+    def observe(self, throughput: float) -> None:
+        if throughput > 0:
+            with self._condition:
+                self._observed.append(throughput)
+                self._condition.notify_all()
+
+
+class OTARollout:
+    """Update a fleet of Cuttlefish devices to one build.
+
+    The packages are fetched once on the OTA server before any device is
+    updated. Up to ``parallelism`` devices are then updated concurrently, the
+    downloads being admitted within an optional server bandwidth budget.
+    Failed devices are retried with a fresh console, and an unexpected error
+    on one device is recorded in its result instead of aborting the rollout.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        ota_server: OTAServerTemplate,
+        devices: Iterable[CuttleFish],
+        build_id: str | None = None,
+        parallelism: int = 4,
+        bandwidth_budget: float = 0,
+        retries: int = 1,
+    ) -> None:
+        """Initialize the rollout.
+
+        :param ota_server: OTA server serving the packages
+        :type ota_server: OTAServerTemplate
+        :param devices: Cuttlefish devices to update
+        :type devices: Iterable[CuttleFish]
+        :param build_id: Build ID to update the devices to, the configured
+            build of each device if None
+        :type build_id: str | None
+        :param parallelism: maximum number of devices updated at once
+        :type parallelism: int
+        :param bandwidth_budget: OTA server bandwidth shared by the
+            downloads, in bytes per second, 0 for no budget
+        :type bandwidth_budget: float
+        :param retries: additional attempts for a failed device
+        :type retries: int
+        :raises ValueError: if parallelism is lower than 1
+        """
+        if parallelism < 1:
+            err_msg = f"Parallelism must be at least 1, got {parallelism}"
+            raise ValueError(err_msg)
+        self._ota_server = ota_server
+        self._devices = list(devices)
+        self._build_id = build_id
+        self._parallelism = parallelism
+        self._retries = retries
+        self._gate = (
+            _BandwidthGate(bandwidth_budget, parallelism) if bandwidth_budget else None
+        )
+
+    def run(self) -> list[RolloutResult]:
+        """Roll the build out to every device.
+
+        :return: result of every device, in the order of the devices
+        :rtype: list[RolloutResult]
+        """
+        self._prefetch()
+        with ThreadPoolExecutor(
+            max_workers=self._parallelism, thread_name_prefix="mobilefarm-rollout"
+        ) as executor:
+            return list(executor.map(self._update_device, self._devices))
+
+    def _prefetch(self) -> None:
+        """Fetch and parse every full package once, before updating devices."""
+        packages = {
+            (
+                device.target,
+                self._build_id or device.build_id,
+                device.ota_artifact_name(self._build_id or device.build_id),
+                device.config.get("secondary_payload", False),
+            )
+            for device in self._devices
+        }
+        for target, build_id, artifact_name, secondary_payload in sorted(packages):
+            _LOGGER.info("Prefetching %s on the OTA server", artifact_name)
+            self._ota_server.serve_ota_package(
+                target, build_id, artifact_name, secondary_payload
+            )
+            self._ota_server.release_ota_package(target, build_id, artifact_name)
+
+    def _update_device(self, device: CuttleFish) -> RolloutResult:
+        result = RolloutResult(device.device_name)
+        started = time.monotonic()
+        try:
+            self._update(device, result)
+        except Exception as exc:  # pylint: disable=broad-except
+            _LOGGER.exception("Unexpected error while updating %s", device.device_name)
+            result.status = "failed"
+            result.error = f"{type(exc).__name__}: {exc}"
+        result.seconds = time.monotonic() - started
+        return result
+
+    def _update(self, device: CuttleFish, result: RolloutResult) -> None:
+        while result.attempts <= self._retries:
+            result.attempts += 1
+            if self._gate is not None:
+                self._gate.acquire(device.device_name)
+            try:
+                if result.attempts > 1:
+                    # a fresh console also recovers from a failed attempt
+                    with contextlib.suppress(*_ROLLOUT_ERRORS):
+                        device.console.close()
+                device.boardfarm_skip_boot()
+                updated = device.apply_ota(
+                    self._ota_server,
+                    build_id=self._build_id,
+                    on_event=lambda event, name=device.device_name: self._on_event(
+                        name, event
+                    ),
+                )
+            except _ROLLOUT_ERRORS as exc:
+                result.error = str(exc)
+                _LOGGER.warning(
+                    "Attempt %d to update %s failed: %s",
+                    result.attempts,
+                    device.device_name,
+                    exc,
+                )
+                continue
+            finally:
+                if self._gate is not None:
+                    self._gate.release(device.device_name)
+            result.status = "updated" if updated else "skipped"
+            result.error = None
+            if updated and device.last_ota is not None:
+                result.kind = device.last_ota["kind"]
+                result.payload_bytes = device.last_ota["payload_bytes"]
+                result.download_seconds = device.ota_phase_timings.get("download", 0)
+                if self._gate is not None:
+                    self._gate.observe(result.throughput)
+            break
+        else:
+            result.status = "failed"
+
+    def _on_event(self, device_name: str, event: UpdateEngineEvent) -> None:
+        if self._gate is not None and event.phase in ("verify", "finalize", "done"):
+            self._gate.release(device_name)
+
+
+def format_summary(results: list[RolloutResult], wall_seconds: float) -> str:
+    """Format the results of a rollout as a table.
+
+    :param results: results of the rollout
+    :type results: list[RolloutResult]
+    :param wall_seconds: duration of the whole rollout, in seconds
+    :type wall_seconds: float
+    :return: per-device table followed by totals
+    :rtype: str
+    """
+    lines = [
+        f"{'device':<24} {'status':<8} {'kind':<11} {'tries':>5} "
+        f"{'total s':>8} {'dl s':>7} {'MiB/s':>7}  error",
+    ]
+    lines.extend(
+        f"{result.device_name:<24} {result.status:<8} {result.kind or '-':<11} "
+        f"{result.attempts:>5} {result.seconds:>8.0f} "
+        f"{result.download_seconds:>7.0f} {result.throughput / 1024**2:>7.1f}  "
+        f"{result.error or ''}"
+        for result in results
+    )
+    counts = {
+        status: sum(result.status == status for result in results)
+        for status in ("updated", "skipped", "failed")
+    }
+    total_bytes = sum(result.payload_bytes for result in results)
+    lines.append(
+        f"{counts['updated']} updated, {counts['skipped']} skipped, "
+        f"{counts['failed']} failed in {wall_seconds:.0f}s, "
+        f"{total_bytes / 1024**2 / max(wall_seconds, 1e-9):.1f} MiB/s aggregate"
+    )
+    return "\n".join(lines)
+
+
+def _add_rollout_args(argparser: ArgumentParser) -> None:
+    group = argparser.add_argument_group("OTA rollout")
+    group.add_argument(
+        "--build-id", help="build ID to roll out, the configured build by default"
+    )
+    group.add_argument(
+        "--devices",
+        nargs="+",
+        default=[],
+        help="names of the Cuttlefish devices to update, all by default",
+    )
+    group.add_argument(
+        "--parallelism", type=int, default=4, help="devices updated at once"
+    )
+    group.add_argument(
+        "--bandwidth-budget-mbps",
+        type=float,
+        default=0,
+        help="OTA server bandwidth budget in MiB/s, 0 for no budget",
+    )
+    group.add_argument(
+        "--retries", type=int, default=1, help="additional attempts per device"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Roll an OTA build out to the Cuttlefish devices of a board.
+
+    The board is deployed with the usual boardfarm command line arguments,
+    without booting the devices.
+
+    :param argv: command line arguments, ``sys.argv`` if None
+    :type argv: list[str] | None
+    :return: exit code, 1 if any device failed
+    :rtype: int
+    """
+    logging.config.dictConfig(LOGGING_CONFIG)
+    argparser = ArgumentParser("mobilefarm-ota-rollout")
+    plugin_manager = get_plugin_manager()
+    plugin_manager.hook.boardfarm_add_cmdline_args(argparser=argparser)
+    _add_rollout_args(argparser)
+    cmdline_args = plugin_manager.hook.boardfarm_cmdline_parse(
+        argparser=argparser,
+        cmdline_args=sys.argv[1:] if argv is None else argv,
+    )
+    plugin_manager.hook.boardfarm_configure(
+        cmdline_args=cmdline_args,
+        plugin_manager=plugin_manager,
+    )
+    inventory_config = plugin_manager.hook.boardfarm_reserve_devices(
+        cmdline_args=cmdline_args,
+        plugin_manager=plugin_manager,
+    )
+    config = plugin_manager.hook.boardfarm_parse_config(
+        cmdline_args=cmdline_args,
+        inventory_config=inventory_config,
+        env_config=get_json(cmdline_args.env_config),
+    )
+    deployment_status: dict[str, Any] = {}
+    try:
+        device_manager = plugin_manager.hook.boardfarm_register_devices(
+            config=config,
+            cmdline_args=cmdline_args,
+            plugin_manager=plugin_manager,
+        )
+        ota_server = device_manager.get_device_by_type(
+            OTAServerTemplate,  # type:ignore[type-abstract]
+        )
+        ota_server.boardfarm_skip_boot()
+        devices = [
+            device
+            for device in device_manager.get_devices_by_type(CuttleFish).values()
+            if not cmdline_args.devices or device.device_name in cmdline_args.devices
+        ]
+        rollout = OTARollout(
+            ota_server,
+            devices,
+            build_id=cmdline_args.build_id,
+            parallelism=cmdline_args.parallelism,
+            bandwidth_budget=cmdline_args.bandwidth_budget_mbps * 1024**2,
+            retries=cmdline_args.retries,
+        )
+        started = time.monotonic()
+        results = rollout.run()
+        print(format_summary(results, time.monotonic() - started))  # noqa: T201
+        deployment_status = {"status": "success"}
+    except Exception:  # pylint: disable=broad-except
+        deployment_status = {"status": "failed", "exception": sys.exc_info()[1]}
+        raise
+    finally:
+        plugin_manager.hook.boardfarm_release_devices(
+            config=config,
+            cmdline_args=cmdline_args,
+            plugin_manager=plugin_manager,
+            deployment_status=deployment_status,
+        )
+    return int(any(result.status == "failed" for result in results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
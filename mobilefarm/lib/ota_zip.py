@@ -0,0 +1,252 @@
+"""Mobilefarm OTA zip payload locator.
+
+``update_engine`` streams ``payload.bin`` straight out of the OTA zip, so it
+only needs the offset and size of that entry plus the content of
+``payload_properties.txt``. Both can be found from the zip central directory
+without decompressing or copying the multi-GB payload: the zip is either
+memory mapped or read with HTTP range requests.
+"""
+
+from __future__ import annotations
+
+import mmap
+import re
+import struct
+import urllib.request
+import zlib
+from pathlib import Path
+from typing import Protocol
+
+_EOCD = struct.Struct("<4s4H2LH")
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+_ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_CENTRAL_HEADER_SIGNATURE = b"PK\x01\x02"
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_ZIP64_EXTRA_ID = 0x0001
+_MAX_COMMENT = 0xFFFF
+_STORED = 0
+_DEFLATED = 8
+
+
+class _RangeReader(Protocol):
+    size: int
+
+    def read(self, offset: int, length: int) -> bytes: ...
+
+
+class _MmapReader:
+    """Read byte ranges of a local file through a memory map."""
+
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._map)
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self._map[offset : offset + length]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class _HttpRangeReader:
+    """Read byte ranges of a remote file with HTTP range requests."""
+
+    def __init__(self, url: str, timeout: float) -> None:
+        self._url = url
+        self._timeout = timeout
+        request = urllib.request.Request(url, method="HEAD")  # noqa: S310
+        with urllib.request.urlopen(request, timeout=timeout) as response:  # noqa: S310
+            self.size = int(response.headers["Content-Length"])
+
+    def read(self, offset: int, length: int) -> bytes:
+        end = min(offset + length, self.size) - 1
+        request = urllib.request.Request(  # noqa: S310
+            self._url, headers={"Range": f"bytes={offset}-{end}"}
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:  # noqa: S310
+            if response.status != 206:  # noqa: PLR2004
+                err_msg = f"{self._url} does not support range requests"
+                raise ValueError(err_msg)
+            return response.read()
+
+    def close(self) -> None:
+        pass
+
+
+def _entry_names(secondary: bool) -> tuple[str, str]:
+    prefix = "secondary/" if secondary else ""
+    return f"{prefix}payload.bin", f"{prefix}payload_properties.txt"
+
+
+def _find_central_directory(reader: _RangeReader) -> tuple[int, int]:
+    """Return the offset and size of the central directory.
+
+    :param reader: zip reader
+    :type reader: _RangeReader
+    :return: central directory offset and size
+    :rtype: tuple[int, int]
+    :raises ValueError: if the end of central directory record is missing
+    """
+    tail_size = min(reader.size, _EOCD.size + _MAX_COMMENT)
+    tail_offset = reader.size - tail_size
+    tail = reader.read(tail_offset, tail_size)
+    position = tail.rfind(_EOCD_SIGNATURE)
+    if position < 0:
+        err_msg = "Not a zip file: end of central directory not found"
+        raise ValueError(err_msg)
+    *_, cd_size, cd_offset, _ = _EOCD.unpack_from(tail, position)
+    locator_position = position - _ZIP64_LOCATOR.size
+    if (
+        locator_position >= 0
+        and tail[locator_position : locator_position + 4] == _ZIP64_LOCATOR_SIGNATURE
+    ):
+        _, _, zip64_eocd_offset, _ = _ZIP64_LOCATOR.unpack_from(tail, locator_position)
+        zip64_eocd = reader.read(zip64_eocd_offset, _ZIP64_EOCD.size)
+        if zip64_eocd[:4] == _ZIP64_EOCD_SIGNATURE:
+            *_, cd_size, cd_offset = _ZIP64_EOCD.unpack(zip64_eocd)
+    return cd_offset, cd_size
+
+
+def _zip64_values(extra: bytes, fields: list[int]) -> list[int]:
+    """Replace the saturated 32-bit fields with their ZIP64 extra values.
+
+    :param extra: extra field of the central directory entry
+    :type extra: bytes
+    :param fields: uncompressed size, compressed size and local header offset
+    :type fields: list[int]
+    :return: the fields with 64-bit values where needed
+    :rtype: list[int]
+    """
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, data_size = struct.unpack_from("<2H", extra, position)
+        if header_id == _ZIP64_EXTRA_ID:
+            data_position = position + 4
+            for index, value in enumerate(fields):
+                if value == 0xFFFFFFFF:  # noqa: PLR2004
+                    (fields[index],) = struct.unpack_from("<Q", extra, data_position)
+                    data_position += 8
+            break
+        position += 4 + data_size
+    return fields
+
+
+def _central_entries(
+    reader: _RangeReader, names: tuple[str, ...]
+) -> dict[str, tuple[int, int, int]]:
+    """Look up entries in the central directory.
+
+    :param reader: zip reader
+    :type reader: _RangeReader
+    :param names: entry names to look up
+    :type names: tuple[str, ...]
+    :return: compression method, compressed size and local header offset of
+        the found entries
+    :rtype: dict[str, tuple[int, int, int]]
+    :raises ValueError: if the central directory is corrupted
+    """
+    cd_offset, cd_size = _find_central_directory(reader)
+    directory = reader.read(cd_offset, cd_size)
+    entries = {}
+    position = 0
+    while position + _CENTRAL_HEADER.size <= len(directory):
+        header = _CENTRAL_HEADER.unpack_from(directory, position)
+        if header[0] != _CENTRAL_HEADER_SIGNATURE:
+            err_msg = f"Corrupted zip central directory at offset {position}"
+            raise ValueError(err_msg)
+        method = header[4]
+        compressed, uncompressed = header[8], header[9]
+        name_length, extra_length, comment_length = header[10], header[11], header[12]
+        local_offset = header[16]
+        name_start = position + _CENTRAL_HEADER.size
+        name = directory[name_start : name_start + name_length].decode("utf-8")
+        if name in names:
+            extra = directory[
+                name_start + name_length : name_start + name_length + extra_length
+            ]
+            _, compressed, local_offset = _zip64_values(
+                extra, [uncompressed, compressed, local_offset]
+            )
+            entries[name] = (method, compressed, local_offset)
+        position = name_start + name_length + extra_length + comment_length
+    return entries
+
+
+def _data_offset(reader: _RangeReader, local_offset: int) -> int:
+    header = _LOCAL_HEADER.unpack(reader.read(local_offset, _LOCAL_HEADER.size))
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        err_msg = f"Corrupted zip local header at offset {local_offset}"
+        raise ValueError(err_msg)
+    name_length, extra_length = header[9], header[10]
+    return local_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+def _locate_payload(reader: _RangeReader, secondary: bool) -> tuple[int, int, str]:
+    payload_name, properties_name = _entry_names(secondary)
+    entries = _central_entries(reader, (payload_name, properties_name))
+    for name in (payload_name, properties_name):
+        if name not in entries:
+            err_msg = f"{name} not found in the OTA package"
+            raise ValueError(err_msg)
+    method, payload_size, payload_local = entries[payload_name]
+    if method != _STORED:
+        err_msg = f"{payload_name} is compressed and cannot be streamed"
+        raise ValueError(err_msg)
+    payload_offset = _data_offset(reader, payload_local)
+
+    method, properties_size, properties_local = entries[properties_name]
+    properties = reader.read(_data_offset(reader, properties_local), properties_size)
+    if method == _DEFLATED:
+        properties = zlib.decompress(properties, -zlib.MAX_WBITS)
+    elif method != _STORED:
+        err_msg = f"Unsupported compression method {method} for {properties_name}"
+        raise ValueError(err_msg)
+    return payload_offset, payload_size, properties.decode("utf-8")
+
+
+def parse_ota_payload(path: str | Path, secondary: bool = False) -> tuple[int, int, str]:
+    """Locate the payload of a local OTA zip.
+
+    :param path: path of the OTA zip
+    :type path: str | Path
+    :param secondary: use the secondary payload entries if True
+    :type secondary: bool
+    :return: payload offset, payload size, payload properties
+    :rtype: tuple[int, int, str]
+    """
+    reader = _MmapReader(Path(path))
+    try:
+        return _locate_payload(reader, secondary)
+    finally:
+        reader.close()
+
+
+def parse_ota_payload_url(
+    url: str, secondary: bool = False, timeout: float = 30
+) -> tuple[int, int, str]:
+    """Locate the payload of an OTA zip served over HTTP.
+
+    Only the zip tail, the central directory and the two local headers are
+    downloaded, with HTTP range requests.
+
+    :param url: URL of the OTA zip
+    :type url: str
+    :param secondary: use the secondary payload entries if True
+    :type secondary: bool
+    :param timeout: timeout of each HTTP request, in seconds
+    :type timeout: float
+    :return: payload offset, payload size, payload properties
+    :rtype: tuple[int, int, str]
+    :raises ValueError: if the URL is not an HTTP URL
+    """
+    if not re.match(r"https?://", url):
+        err_msg = f"Not an HTTP URL: {url}"
+        raise ValueError(err_msg)
+    reader = _HttpRangeReader(url, timeout)
+    return _locate_payload(reader, secondary)
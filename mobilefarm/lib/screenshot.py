@@ -0,0 +1,555 @@
+"""Mobilefarm screenshot capture helpers."""
+
+from __future__ import annotations
+
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow comes with the "screenshots" extra
+    Image = None
+
+if TYPE_CHECKING:
+    from appium.webdriver.webdriver import WebDriver
+
+_LOGGER = logging.getLogger(__name__)
+
+_HASH_SIZE = 16
+
+STABILIZATION_STRATEGIES = ("idle_sync", "hierarchy_hash", "screenshot_diff", "none")
+CAPTURE_POLICIES = ("always", "every_nth", "after_only", "on_failure")
+
+
+class UiStabilizer:
+    """Wait for the device UI to settle before a screenshot is taken.
+
+    The strategy decides how "settled" is detected:
+
+    - ``idle_sync``: a single ``mobile: waitForIdleSync`` call
+    - ``hierarchy_hash``: poll ``page_source`` until two consecutive polls
+      hash to the same value
+    - ``screenshot_diff``: poll screenshots until two consecutive frames are
+      identical; the settled frame is handed back so it is not fetched again
+    - ``none``: do not wait at all
+
+    The time spent in each strategy is accumulated so that callers can
+    compare the cost of the strategies on their screens.
+    """
+
+    def __init__(
+        self,
+        strategy: str = "idle_sync",
+        timeout: float = 2.0,
+        poll_interval: float = 0.2,
+    ) -> None:
+        """Initialize the UI stabilizer.
+
+        :param strategy: one of :data:`STABILIZATION_STRATEGIES`
+        :type strategy: str
+        :param timeout: maximum time to wait for the UI to settle, in seconds
+        :type timeout: float
+        :param poll_interval: delay between two polls, in seconds
+        :type poll_interval: float
+        :raises ValueError: if the strategy is unknown
+        """
+        if strategy not in STABILIZATION_STRATEGIES:
+            err_msg = (
+                f"Unknown UI stabilization strategy {strategy!r}, "
+                f"expected one of {', '.join(STABILIZATION_STRATEGIES)}"
+            )
+            raise ValueError(err_msg)
+        self.strategy = strategy
+        self._timeout = timeout
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._elapsed: dict[str, float] = {}
+        self._calls: dict[str, int] = {}
+
+    @property
+    def timings(self) -> dict[str, tuple[int, float]]:
+        """Number of calls and total time spent per strategy.
+
+        :return: mapping of strategy name to (calls, total seconds)
+        :rtype: dict[str, tuple[int, float]]
+        """
+        with self._lock:
+            return {
+                name: (self._calls[name], elapsed)
+                for name, elapsed in self._elapsed.items()
+            }
+
+    def wait(self, driver: WebDriver) -> str | None:
+        """Wait for the UI to settle.
+
+        :param driver: Appium WebDriver
+        :type driver: WebDriver
+        :return: the settled frame as base64 PNG if the strategy fetched one
+        :rtype: str | None
+        """
+        start = time.monotonic()
+        frame = None
+        try:
+            if self.strategy == "idle_sync":
+                self._wait_for_idle_sync(driver)
+            elif self.strategy == "hierarchy_hash":
+                self._poll_until_stable(
+                    lambda: hashlib.sha1(  # noqa: S324
+                        driver.page_source.encode("utf-8")
+                    ).digest()
+                )
+            elif self.strategy == "screenshot_diff":
+                frame = self._poll_until_stable(driver.get_screenshot_as_base64)
+        except Exception as exc:  # noqa: BLE001  # pylint: disable=broad-except
+            _LOGGER.debug("UI stabilization (%s) failed: %s", self.strategy, exc)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._elapsed[self.strategy] = (
+                    self._elapsed.get(self.strategy, 0.0) + elapsed
+                )
+                self._calls[self.strategy] = self._calls.get(self.strategy, 0) + 1
+        return frame
+
+    def _wait_for_idle_sync(self, driver: WebDriver) -> None:
+        with contextlib.suppress(Exception):
+            driver.execute_script(
+                "mobile: waitForIdleSync", {"timeout": int(self._timeout * 1000)}
+            )
+
+    def _poll_until_stable(self, poll: Callable[[], str | bytes]) -> str | bytes:
+        deadline = time.monotonic() + self._timeout
+        previous = poll()
+        while time.monotonic() < deadline:
+            time.sleep(self._poll_interval)
+            current = poll()
+            if current == previous:
+                break
+            previous = current
+        return previous
+
+
+class FileSink:  # pylint: disable=too-few-public-methods
+    """Screenshot sink writing every frame straight to disk."""
+
+    def write(self, file_path: Path, png: bytes) -> None:
+        """Store a frame.
+
+        :param file_path: destination PNG file
+        :type file_path: Path
+        :param png: PNG encoded frame
+        :type png: bytes
+        """
+        file_path.write_bytes(png)
+        _LOGGER.debug("Screenshot saved: %s", file_path)
+
+
+class DedupSink:
+    """Screenshot sink skipping frames already stored.
+
+    A frame is skipped if the SHA-256 digest of its PNG data matches a frame
+    already stored. With a ``threshold`` of 0 or more, frames near-identical
+    to the last stored frame are skipped too, e.g. when only a blinking
+    cursor or the clock changed. Near-identical frames are detected with an
+    average hash: the frame is shrunk to a 16x16 grayscale image and every
+    pixel brighter than the mean sets a bit. Frames whose hashes differ by at
+    most ``threshold`` bits match. The hash also ignores real changes such
+    as a typed character or a toggled checkbox, so this perceptual match is
+    opt-in. It needs Pillow, without it only identical frames are skipped.
+
+    Every frame, stored or not, gets a line in a JSON lines index next to the
+    screenshots so that the full action timeline can still be rebuilt::
+
+        {"frame": "<name>.png", "stored": "<name of the stored file>.png"}
+    """
+
+    index_name = "screenshots_index.jsonl"
+
+    def __init__(self, sink: FileSink, threshold: int = -1) -> None:
+        """Initialize the deduplicating sink.
+
+        :param sink: sink receiving the unique frames
+        :type sink: FileSink
+        :param threshold: maximum number of differing average hash bits, out
+            of 256, of near-identical frames, negative (the default) to skip
+            identical frames only
+        :type threshold: int
+        """
+        self._sink = sink
+        self._threshold = threshold
+        self._stored: dict[tuple[Path, bytes], str] = {}
+        self._last: dict[Path, tuple[int, str]] = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        if threshold >= 0 and Image is None:
+            _LOGGER.warning(
+                "Pillow is not installed, only identical screenshots are skipped"
+            )
+
+    def write(self, file_path: Path, png: bytes) -> None:
+        """Store a frame unless an identical or near-identical frame was stored.
+
+        :param file_path: destination PNG file
+        :type file_path: Path
+        :param png: PNG encoded frame
+        :type png: bytes
+        """
+        key = (file_path.parent, hashlib.sha256(png).digest())
+        frame_hash = _average_hash(png) if self._threshold >= 0 else None
+        with self._lock:
+            stored = self._stored.get(key)
+            last_hash, last_stored = self._last.get(file_path.parent, (None, None))
+            if (
+                stored is None
+                and frame_hash is not None
+                and last_hash is not None
+                and bin(frame_hash ^ last_hash).count("1") <= self._threshold
+            ):
+                stored = last_stored
+            if stored is None:
+                self._stored[key] = stored = file_path.name
+                if frame_hash is not None:
+                    self._last[file_path.parent] = frame_hash, stored
+                self._sink.write(file_path, png)
+            else:
+                self.skipped += 1
+                _LOGGER.debug("Screenshot %s duplicates %s", file_path, stored)
+            with file_path.with_name(self.index_name).open(
+                "a", encoding="utf-8"
+            ) as index:
+                index.write(
+                    json.dumps({"frame": file_path.name, "stored": stored}) + "\n"
+                )
+
+
+def _average_hash(png: bytes) -> int | None:
+    """Return the average hash of a PNG frame.
+
+    :param png: PNG encoded frame
+    :type png: bytes
+    :return: 256-bit average hash, None if Pillow is missing or the frame
+        cannot be decoded
+    :rtype: int | None
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(png)) as image:
+            thumbnail = image.convert("L").resize(
+                (_HASH_SIZE, _HASH_SIZE), Image.BILINEAR
+            )
+            pixels = thumbnail.tobytes()
+    except (OSError, ValueError) as exc:
+        _LOGGER.debug("Cannot hash screenshot: %s", exc)
+        return None
+    mean = sum(pixels) / len(pixels)
+    return sum(1 << index for index, pixel in enumerate(pixels) if pixel > mean)
+
+
+class RingBufferSink:
+    """Screenshot sink keeping the most recent frames in memory.
+
+    The buffer holds at most ``max_frames`` frames and ``max_bytes`` bytes of
+    PNG data; the oldest frames are dropped first. Nothing touches the disk
+    until :meth:`flush` is called.
+    """
+
+    def __init__(self, max_frames: int = 20, max_bytes: int = 64 * 1024**2) -> None:
+        """Initialize the ring buffer sink.
+
+        :param max_frames: maximum number of frames to keep
+        :type max_frames: int
+        :param max_bytes: maximum total size of the kept frames, in bytes
+        :type max_bytes: int
+        """
+        self._frames: deque[tuple[Path, bytes]] = deque()
+        self._max_frames = max_frames
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, file_path: Path, png: bytes) -> None:
+        """Store a frame in memory, evicting the oldest frames if needed.
+
+        :param file_path: destination PNG file used on flush
+        :type file_path: Path
+        :param png: PNG encoded frame
+        :type png: bytes
+        """
+        with self._lock:
+            self._frames.append((file_path, png))
+            self._size += len(png)
+            while self._frames and (
+                len(self._frames) > self._max_frames or self._size > self._max_bytes
+            ):
+                _, dropped = self._frames.popleft()
+                self._size -= len(dropped)
+
+    def flush(self, sink: FileSink | DedupSink) -> int:
+        """Hand the buffered frames over to another sink and empty the buffer.
+
+        :param sink: sink receiving the buffered frames
+        :type sink: FileSink | DedupSink
+        :return: number of flushed frames
+        :rtype: int
+        """
+        with self._lock:
+            frames = list(self._frames)
+            self._frames.clear()
+            self._size = 0
+        for file_path, png in frames:
+            sink.write(file_path, png)
+        return len(frames)
+
+    def clear(self) -> None:
+        """Drop all buffered frames."""
+        with self._lock:
+            self._frames.clear()
+            self._size = 0
+
+
+class CapturePolicy:
+    """Decide which screenshots are taken and where they are stored.
+
+    - ``always``: before and after every action, written to disk
+    - ``every_nth``: before and after every ``every``-th action
+    - ``after_only``: only after every action
+    - ``on_failure``: before and after every action, kept in a
+      :class:`RingBufferSink` and written to disk only if the test fails
+    """
+
+    def __init__(
+        self,
+        policy: str = "always",
+        every: int = 1,
+        ring_buffer_frames: int = 20,
+        ring_buffer_bytes: int = 64 * 1024**2,
+        deduplicate: bool = False,
+        dedup_threshold: int = -1,
+    ) -> None:
+        """Initialize the capture policy.
+
+        :param policy: one of :data:`CAPTURE_POLICIES`
+        :type policy: str
+        :param every: capture every n-th action, used by ``every_nth``
+        :type every: int
+        :param ring_buffer_frames: number of frames kept by ``on_failure``
+        :type ring_buffer_frames: int
+        :param ring_buffer_bytes: memory budget of ``on_failure``, in bytes
+        :type ring_buffer_bytes: int
+        :param deduplicate: store identical frames only once, see
+            :class:`DedupSink`
+        :type deduplicate: bool
+        :param dedup_threshold: maximum average hash distance of
+            near-identical frames to skip too, negative (the default) to skip
+            identical frames only
+        :type dedup_threshold: int
+        :raises ValueError: if the policy is unknown or ``every`` is below 1
+        """
+        if policy not in CAPTURE_POLICIES:
+            err_msg = (
+                f"Unknown capture policy {policy!r}, "
+                f"expected one of {', '.join(CAPTURE_POLICIES)}"
+            )
+            raise ValueError(err_msg)
+        if every < 1:
+            err_msg = f"Capture interval must be at least 1, got {every}"
+            raise ValueError(err_msg)
+        self.policy = policy
+        self._every = every
+        self._actions = 0
+        self._capture_current_action = True
+        self._disk: FileSink | DedupSink = FileSink()
+        if deduplicate:
+            self._disk = DedupSink(self._disk, dedup_threshold)
+        self._buffer: RingBufferSink | None = None
+        if policy == "on_failure":
+            self._buffer = RingBufferSink(ring_buffer_frames, ring_buffer_bytes)
+
+    @property
+    def sink(self) -> FileSink | DedupSink | RingBufferSink:
+        """Sink receiving the captured frames.
+
+        :return: frame sink
+        :rtype: FileSink | DedupSink | RingBufferSink
+        """
+        return self._buffer if self._buffer is not None else self._disk
+
+    def should_capture(self, before_action: bool) -> bool:
+        """Tell whether a frame should be captured.
+
+        "Before" frames start a new action; the "after" frame of an action is
+        captured only if its "before" frame was.
+
+        :param before_action: True for a frame taken before an action
+        :type before_action: bool
+        :return: True if the frame should be captured
+        :rtype: bool
+        """
+        if before_action:
+            self._actions += 1
+            self._capture_current_action = (
+                self.policy != "every_nth" or (self._actions - 1) % self._every == 0
+            )
+            return self._capture_current_action and self.policy != "after_only"
+        return self._capture_current_action
+
+    def save_buffered(self) -> int:
+        """Write the frames buffered by ``on_failure`` to disk.
+
+        :return: number of frames written
+        :rtype: int
+        """
+        if self._buffer is None:
+            return 0
+        return self._buffer.flush(self._disk)
+
+    def discard_buffered(self) -> None:
+        """Drop the frames buffered by ``on_failure``."""
+        if self._buffer is not None:
+            self._buffer.clear()
+
+
+@dataclass
+class _ScreenshotJob:
+    """A single screenshot request queued on the pipeline."""
+
+    file_path: Path
+    prepare: Callable[[], str | None] | None = None
+    fetched: threading.Event = field(default_factory=threading.Event)
+
+
+class ScreenshotPipeline:
+    """Capture and store screenshots on background worker threads.
+
+    Frames are fetched from Appium by a single fetch worker so that they are
+    taken in submission order. Decoding and writing to disk happen on a
+    separate writer worker, which keeps the fetch worker free for the next
+    frame. Both queues are bounded; :meth:`submit` blocks once the pipeline
+    is ``max_pending`` frames behind, which throttles the test thread instead
+    of growing memory without limit.
+    """
+
+    def __init__(
+        self,
+        driver: WebDriver,
+        sink: FileSink | DedupSink | RingBufferSink,
+        max_pending: int = 8,
+    ) -> None:
+        """Initialize and start the screenshot pipeline.
+
+        :param driver: Appium WebDriver used to fetch the screenshots
+        :type driver: WebDriver
+        :param sink: sink receiving the decoded frames
+        :type sink: FileSink | DedupSink | RingBufferSink
+        :param max_pending: maximum number of frames waiting to be fetched
+            or written before :meth:`submit` blocks
+        :type max_pending: int
+        """
+        self._driver = driver
+        self._sink = sink
+        self._fetch_queue: queue.Queue[_ScreenshotJob | None] = queue.Queue(
+            maxsize=max_pending
+        )
+        self._write_queue: queue.Queue[tuple[Path, str] | None] = queue.Queue(
+            maxsize=max_pending
+        )
+        self._fetch_worker = threading.Thread(
+            target=self._fetch_loop, name="screenshot-fetch", daemon=True
+        )
+        self._write_worker = threading.Thread(
+            target=self._write_loop, name="screenshot-write", daemon=True
+        )
+        self._closed = False
+        self._fetch_worker.start()
+        self._write_worker.start()
+
+    def submit(
+        self,
+        file_path: Path,
+        prepare: Callable[[], str | None] | None = None,
+        wait_for_fetch: bool = False,
+    ) -> None:
+        """Queue a screenshot to be captured into the given file.
+
+        :param file_path: destination PNG file
+        :type file_path: Path
+        :param prepare: callable run on the fetch worker right before the
+            frame is fetched, e.g. to wait for the UI to settle; if it returns
+            a base64 frame that frame is stored instead of fetching a new one
+        :type prepare: Callable[[], str | None] | None
+        :param wait_for_fetch: block until the frame has been fetched from
+            the device; used for "before" frames so that they are guaranteed
+            to be taken before the action is sent
+        :type wait_for_fetch: bool
+        :raises RuntimeError: if the pipeline is already closed
+        """
+        if self._closed:
+            err_msg = "Screenshot pipeline is closed"
+            raise RuntimeError(err_msg)
+        job = _ScreenshotJob(file_path=file_path, prepare=prepare)
+        self._fetch_queue.put(job)
+        if wait_for_fetch:
+            job.fetched.wait()
+
+    def flush(self) -> None:
+        """Block until every queued screenshot is written to disk."""
+        self._fetch_queue.join()
+        self._write_queue.join()
+
+    def close(self) -> None:
+        """Flush pending screenshots and stop the worker threads."""
+        if self._closed:
+            return
+        self._closed = True
+        self._fetch_queue.put(None)
+        self._fetch_worker.join()
+        self._write_worker.join()
+
+    def _fetch_loop(self) -> None:
+        while True:
+            job = self._fetch_queue.get()
+            try:
+                if job is None:
+                    self._write_queue.put(None)
+                    return
+                self._fetch(job)
+            finally:
+                self._fetch_queue.task_done()
+
+    def _fetch(self, job: _ScreenshotJob) -> None:
+        try:
+            data = job.prepare() if job.prepare is not None else None
+            if data is None:
+                data = self._driver.get_screenshot_as_base64()
+        except Exception as exc:  # noqa: BLE001  # pylint: disable=broad-except
+            _LOGGER.warning("Failed to capture screenshot: %s", exc)
+            return
+        finally:
+            job.fetched.set()
+        self._write_queue.put((job.file_path, data))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._write_queue.get()
+            try:
+                if item is None:
+                    return
+                file_path, data = item
+                self._sink.write(file_path, base64.b64decode(data))
+            except Exception:  # pylint: disable=broad-except
+                # the worker must outlive a bad frame, or flush() never returns
+                _LOGGER.exception("Failed to save screenshot")
+            finally:
+                self._write_queue.task_done()
@@ -0,0 +1,173 @@
+"""Mobilefarm Appium session pool."""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import threading
+from typing import TYPE_CHECKING, Any
+
+from appium import webdriver
+from appium.options.android.uiautomator2.base import UiAutomator2Options
+from selenium.common.exceptions import WebDriverException
+
+if TYPE_CHECKING:
+    from appium.webdriver.webdriver import WebDriver
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AppiumSessionPool:
+    """Pool of Appium WebDriver sessions reused across tests.
+
+    Sessions are keyed by Appium server endpoint and capabilities. A session
+    handed back with :meth:`release` is kept idle and given to the next
+    :meth:`acquire` call with the same key, after a health check and an app
+    state reset, instead of paying the UiAutomator2 server start and session
+    handshake again.
+
+    Sessions are also keyed by the device they drive. A session must not
+    outlive the lease of its device, as the next process leasing the device
+    would start a second session with the same udid and system port, so
+    :meth:`close_device` ends the sessions of a device when its lease is
+    released.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty session pool."""
+        self._idle: dict[tuple[str | None, str], list[WebDriver]] = {}
+        self._leased: dict[int, tuple[tuple[str | None, str], WebDriver]] = {}
+        self._closing: set[int] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(
+        endpoint: str, capabilities: dict[str, Any], device_name: str | None
+    ) -> tuple[str | None, str]:
+        return (
+            device_name,
+            f"{endpoint} {json.dumps(capabilities, sort_keys=True)}",
+        )
+
+    def acquire(
+        self,
+        endpoint: str,
+        capabilities: dict[str, Any],
+        implicit_wait: float = 0,
+        device_name: str | None = None,
+    ) -> WebDriver:
+        """Return a healthy session for the given endpoint and capabilities.
+
+        :param endpoint: Appium server URL
+        :type endpoint: str
+        :param capabilities: Appium capabilities of the session
+        :type capabilities: dict[str, Any]
+        :param implicit_wait: implicit wait set on the session, in seconds
+        :type implicit_wait: float
+        :param device_name: name of the leased device driven by the session
+        :type device_name: str | None
+        :return: Appium WebDriver session
+        :rtype: WebDriver
+        """
+        key = self._key(endpoint, capabilities, device_name)
+        driver = None
+        while driver is None:
+            with self._lock:
+                idle = self._idle.get(key)
+                candidate = idle.pop() if idle else None
+            if candidate is None:
+                _LOGGER.debug("Starting a new Appium session on %s", endpoint)
+                driver = webdriver.Remote(
+                    endpoint,
+                    options=UiAutomator2Options().load_capabilities(capabilities),
+                )
+            elif self._reset(candidate, capabilities):
+                _LOGGER.debug("Reusing Appium session %s", candidate.session_id)
+                driver = candidate
+        driver.implicitly_wait(implicit_wait)
+        with self._lock:
+            self._leased[id(driver)] = (key, driver)
+        return driver
+
+    def release(self, driver: WebDriver) -> None:
+        """Hand a session back to the pool.
+
+        :param driver: session returned by :meth:`acquire`
+        :type driver: WebDriver
+        """
+        with self._lock:
+            key, _ = self._leased.pop(id(driver))
+            if id(driver) not in self._closing:
+                self._idle.setdefault(key, []).append(driver)
+                return
+            self._closing.discard(id(driver))
+        self._quit(driver)
+
+    def discard(self, driver: WebDriver) -> None:
+        """End a leased session instead of handing it back to the pool.
+
+        :param driver: session returned by :meth:`acquire`
+        :type driver: WebDriver
+        """
+        with self._lock:
+            self._leased.pop(id(driver), None)
+            self._closing.discard(id(driver))
+        self._quit(driver)
+
+    def close_device(self, device_name: str) -> None:
+        """End the idle sessions of a device and the leased ones once released.
+
+        :param device_name: name of the device whose lease ends
+        :type device_name: str
+        """
+        with self._lock:
+            keys = [key for key in self._idle if key[0] == device_name]
+            drivers = [driver for key in keys for driver in self._idle.pop(key)]
+            self._closing.update(
+                driver_id
+                for driver_id, (key, _) in self._leased.items()
+                if key[0] == device_name
+            )
+        for driver in drivers:
+            self._quit(driver)
+
+    def close(self) -> None:
+        """End every session owned by the pool."""
+        with self._lock:
+            drivers = [driver for _, driver in self._leased.values()]
+            drivers += [driver for idle in self._idle.values() for driver in idle]
+            self._leased.clear()
+            self._idle.clear()
+            self._closing.clear()
+        for driver in drivers:
+            self._quit(driver)
+
+    def _reset(self, driver: WebDriver, capabilities: dict[str, Any]) -> bool:
+        """Check that an idle session is alive and restart its app.
+
+        :param driver: idle session
+        :type driver: WebDriver
+        :param capabilities: Appium capabilities of the session
+        :type capabilities: dict[str, Any]
+        :return: True if the session can be reused
+        :rtype: bool
+        """
+        app_package = capabilities.get("appPackage")
+        try:
+            _ = driver.current_package
+            if app_package:
+                driver.terminate_app(app_package)
+                driver.activate_app(app_package)
+        except WebDriverException as exc:
+            _LOGGER.warning(
+                "Dropping dead Appium session %s: %s", driver.session_id, exc.msg
+            )
+            self._quit(driver)
+            return False
+        return True
+
+    @staticmethod
+    def _quit(driver: WebDriver) -> None:
+        with contextlib.suppress(WebDriverException):
+            driver.quit()
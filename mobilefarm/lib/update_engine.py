@@ -0,0 +1,192 @@
+"""Mobilefarm update_engine_client progress monitor."""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+import pexpect
+
+if TYPE_CHECKING:
+    from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
+
+_LOGGER = logging.getLogger(__name__)
+
+_STATUS_PATTERN = r"onStatusUpdate\((\w+) \((\d+)\), ([\d.eE+-]+)\)"
+_COMPLETE_PATTERN = r"onPayloadApplicationComplete\(ErrorCode::(\w+) \((\d+)\)\)"
+_PHASES = {
+    "UPDATE_STATUS_DOWNLOADING": "download",
+    "UPDATE_STATUS_VERIFYING": "verify",
+    "UPDATE_STATUS_FINALIZING": "finalize",
+    "UPDATE_STATUS_UPDATED_NEED_REBOOT": "done",
+}
+_SUCCESS = "kSuccess"
+
+
+class UpdateEngineError(Exception):
+    """update_engine reported a failed payload application."""
+
+    def __init__(self, error_code: str, message: str) -> None:
+        """Initialize the error.
+
+        :param error_code: update_engine error code name, e.g. kDownloadTransferError
+        :type error_code: str
+        :param message: error message
+        :type message: str
+        """
+        super().__init__(message)
+        self.error_code = error_code
+
+
+@dataclass(frozen=True)
+class UpdateEngineEvent:
+    """One status update of update_engine."""
+
+    status: str
+    progress: float
+    phase: str | None
+    elapsed: float
+
+
+class UpdateEngineMonitor:
+    """Follow the output of ``update_engine_client --update --follow``.
+
+    Status lines are parsed as they stream on the console into download,
+    verify and finalize progress. The update fails as soon as update_engine
+    reports a non-success error code, or when neither the status nor the
+    progress changes within the stall timeout, instead of waiting for one
+    long fixed timeout.
+    """
+
+    def __init__(
+        self, on_event: Callable[[UpdateEngineEvent], None] | None = None
+    ) -> None:
+        """Initialize the monitor.
+
+        :param on_event: callable receiving every status change
+        :type on_event: Callable[[UpdateEngineEvent], None] | None
+        """
+        self._on_event = on_event
+        self._started = time.monotonic()
+        self._phase_started: dict[str, float] = {}
+        self._last: tuple[str, float] | None = None
+        self.events: list[UpdateEngineEvent] = []
+        self.status: str | None = None
+        self.progress = 0.0
+
+    @property
+    def phase(self) -> str | None:
+        """Current update phase.
+
+        :return: download, verify, finalize or done, None before the download
+        :rtype: str | None
+        """
+        return _PHASES.get(self.status or "")
+
+    @property
+    def phase_timings(self) -> dict[str, float]:
+        """Time spent in each reached phase.
+
+        :return: mapping of phase name to seconds, the current phase lasting
+            until now
+        :rtype: dict[str, float]
+        """
+        starts = sorted(self._phase_started.items(), key=lambda item: item[1])
+        now = time.monotonic()
+        return {
+            phase: (starts[index + 1][1] if index + 1 < len(starts) else now) - start
+            for index, (phase, start) in enumerate(starts)
+            if phase != "done"
+        }
+
+    def feed(self, status: str, progress: float) -> UpdateEngineEvent | None:
+        """Record a status update.
+
+        :param status: update_engine status name
+        :type status: str
+        :param progress: progress of the current phase, from 0 to 1
+        :type progress: float
+        :return: the event if the status or progress changed, None otherwise
+        :rtype: UpdateEngineEvent | None
+        """
+        if self._last == (status, progress):
+            return None
+        self._last = status, progress
+        self.status = status
+        self.progress = progress
+        phase = self.phase
+        if phase is not None and phase not in self._phase_started:
+            self._phase_started[phase] = time.monotonic()
+        event = UpdateEngineEvent(
+            status=status,
+            progress=progress,
+            phase=phase,
+            elapsed=time.monotonic() - self._started,
+        )
+        self.events.append(event)
+        if self._on_event is not None:
+            self._on_event(event)
+        return event
+
+    def follow(
+        self,
+        console: BoardfarmPexpect,
+        stall_timeout: float = 300,
+        timeout: float = 3600,
+        prompts: list[str] | None = None,
+    ) -> None:
+        """Consume the console output until the payload application completes.
+
+        :param console: console running ``update_engine_client --follow``
+        :type console: BoardfarmPexpect
+        :param stall_timeout: maximum time without a status or progress
+            change, in seconds
+        :type stall_timeout: float
+        :param timeout: maximum duration of the whole update, in seconds
+        :type timeout: float
+        :param prompts: shell prompt patterns, seen if the client exits
+            without reporting completion
+        :type prompts: list[str] | None
+        :raises UpdateEngineError: if update_engine reports an error code or
+            the client exits early
+        :raises TimeoutError: if the update stalls or takes too long
+        """
+        patterns = [_STATUS_PATTERN, _COMPLETE_PATTERN, *(prompts or [])]
+        deadline = self._started + timeout
+        last_change = time.monotonic()
+        while True:
+            now = time.monotonic()
+            wait = min(last_change + stall_timeout, deadline) - now
+            if wait <= 0:
+                kind = "stalled" if now < deadline else "timed out"
+                err_msg = (
+                    f"OTA update {kind} in status {self.status} at "
+                    f"{self.progress:.0%} after {now - self._started:.0f}s"
+                )
+                raise TimeoutError(err_msg)
+            try:
+                index = console.expect(patterns, timeout=wait)
+            except pexpect.TIMEOUT:
+                continue
+            if index == 0:
+                status, _, progress = console.match.groups()
+                if self.feed(status, float(progress)) is not None:
+                    last_change = time.monotonic()
+                continue
+            if index == 1:
+                error_code, number = console.match.groups()
+                if error_code == _SUCCESS:
+                    return
+                err_msg = (
+                    f"OTA update failed with ErrorCode::{error_code} ({number}) "
+                    f"in status {self.status}"
+                )
+                raise UpdateEngineError(error_code, err_msg)
+            err_msg = (
+                f"update_engine_client exited in status {self.status} "
+                f"without completing the update"
+            )
+            raise UpdateEngineError("kError", err_msg)
@@ -1,6 +1,31 @@
 """Mobilefarm common utilities module."""
 
-from typing import Any
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+_T = TypeVar("_T")
+
+# Console logins and OTA updates block on pexpect for minutes; a dedicated
+# pool keeps a large farm from queueing behind asyncio's small default one.
+_BLOCKING_EXECUTOR = ThreadPoolExecutor(
+    max_workers=64, thread_name_prefix="mobilefarm-blocking"
+)
+
+
+async def run_blocking(func: Callable[..., _T], *args: Any) -> _T:  # noqa: ANN401
+    """Run a blocking device operation without blocking the event loop.
+
+    :param func: blocking callable
+    :type func: Callable[..., _T]
+    :param args: positional arguments of the callable
+    :type args: Any
+    :return: return value of the callable
+    :rtype: _T
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _BLOCKING_EXECUTOR, func, *args
+    )
 
 
 def get_capabilities(config: dict[Any, Any]) -> dict[str, Any]:
@@ -1,9 +1,26 @@
 """Android device template."""
 
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from functools import cached_property
+from typing import TYPE_CHECKING
 
 from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 
+from mobilefarm.lib.adb_client import (
+    DEFAULT_ADB_SERVER_HOST,
+    DEFAULT_ADB_SERVER_PORT,
+    AdbClient,
+    AdbDevice,
+)
+from mobilefarm.lib.adb_transfer import DEFAULT_PARALLELISM
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.adb_transfer import LocalPath, TransferReport
+
 
 class AndroidTemplate(ABC):  # pylint: disable=too-few-public-methods
     """Abstract base class for Android devices."""
@@ -50,3 +67,77 @@ class AndroidTemplate(ABC):  # pylint: disable=too-few-public-methods
         :rtype: str
         """
         raise NotImplementedError
+
+    @cached_property
+    def adb(self) -> AdbDevice:
+        """ADB client of the device, an alternative to :attr:`console`.
+
+        Shell commands run over the adb server protocol and return their
+        exit code, without any prompt matching, and files are transferred
+        over the sync service. The adb server is reached on the
+        ``adb_server_host`` and ``adb_server_port`` of the device
+        configuration, the local server by default.
+
+        :return: ADB device handle
+        :rtype: AdbDevice
+        """
+        return AdbClient(
+            self.config.get("adb_server_host", DEFAULT_ADB_SERVER_HOST),
+            self.config.get("adb_server_port", DEFAULT_ADB_SERVER_PORT),
+        ).device(self.adb_serial)
+
+    @abstractmethod
+    def push(
+        self,
+        sources: LocalPath | Sequence[LocalPath],
+        destination: str,
+        parallelism: int = DEFAULT_PARALLELISM,
+        checksum: bool = False,
+    ) -> TransferReport:
+        """Copy local files and directories to the device.
+
+        Files already on the device with the same size and modification
+        time, or the same digest if ``checksum`` is set, are skipped.
+
+        :param sources: local files and directories
+        :type sources: LocalPath | Sequence[LocalPath]
+        :param destination: destination path, or directory if it ends with
+            ``/`` or several sources are given
+        :type destination: str
+        :param parallelism: maximum number of concurrent transfers
+        :type parallelism: int
+        :param checksum: compare digests instead of modification times
+        :type checksum: bool
+        :raises NotImplementedError: if not implemented
+        :return: transferred and skipped files
+        :rtype: TransferReport
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def pull(
+        self,
+        sources: str | Sequence[str],
+        destination: LocalPath,
+        parallelism: int = DEFAULT_PARALLELISM,
+        checksum: bool = False,
+    ) -> TransferReport:
+        """Copy files and directories of the device to the local host.
+
+        Local files with the same size and modification time as on the
+        device, or the same digest if ``checksum`` is set, are skipped.
+
+        :param sources: files and directories on the device
+        :type sources: str | Sequence[str]
+        :param destination: local destination path, or directory if it is an
+            existing directory or several sources are given
+        :type destination: LocalPath
+        :param parallelism: maximum number of concurrent transfers
+        :type parallelism: int
+        :param checksum: compare digests instead of modification times
+        :type checksum: bool
+        :raises NotImplementedError: if not implemented
+        :return: transferred and skipped files
+        :rtype: TransferReport
+        """
+        raise NotImplementedError
@@ -1,9 +1,19 @@
 """MobileFarm Android Test Station template."""
 
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
 from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 
+from mobilefarm.lib.console_batch import execute_sequentially
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.console_batch import CommandResult
+
 
 class ATSTemplate(ABC):  # pylint: disable=too-few-public-methods
     """Abstract base class for Android Test Station device."""
@@ -18,6 +28,43 @@ class ATSTemplate(ABC):  # pylint: disable=too-few-public-methods
         """
         raise NotImplementedError
 
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Execute a command on the Android Test Station.
+
+        The default runs the command on :attr:`console`. Stations with
+        several consoles may run concurrent commands on different ones.
+
+        :param command: command to execute
+        :type command: str
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :return: output of the command
+        :rtype: str
+        """
+        return self.console.execute_command(command, timeout)
+
+    def execute_batch(
+        self,
+        commands: Sequence[str],
+        timeout: int = -1,
+        stop_on_error: bool = False,
+    ) -> list[CommandResult]:
+        """Execute a sequence of commands on the Android Test Station.
+
+        The default runs the commands one at a time on :attr:`console`.
+        Stations knowing their shell prompt run them in one round trip.
+
+        :param commands: shell commands, run in order
+        :type commands: Sequence[str]
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :param stop_on_error: skip the remaining commands after a failure
+        :type stop_on_error: bool
+        :return: result of every command that ran, in order
+        :rtype: list[CommandResult]
+        """
+        return execute_sequentially(self.console, commands, timeout, stop_on_error)
+
     @property
     @abstractmethod
     def config(self) -> dict:
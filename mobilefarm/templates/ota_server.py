@@ -1,9 +1,22 @@
 """MobileFarm OTA server template."""
 
+from __future__ import annotations
+
+import logging
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
 from boardfarm3.lib.boardfarm_pexpect import BoardfarmPexpect
 
+from mobilefarm.lib.console_batch import execute_sequentially
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mobilefarm.lib.console_batch import CommandResult
+
+_LOGGER = logging.getLogger(__name__)
+
 
 class OTAServerTemplate(ABC):  # pylint: disable=too-few-public-methods
     """Abstract base class for OTA server device."""
@@ -29,10 +42,47 @@ class OTAServerTemplate(ABC):  # pylint: disable=too-few-public-methods
         """
         raise NotImplementedError
 
+    def execute_command(self, command: str, timeout: int = -1) -> str:
+        """Execute a command on the OTA server.
+
+        The default runs the command on :attr:`console`. OTA servers with
+        several consoles may run concurrent commands on different ones.
+
+        :param command: command to execute
+        :type command: str
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :return: output of the command
+        :rtype: str
+        """
+        return self.console.execute_command(command, timeout)
+
+    def execute_batch(
+        self,
+        commands: Sequence[str],
+        timeout: int = -1,
+        stop_on_error: bool = False,
+    ) -> list[CommandResult]:
+        """Execute a sequence of commands on the OTA server.
+
+        The default runs the commands one at a time on :attr:`console`.
+        OTA servers knowing their shell prompt run them in one round trip.
+
+        :param commands: shell commands, run in order
+        :type commands: Sequence[str]
+        :param timeout: timeout in seconds, the console default if -1
+        :type timeout: int
+        :param stop_on_error: skip the remaining commands after a failure
+        :type stop_on_error: bool
+        :return: result of every command that ran, in order
+        :rtype: list[CommandResult]
+        """
+        return execute_sequentially(self.console, commands, timeout, stop_on_error)
+
     @abstractmethod
     def fetch_ota_package(
         self, target: str, build_id: str, artifact_name: str, output: str
-    ) -> None:
+    ) -> str | None:
         """Fetch OTA package from using `fetch_artifact` CLI command.
 
         :param target: Target device
@@ -44,9 +94,13 @@ class OTAServerTemplate(ABC):  # pylint: disable=too-few-public-methods
         :param output: Output file name for the fetched OTA package
         :type output: str
         :raises NotImplementedError: if not implemented
+        :return: SHA-256 digest of the fetched package if the fetch computed
+            it, None if unknown
+        :rtype: str | None
         """
         raise NotImplementedError
 
+    @abstractmethod
     def serve_ota_package(
         self,
         target: str,
@@ -56,6 +110,10 @@ class OTAServerTemplate(ABC):  # pylint: disable=too-few-public-methods
     ) -> tuple[str, int, int, bytes]:
         """Fetch OTA package and place it in /tftpboot for serving.
 
+        Cuttlefish devices booting together request the same package at once,
+        so implementations should share a single fetch between concurrent
+        calls for the same package.
+
         :param target: Target device
         :type target: str
         :param build_id: Build ID of the OTA package to fetch
@@ -69,3 +127,54 @@ class OTAServerTemplate(ABC):  # pylint: disable=too-few-public-methods
         :rtype: tuple[str, int, int, bytes]
         """
         raise NotImplementedError
+
+    def release_ota_package(
+        self, target: str, build_id: str, artifact_name: str
+    ) -> None:
+        """Tell the OTA server a device is done downloading a served package.
+
+        OTA servers that evict packages keep the packages served to devices
+        until they are released. The default does nothing.
+
+        :param target: Target device
+        :type target: str
+        :param build_id: Build ID of the OTA package
+        :type build_id: str
+        :param artifact_name: Name of the OTA artifact
+        :type artifact_name: str
+        """
+
+    def serve_incremental_ota_package(  # noqa: PLR0913
+        self,
+        target: str,
+        source_build_id: str,
+        build_id: str,
+        artifact_name: str,
+        secondary_payload: bool = False,
+    ) -> tuple[str, int, int, bytes] | None:
+        """Serve an incremental OTA package from one build to another.
+
+        OTA servers without incremental packages keep this default, which
+        makes devices fall back to the full package.
+
+        :param target: Target device
+        :type target: str
+        :param source_build_id: Build ID the device currently runs
+        :type source_build_id: str
+        :param build_id: Build ID to update the device to
+        :type build_id: str
+        :param artifact_name: Name of the incremental OTA artifact to fetch
+        :type artifact_name: str
+        :param secondary_payload: Use secondary payload entries if True
+        :type secondary_payload: bool
+        :return: URL of the served OTA package, payload offset, payload size,
+            payload properties, or None if no incremental package is available
+        :rtype: tuple[str, int, int, bytes] | None
+        """
+        _LOGGER.debug(
+            "No incremental OTA package of %s from %s to %s",
+            target,
+            source_build_id,
+            build_id,
+        )
+        return None
@@ -1,10 +1,29 @@
 """MobileFarm use cases for Android devices."""
 
-from collections.abc import Generator
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from mobilefarm.lib.adb_client import AdbError
+from mobilefarm.lib.app_install import (
+    AppPackage,
+    ProvisioningResult,
+    install_app,
+    installed_versions,
+)
+from mobilefarm.lib.device_state import DeviceStateStore
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable, Sequence
+
+    from mobilefarm.lib.gui import AppiumDriverProxy
+    from mobilefarm.templates.android import AndroidTemplate
 
-from mobilefarm.lib.gui import AppiumDriverProxy
-from mobilefarm.templates.android import AndroidTemplate
+_LOGGER = logging.getLogger(__name__)
 
 
 @contextmanager
@@ -24,3 +43,103 @@ def open_application(
         yield
     finally:
         driver.terminate_app(device.app_package)
+
+
+def provision_apps(
+    devices: Iterable[AndroidTemplate],
+    apps: Sequence[AppPackage],
+    parallelism: int = 4,
+    refresh: bool = False,
+    state_store: DeviceStateStore | None = None,
+) -> list[ProvisioningResult]:
+    """Install or update a set of apps on many devices concurrently.
+
+    The version codes installed on every device are cached in the device
+    state store, keyed by the build fingerprint and build ID recorded there
+    by the last OTA update, which also clears them. Apps whose cached
+    version matches are skipped without querying the device, the others are
+    checked with a single package manager query per device, and only the
+    apps whose installed version differs are installed, split APKs in one
+    session. Devices without a recorded build are always queried.
+
+    :param devices: Android devices to provision
+    :type devices: Iterable[AndroidTemplate]
+    :param apps: APK sets to install
+    :type apps: Sequence[AppPackage]
+    :param parallelism: maximum number of devices provisioned at once
+    :type parallelism: int
+    :param refresh: query the installed versions even if cached, e.g. after
+        a wipe that kept the build
+    :type refresh: bool
+    :param state_store: store caching the installed versions, the default
+        device state file if None
+    :type state_store: DeviceStateStore | None
+    :return: result of every device, in the order of the devices
+    :rtype: list[ProvisioningResult]
+    :raises ValueError: if parallelism is lower than 1
+    """
+    if parallelism < 1:
+        err_msg = f"Parallelism must be at least 1, got {parallelism}"
+        raise ValueError(err_msg)
+    store = state_store or DeviceStateStore()
+    with ThreadPoolExecutor(
+        max_workers=parallelism, thread_name_prefix="mobilefarm-provision"
+    ) as executor:
+        return list(
+            executor.map(
+                lambda device: _provision_device(device, apps, refresh, store),
+                devices,
+            )
+        )
+
+
+def _provision_device(
+    device: AndroidTemplate,
+    apps: Sequence[AppPackage],
+    refresh: bool,
+    store: DeviceStateStore,
+) -> ProvisioningResult:
+    device_name = device.config.get("name", device.adb_serial)
+    result = ProvisioningResult(device_name)
+    started = time.monotonic()
+    known = store.device(device_name)
+    build = {
+        "fingerprint": known.get("fingerprint", ""),
+        "build_id": known.get("build_id", ""),
+    }
+    cached = (
+        known.get("apps", {})
+        if build["fingerprint"] and known.get("apps_build") == build
+        else {}
+    )
+    versions = dict(cached)
+    try:
+        if refresh or any(cached.get(app.package) != app.version_code for app in apps):
+            installed = installed_versions(device)
+            for app in apps:
+                if app.package in installed:
+                    versions[app.package] = installed[app.package]
+                else:
+                    versions.pop(app.package, None)
+        for app in apps:
+            if versions.get(app.package) == app.version_code:
+                result.skipped.append(app.package)
+                continue
+            install_app(device, app)
+            versions[app.package] = app.version_code
+            result.installed.append(app.package)
+    except (AdbError, OSError) as exc:
+        # the device state is unknown, query it next time
+        versions = {}
+        result.status = "failed"
+        result.error = str(exc)
+        _LOGGER.warning("Failed to provision the apps of %s: %s", device_name, exc)
+    else:
+        result.status = "installed" if result.installed else "skipped"
+    finally:
+        if build["fingerprint"] and (
+            versions != cached or known.get("apps_build") != build
+        ):
+            store.update_device(device_name, apps=versions, apps_build=build)
+        result.seconds = time.monotonic() - started
+    return result
@@ -4,16 +4,110 @@ import logging
 from collections.abc import Generator
 
 import pytest
+from _pytest.config.argparsing import Parser
 from _pytest.fixtures import FixtureRequest
+from _pytest.nodes import Item
+from _pytest.reports import TestReport
+from _pytest.runner import CallInfo
 from boardfarm3.lib.device_manager import get_device_manager
 
+from mobilefarm.lib.appium_servers import (
+    DEFAULT_APPIUM_SERVER,
+    AppiumServerScheduler,
+)
+from mobilefarm.lib.device_lease import DeviceLeaseAllocator, WorkerDeviceLease
 from mobilefarm.lib.gui import AndroidGuiHelper
+from mobilefarm.lib.session_pool import AppiumSessionPool
 from mobilefarm.templates.android import AndroidTemplate
 from mobilefarm.use_cases.android import open_application
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def pytest_addoption(parser: Parser) -> None:
+    """Add screenshot capture options.
+
+    :param parser: pytest command line parser
+    :type parser: Parser
+    """
+    group = parser.getgroup("mobilefarm")
+    group.addoption(
+        "--appium-servers",
+        default=DEFAULT_APPIUM_SERVER,
+        help="comma separated Appium server URLs shared by the Android devices",
+    )
+    group.addoption(
+        "--screenshot-policy",
+        default="always",
+        choices=("always", "every_nth", "after_only", "on_failure"),
+        help="when to capture screenshots around GUI actions",
+    )
+    group.addoption(
+        "--screenshot-every",
+        type=int,
+        default=1,
+        help="capture every n-th action with the every_nth policy",
+    )
+    group.addoption(
+        "--screenshot-buffer-frames",
+        type=int,
+        default=20,
+        help="number of frames kept in memory with the on_failure policy",
+    )
+    group.addoption(
+        "--screenshot-buffer-mb",
+        type=int,
+        default=64,
+        help="memory budget in MiB of the on_failure screenshot buffer",
+    )
+    group.addoption(
+        "--screenshot-dedup",
+        action="store_true",
+        default=False,
+        help="store identical screenshots only once and index the duplicates",
+    )
+    group.addoption(
+        "--screenshot-dedup-threshold",
+        type=int,
+        default=-1,
+        help="also skip near-identical screenshots whose average hashes differ "
+        "by at most this many bits out of 256; negative (the default) to skip "
+        "identical ones only",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    """Register the mobilefarm markers.
+
+    :param config: pytest config
+    :type config: pytest.Config
+    """
+    config.addinivalue_line(
+        "markers",
+        "cold_appium_session: start a fresh Appium session instead of reusing "
+        "one from the session pool",
+    )
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(
+    item: Item,
+    call: CallInfo,  # pylint: disable=unused-argument
+) -> Generator:
+    """Keep the report of each test phase on the test item.
+
+    :param item: test item
+    :type item: Item
+    :param call: call information of the test phase
+    :type call: CallInfo
+    :yield: control to the other hook implementations
+    :rtype: Generator
+    """
+    outcome = yield
+    report: TestReport = outcome.get_result()
+    setattr(item, f"rep_{report.when}", report)
+
+
 class TestDetails:  # pylint: disable=too-few-public-methods
     """TestDetails helper class."""
 
@@ -35,6 +129,100 @@ def get_output_dir(request: FixtureRequest) -> str:
     return request.config.getoption("--save-console-logs")
 
 
+@pytest.fixture(scope="session")
+def appium_session_pool() -> Generator[AppiumSessionPool, None, None]:
+    """Fixture providing the Appium sessions shared by the tests.
+
+    :yield: the session pool, closed at the end of the test session
+    :rtype: Generator[AppiumSessionPool, None, None]
+    """
+    pool = AppiumSessionPool()
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+
+@pytest.fixture(scope="session")
+def appium_scheduler(request: FixtureRequest) -> AppiumServerScheduler:
+    """Fixture assigning an Appium server and ports to each Android device.
+
+    :param request: a pytest helper fixture
+    :type request: FixtureRequest
+    :return: the Appium server scheduler
+    :rtype: AppiumServerScheduler
+    """
+    devices = get_device_manager().get_devices_by_type(
+        AndroidTemplate  # type:ignore[type-abstract]
+    )
+    return AppiumServerScheduler(
+        devices.values(),
+        servers=request.config.getoption("--appium-servers").split(","),
+    )
+
+
+@pytest.fixture(scope="session")
+def device_lease_allocator() -> DeviceLeaseAllocator:
+    """Fixture leasing Android devices to the test processes.
+
+    :return: the device lease allocator
+    :rtype: DeviceLeaseAllocator
+    """
+    return DeviceLeaseAllocator(get_device_manager())
+
+
+@pytest.fixture(scope="session")
+def worker_device_lease(
+    device_lease_allocator: DeviceLeaseAllocator,  # pylint: disable=redefined-outer-name
+    appium_session_pool: AppiumSessionPool,  # pylint: disable=redefined-outer-name
+) -> Generator[WorkerDeviceLease, None, None]:
+    """Fixture holding the device leased by the pytest-xdist worker.
+
+    The pooled Appium sessions of a device are ended only when the worker
+    hands the device back, so that they never collide with the sessions of
+    the next worker leasing it, and are reused by the tests in between.
+
+    :param device_lease_allocator: the device lease allocator
+    :type device_lease_allocator: DeviceLeaseAllocator
+    :param appium_session_pool: Appium sessions shared by the tests
+    :type appium_session_pool: AppiumSessionPool
+    :yield: the worker device lease, released at the end of the test session
+    :rtype: Generator[WorkerDeviceLease, None, None]
+    """
+    lease = WorkerDeviceLease(
+        device_lease_allocator,
+        on_release=lambda device: appium_session_pool.close_device(
+            device.device_name
+        ),
+    )
+    try:
+        yield lease
+    finally:
+        lease.release()
+
+
+@pytest.fixture
+def android_device(
+    request: FixtureRequest,
+    worker_device_lease: WorkerDeviceLease,  # pylint: disable=redefined-outer-name
+) -> AndroidTemplate:
+    """Fixture returning an Android device matching the env_req of the test.
+
+    Every pytest-xdist worker gets a distinct device, kept leased across its
+    tests as long as they match it.
+
+    :param request: a pytest helper fixture
+    :type request: FixtureRequest
+    :param worker_device_lease: the device lease of the worker
+    :type worker_device_lease: WorkerDeviceLease
+    :return: the leased Android device
+    :rtype: AndroidTemplate
+    """
+    marker = request.node.get_closest_marker("env_req")
+    env_req = marker.args[0] if marker is not None and marker.args else None
+    return worker_device_lease.device_for(env_req)
+
+
 @pytest.fixture
 def get_test_data() -> TestDetails:
     """Fixture for getting all test data.
@@ -47,12 +235,27 @@ def get_test_data() -> TestDetails:
 
 @pytest.fixture
 def android_web_driver(
+    request: FixtureRequest,
+    android_device: AndroidTemplate,  # pylint: disable=redefined-outer-name
+    appium_session_pool: AppiumSessionPool,  # pylint: disable=redefined-outer-name
+    appium_scheduler: AppiumServerScheduler,  # pylint: disable=redefined-outer-name
     get_test_data: TestDetails,  # pylint: disable=redefined-outer-name
 ) -> Generator:
     """Fixture for the VisReg.
 
-    :param get_output_dir: the results directory path
-    :type get_output_dir: str
+    The Appium session is taken from the session pool unless the test is
+    marked with ``cold_appium_session``, and ended instead of being handed
+    back if the test call fails. Screenshots buffered by the
+    ``on_failure`` policy are written to disk only if the test call fails.
+
+    :param request: a pytest helper fixture
+    :type request: FixtureRequest
+    :param android_device: the leased Android device
+    :type android_device: AndroidTemplate
+    :param appium_session_pool: Appium sessions shared by the tests
+    :type appium_session_pool: AppiumSessionPool
+    :param appium_scheduler: Appium server assignment of the devices
+    :type appium_scheduler: AppiumServerScheduler
     :param get_test_data: test context holder
     :type get_test_data: TestDetails
     :raises RuntimeError: _if a screenshot is saved (i.e. in the very first run)
@@ -60,16 +263,33 @@ def android_web_driver(
     :rtype: Generator
     """
     logging.basicConfig(level=logging.DEBUG)
-    android_device = get_device_manager().get_device_by_type(
-        device_type=AndroidTemplate  # type:ignore[type-abstract]
+    driver = AndroidGuiHelper(
+        android_device.config,
+        capture_policy=request.config.getoption("--screenshot-policy"),
+        capture_every=request.config.getoption("--screenshot-every"),
+        ring_buffer_frames=request.config.getoption("--screenshot-buffer-frames"),
+        ring_buffer_bytes=request.config.getoption("--screenshot-buffer-mb")
+        * 1024**2,
+        deduplicate_screenshots=request.config.getoption("--screenshot-dedup"),
+        dedup_threshold=request.config.getoption("--screenshot-dedup-threshold"),
+        appium_endpoint=appium_scheduler.endpoint_for(android_device),
+    ).get_web_driver(
+        None
+        if request.node.get_closest_marker("cold_appium_session")
+        else appium_session_pool
     )
-    driver = AndroidGuiHelper(android_device.config).get_web_driver()
 
     try:
         with open_application(android_device, driver):
             yield driver
     finally:
-        driver.quit()
+        report = getattr(request.node, "rep_call", None)
+        failed = report is not None and report.failed
+        driver.quit(reuse=not failed)
+        if failed:
+            saved = driver.save_buffered_screenshots()
+            if saved:
+                _LOGGER.info("Saved %d screenshots leading to the failure", saved)
         test_details = get_test_data
         if test_details.saved:
             msg = "This test saved an attachment."
@@ -0,0 +1,248 @@
+"""Fake adb server speaking the smart socket protocol, for client tests.
+
+The server knows one device. Its shell runs a handler returning the exit
+code and output of each command, and its ``sync:`` service stores files in
+memory.
+"""
+
+from __future__ import annotations
+
+import socketserver
+import stat
+import struct
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+_SHELL_HEADER = struct.Struct("<BI")
+_SYNC_HEADER = struct.Struct("<4sI")
+_SYNC_STAT = struct.Struct("<4sIII")
+_SYNC_STAT_V2 = struct.Struct("<4sIQQIIIIQqqq")
+_SYNC_DATA_MAX = 64 * 1024
+_LEGACY_EXIT_SUFFIX = "; echo __mobilefarm_exit__:$?"
+_ENOENT = 2
+
+ShellHandler = Callable[[str], "tuple[int, bytes, bytes]"]
+
+
+@dataclass
+class FakeFile:
+    """File stored on the fake device."""
+
+    mode: int
+    mtime: int
+    data: bytes
+
+
+@dataclass
+class FakeDevice:
+    """State of the device behind the fake adb server."""
+
+    serial: str
+    features: set[str]
+    shell: ShellHandler
+    files: dict[str, FakeFile] = field(default_factory=dict)
+    commands: list[str] = field(default_factory=list)
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """adb server on a free local port, serving one fake device."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, device: FakeDevice) -> None:
+        """Bind the server to a free local port.
+
+        :param device: device the server is attached to
+        :type device: FakeDevice
+        """
+        super().__init__(("127.0.0.1", 0), _AdbHandler)
+        self.device = device
+        self.port = self.server_address[1]
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    def __enter__(self) -> FakeAdbServer:
+        """Start serving in a background thread.
+
+        :return: the server
+        :rtype: FakeAdbServer
+        """
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop serving and close the listening socket.
+
+        :param exc_info: exception raised in the context, if any
+        :type exc_info: object
+        """
+        self.shutdown()
+        self.server_close()
+
+
+class _AdbHandler(socketserver.BaseRequestHandler):
+    """Serve the requests of one client connection."""
+
+    server: FakeAdbServer
+
+    def handle(self) -> None:
+        device = self.server.device
+        service = self._read_request()
+        if service.startswith("host:transport:"):
+            if service != f"host:transport:{device.serial}":
+                self._fail(f"device '{service[15:]}' not found")
+                return
+            self._okay()
+            service = self._read_request()
+        if service == "host:version":
+            self._okay()
+            self._send_message("0029")
+        elif service == f"host-serial:{device.serial}:features":
+            self._okay()
+            self._send_message(",".join(sorted(device.features)))
+        elif service.startswith("shell,v2,raw:") and "shell_v2" in device.features:
+            self._okay()
+            self._shell_v2(service.partition(":")[2])
+        elif service.startswith("shell:"):
+            self._okay()
+            self._legacy_shell(service.partition(":")[2])
+        elif service == "sync:":
+            self._okay()
+            self._sync()
+        else:
+            self._fail(f"unknown service {service}")
+
+    def _read_request(self) -> str:
+        length = int(self._recv_exact(4), 16)
+        return self._recv_exact(length).decode()
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return bytes(data)
+
+    def _okay(self) -> None:
+        self.request.sendall(b"OKAY")
+
+    def _fail(self, message: str) -> None:
+        self.request.sendall(b"FAIL")
+        self._send_message(message)
+
+    def _send_message(self, message: str) -> None:
+        payload = message.encode()
+        self.request.sendall(f"{len(payload):04x}".encode() + payload)
+
+    def _run(self, command: str) -> tuple[int, bytes, bytes]:
+        self.server.device.commands.append(command)
+        return self.server.device.shell(command)
+
+    def _shell_v2(self, command: str) -> None:
+        exit_code, stdout, stderr = self._run(command)
+        for packet_id, data in ((1, stdout), (2, stderr)):
+            if data:
+                self.request.sendall(_SHELL_HEADER.pack(packet_id, len(data)) + data)
+        self.request.sendall(_SHELL_HEADER.pack(3, 1) + bytes([exit_code]))
+
+    def _legacy_shell(self, command: str) -> None:
+        # a legacy shell runs on a pty: stderr is mixed in and lines end in CRLF
+        if command.endswith(_LEGACY_EXIT_SUFFIX):
+            exit_code, stdout, stderr = self._run(
+                command.removesuffix(_LEGACY_EXIT_SUFFIX)
+            )
+            output = stdout + stderr + f"__mobilefarm_exit__:{exit_code}\n".encode()
+        else:
+            _, stdout, stderr = self._run(command)
+            output = stdout + stderr
+        self.request.sendall(output.replace(b"\n", b"\r\n"))
+
+    def _sync(self) -> None:
+        while True:
+            request, length = _SYNC_HEADER.unpack(self._recv_exact(_SYNC_HEADER.size))
+            if request == b"QUIT":
+                return
+            path = self._recv_exact(length).decode()
+            if request == b"STAT":
+                self._stat(path)
+            elif request == b"STA2" and "stat_v2" in self.server.device.features:
+                self._stat_v2(path)
+            elif request == b"SEND":
+                self._receive_file(path)
+            elif request == b"RECV":
+                self._send_file(path)
+            else:
+                self._sync_fail(f"unknown sync request {request!r}")
+                return
+
+    def _stat(self, path: str) -> None:
+        file = self.server.device.files.get(path)
+        if file is None:
+            self.request.sendall(_SYNC_STAT.pack(b"STAT", 0, 0, 0))
+            return
+        self.request.sendall(
+            _SYNC_STAT.pack(b"STAT", file.mode, len(file.data), file.mtime)
+        )
+
+    def _stat_v2(self, path: str) -> None:
+        file = self.server.device.files.get(path)
+        if file is None:
+            self.request.sendall(
+                _SYNC_STAT_V2.pack(b"STA2", _ENOENT, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+            )
+            return
+        self.request.sendall(
+            _SYNC_STAT_V2.pack(
+                b"STA2",
+                0,
+                0,
+                0,
+                file.mode,
+                1,
+                0,
+                0,
+                len(file.data),
+                file.mtime,
+                file.mtime,
+                file.mtime,
+            )
+        )
+
+    def _receive_file(self, path_and_mode: str) -> None:
+        path, _, mode = path_and_mode.rpartition(",")
+        data = bytearray()
+        while True:
+            request, length = _SYNC_HEADER.unpack(self._recv_exact(_SYNC_HEADER.size))
+            if request == b"DONE":
+                mtime = length
+                break
+            if request != b"DATA" or length > _SYNC_DATA_MAX:
+                self._sync_fail(f"bad SEND packet {request!r} of {length} bytes")
+                return
+            data += self._recv_exact(length)
+        if path.startswith("/system/"):
+            self._sync_fail(f"{path}: Read-only file system")
+            return
+        self.server.device.files[path] = FakeFile(
+            mode=int(mode), mtime=mtime, data=bytes(data)
+        )
+        self.request.sendall(_SYNC_HEADER.pack(b"OKAY", 0))
+
+    def _send_file(self, path: str) -> None:
+        file = self.server.device.files.get(path)
+        if file is None or stat.S_ISDIR(file.mode):
+            self._sync_fail(f"{path}: No such file or directory")
+            return
+        for offset in range(0, len(file.data), _SYNC_DATA_MAX):
+            chunk = file.data[offset : offset + _SYNC_DATA_MAX]
+            self.request.sendall(_SYNC_HEADER.pack(b"DATA", len(chunk)) + chunk)
+        self.request.sendall(_SYNC_HEADER.pack(b"DONE", 0))
+
+    def _sync_fail(self, message: str) -> None:
+        payload = message.encode()
+        self.request.sendall(_SYNC_HEADER.pack(b"FAIL", len(payload)) + payload)
@@ -0,0 +1,265 @@
+"""Test the adb server protocol client against a fake adb server."""
+
+from __future__ import annotations
+
+import os
+import stat
+from typing import TYPE_CHECKING
+
+import pytest
+
+from mobilefarm.lib.adb_client import SYNC_DATA_MAX, AdbClient, AdbError
+from tests.fake_adb_server import FakeAdbServer, FakeDevice, FakeFile
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from pathlib import Path
+
+_SERIAL = "127.0.0.1:6520"
+
+
+def _shell(command: str) -> tuple[int, bytes, bytes]:
+    if command == "getprop ro.build.version.incremental":
+        return 0, b"12345\n", b""
+    if command.startswith("ls "):
+        return 1, b"", f"ls: {command[3:]}: No such file or directory\n".encode()
+    if command.startswith("exit "):
+        return int(command[5:]), b"", b""
+    message = f"/system/bin/sh: {command}: inaccessible or not found\n"
+    return 127, b"", message.encode()
+
+
+def _fake_server(features: set[str]) -> FakeAdbServer:
+    return FakeAdbServer(FakeDevice(_SERIAL, features, _shell))
+
+
+@pytest.fixture(name="adb_server")
+def fixture_adb_server() -> Generator[FakeAdbServer, None, None]:
+    """Fake adb server of a device with shell v2 and 64-bit stat.
+
+    :yields: fake adb server
+    """
+    with _fake_server({"shell_v2", "stat_v2", "cmd"}) as server:
+        yield server
+
+
+@pytest.fixture(name="legacy_adb_server")
+def fixture_legacy_adb_server() -> Generator[FakeAdbServer, None, None]:
+    """Fake adb server of a device with neither shell v2 nor 64-bit stat.
+
+    :yields: fake adb server
+    """
+    with _fake_server(set()) as server:
+        yield server
+
+
+def _client(server: FakeAdbServer) -> AdbClient:
+    return AdbClient(port=server.port, timeout=5)
+
+
+def test_version_and_features(adb_server: FakeAdbServer) -> None:
+    """Query the host services of the adb server.
+
+    :param adb_server: fake adb server
+    :type adb_server: FakeAdbServer
+    """
+    client = _client(adb_server)
+
+    assert client.version() == 0x29
+    assert client.features(_SERIAL) == {"shell_v2", "stat_v2", "cmd"}
+
+
+def test_unknown_device_is_refused(adb_server: FakeAdbServer) -> None:
+    """Refuse a service on a device the adb server does not know.
+
+    :param adb_server: fake adb server
+    :type adb_server: FakeAdbServer
+    """
+    device = _client(adb_server).device("emulator-5554")
+    device._features = {"shell_v2"}  # noqa: SLF001
+
+    with pytest.raises(AdbError, match="not found"):
+        device.shell("true")
+
+
+@pytest.mark.parametrize(
+    ("command", "exit_code", "stdout", "stderr"),
+    [
+        ("getprop ro.build.version.incremental", 0, b"12345\n", b""),
+        (
+            "ls /sdcard/missing",
+            1,
+            b"",
+            b"ls: /sdcard/missing: No such file or directory\n",
+        ),
+        ("exit 255", 255, b"", b""),
+    ],
+)
+def test_shell_v2_exit_code(
+    adb_server: FakeAdbServer,
+    command: str,
+    exit_code: int,
+    stdout: bytes,
+    stderr: bytes,
+) -> None:
+    """Read the exit code and split output of shell v2 commands.
+
+    :param adb_server: fake adb server
+    :type adb_server: FakeAdbServer
+    :param command: shell command
+    :type command: str
+    :param exit_code: expected exit code
+    :type exit_code: int
+    :param stdout: expected standard output
+    :type stdout: bytes
+    :param stderr: expected standard error
+    :type stderr: bytes
+    """
+    result = _client(adb_server).device(_SERIAL).shell(command)
+
+    assert (result.exit_code, result.stdout, result.stderr) == (
+        exit_code,
+        stdout,
+        stderr,
+    )
+    assert result.ok is (exit_code == 0)
+    assert adb_server.device.commands == [command]
+
+
+@pytest.mark.parametrize(
+    ("command", "exit_code", "output"),
+    [
+        ("getprop ro.build.version.incremental", 0, "12345"),
+        ("ls /sdcard/missing", 1, "ls: /sdcard/missing: No such file or directory"),
+        ("exit 3", 3, ""),
+    ],
+)
+def test_legacy_shell_exit_marker(
+    legacy_adb_server: FakeAdbServer, command: str, exit_code: int, output: str
+) -> None:
+    """Read the exit code of legacy shell commands from the exit marker.
+
+    :param legacy_adb_server: fake adb server without shell v2
+    :type legacy_adb_server: FakeAdbServer
+    :param command: shell command
+    :type command: str
+    :param exit_code: expected exit code
+    :type exit_code: int
+    :param output: expected output, stderr mixed in stdout
+    :type output: str
+    """
+    device = _client(legacy_adb_server).device(_SERIAL)
+
+    result = device.shell(command)
+
+    assert result.exit_code == exit_code
+    assert result.stderr == b""
+    assert b"\r" not in result.stdout
+    assert result.output == output
+    assert device.execute_command(command) == output
+    assert legacy_adb_server.device.commands == [command, command]
+
+
+@pytest.mark.parametrize("size", [0, 1, SYNC_DATA_MAX, 3 * SYNC_DATA_MAX + 17])
+@pytest.mark.parametrize("features", [{"stat_v2"}, set()], ids=["sta2", "stat"])
+def test_push_pull_round_trip(tmp_path: Path, size: int, features: set[str]) -> None:
+    """Push a file, stat it and pull it back unchanged.
+
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :param size: file size in bytes, around the sync chunk size
+    :type size: int
+    :param features: device features, selecting STA2 or STAT
+    :type features: set[str]
+    """
+    local = tmp_path / "payload.bin"
+    local.write_bytes(os.urandom(size))
+    local.chmod(0o640)
+    os.utime(local, (1_700_000_000, 1_700_000_000))
+    pulled = tmp_path / "pulled.bin"
+
+    with _fake_server(features) as server:
+        device = _client(server).device(_SERIAL)
+
+        assert device.push(local, "/data/local/tmp/payload.bin") == size
+        file_stat = device.stat("/data/local/tmp/payload.bin")
+        assert device.pull("/data/local/tmp/payload.bin", pulled) == size
+
+    assert pulled.read_bytes() == local.read_bytes()
+    assert not (tmp_path / "pulled.bin.partial").exists()
+    assert file_stat.exists
+    assert not file_stat.is_dir
+    assert file_stat.size == size
+    assert file_stat.mtime == 1_700_000_000
+    assert file_stat.mode == stat.S_IFREG | 0o640
+
+
+@pytest.mark.parametrize("features", [{"stat_v2"}, set()], ids=["sta2", "stat"])
+def test_stat_missing_file(features: set[str]) -> None:
+    """Report a missing file as an all-zero stat.
+
+    :param features: device features, selecting STA2 or STAT
+    :type features: set[str]
+    """
+    with _fake_server(features) as server:
+        file_stat = _client(server).device(_SERIAL).stat("/sdcard/missing")
+
+    assert not file_stat.exists
+    assert (file_stat.mode, file_stat.size, file_stat.mtime) == (0, 0, 0)
+
+
+def test_several_transfers_in_one_sync_session(
+    adb_server: FakeAdbServer, tmp_path: Path
+) -> None:
+    """Carry a stat, a pull and a push over one sync connection.
+
+    :param adb_server: fake adb server
+    :type adb_server: FakeAdbServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    adb_server.device.files["/sdcard/a.txt"] = FakeFile(
+        mode=stat.S_IFREG | 0o644, mtime=1, data=b"first"
+    )
+    local = tmp_path / "a.txt"
+    device = _client(adb_server).device(_SERIAL)
+
+    with device.sync() as session:
+        size = session.stat("/sdcard/a.txt").size
+        session.pull("/sdcard/a.txt", local)
+        session.push(local, "/sdcard/b.txt", mode=0o600)
+
+    assert size == 5
+    assert adb_server.device.files["/sdcard/b.txt"].data == b"first"
+    assert adb_server.device.files["/sdcard/b.txt"].mode == stat.S_IFREG | 0o600
+
+
+def test_push_refused(adb_server: FakeAdbServer, tmp_path: Path) -> None:
+    """Raise the message of the device when it refuses a pushed file.
+
+    :param adb_server: fake adb server
+    :type adb_server: FakeAdbServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    local = tmp_path / "build.prop"
+    local.write_bytes(b"ro.debuggable=1\n")
+
+    with pytest.raises(AdbError, match="Read-only file system"):
+        _client(adb_server).device(_SERIAL).push(local, "/system/build.prop")
+
+
+def test_pull_missing_file(adb_server: FakeAdbServer, tmp_path: Path) -> None:
+    """Raise on a missing remote file and leave no partial local file.
+
+    :param adb_server: fake adb server
+    :type adb_server: FakeAdbServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    local = tmp_path / "missing.txt"
+
+    with pytest.raises(AdbError, match="No such file or directory"):
+        _client(adb_server).device(_SERIAL).pull("/sdcard/missing", local)
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,347 @@
+"""Test the range downloader against local HTTP stand-in servers."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import http.server
+import json
+import os
+import threading
+import urllib.request
+from typing import TYPE_CHECKING
+
+import pytest
+
+from mobilefarm.lib.ota_download import RangeDownloader, main
+from mobilefarm.lib.ota_http_server import OTAHttpServer
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from pathlib import Path
+
+_CHUNK_SIZE = 64 * 1024
+_CHUNKS = 10
+# the last chunk is a short one
+_SIZE = (_CHUNKS - 1) * _CHUNK_SIZE + 1234
+
+
+class _RunningOTAHttpServer:
+    """OTA HTTP server running its event loop in a background thread."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._server = OTAHttpServer(str(root), host="127.0.0.1", port=0)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._server.start(), self._loop).result()
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self._server.port}/{name}"
+
+    @property
+    def requests(self) -> int:
+        return int(self._server.stats().get("127.0.0.1", {}).get("requests", 0))
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class _NoLengthHandler(http.server.BaseHTTPRequestHandler):
+    """Send files without ranges nor length, ending them by closing."""
+
+    def __init__(self, *args: object, directory: str, **kwargs: object) -> None:
+        self.directory = directory
+        super().__init__(*args, **kwargs)  # type: ignore[arg-type]
+
+    def do_GET(self) -> None:  # noqa: N802
+        with open(os.path.join(self.directory, self.path.lstrip("/")), "rb") as file:
+            data = file.read()
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture(name="ota_http_server")
+def fixture_ota_http_server(
+    tmp_path: Path,
+) -> Generator[_RunningOTAHttpServer, None, None]:
+    """OTA HTTP server serving a payload with range requests.
+
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :yields: running server, serving ``payload.zip``
+    """
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "payload.zip").write_bytes(os.urandom(_SIZE))
+    server = _RunningOTAHttpServer(root)
+    yield server
+    server.close()
+
+
+@pytest.fixture(name="plain_http_server", params=["length", "no-length"])
+def fixture_plain_http_server(
+    request: pytest.FixtureRequest, tmp_path: Path
+) -> Generator[str, None, None]:
+    """HTTP server without range support, with or without Content-Length.
+
+    :param request: fixture request, selecting the handler
+    :type request: pytest.FixtureRequest
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :yields: URL of ``payload.zip``
+    """
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "payload.zip").write_bytes(os.urandom(_SIZE))
+    handler = (
+        http.server.SimpleHTTPRequestHandler
+        if request.param == "length"
+        else _NoLengthHandler
+    )
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(handler, directory=str(root))
+    )
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/payload.zip"
+    server.shutdown()
+    server.server_close()
+
+
+def _downloader(url: str, output: Path, **kwargs: object) -> RangeDownloader:
+    return RangeDownloader(
+        url,
+        str(output),
+        connections=4,
+        chunk_size=_CHUNK_SIZE,
+        timeout=5,
+        **kwargs,  # type: ignore[arg-type]
+    )
+
+
+def _etag(url: str) -> str:
+    request = urllib.request.Request(url, method="HEAD")  # noqa: S310
+    with urllib.request.urlopen(request, timeout=5) as response:  # noqa: S310
+        return response.headers["ETag"]
+
+
+def _write_partial(
+    output: Path, data: bytes, done: list[int], size: int, etag: str
+) -> None:
+    """Write a partial download with the given chunks of data completed.
+
+    :param output: downloaded file
+    :type output: Path
+    :param data: content of the completed chunks
+    :type data: bytes
+    :param done: indexes of the completed chunks
+    :type done: list[int]
+    :param size: size recorded in the state file
+    :type size: int
+    :param etag: ETag recorded in the state file
+    :type etag: str
+    """
+    partial = bytearray(len(data))
+    for index in done:
+        start = index * _CHUNK_SIZE
+        partial[start : start + _CHUNK_SIZE] = data[start : start + _CHUNK_SIZE]
+    output.write_bytes(partial)
+    state = {"size": size, "etag": etag, "chunk_size": _CHUNK_SIZE, "done": done}
+    output.with_name(f"{output.name}.ranges").write_text(json.dumps(state))
+
+
+def test_parallel_range_download(
+    ota_http_server: _RunningOTAHttpServer, tmp_path: Path
+) -> None:
+    """Download every chunk over parallel range requests.
+
+    :param ota_http_server: OTA HTTP server
+    :type ota_http_server: _RunningOTAHttpServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    data = (ota_http_server.root / "payload.zip").read_bytes()
+    output = tmp_path / "payload.zip"
+    progress: list[tuple[int, int]] = []
+
+    digest = _downloader(
+        ota_http_server.url("payload.zip"),
+        output,
+        progress=lambda done, total: progress.append((done, total)),
+    ).download(expected_sha256=hashlib.sha256(data).hexdigest().upper())
+
+    assert output.read_bytes() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert not (tmp_path / "payload.zip.ranges").exists()
+    # one probe, then one request per chunk
+    assert ota_http_server.requests == 1 + _CHUNKS
+    assert max(progress) == (_SIZE, _SIZE)
+
+
+def test_resume_from_state_file(
+    ota_http_server: _RunningOTAHttpServer, tmp_path: Path
+) -> None:
+    """Fetch only the chunks missing from the state file.
+
+    :param ota_http_server: OTA HTTP server
+    :type ota_http_server: _RunningOTAHttpServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    url = ota_http_server.url("payload.zip")
+    data = (ota_http_server.root / "payload.zip").read_bytes()
+    output = tmp_path / "payload.zip"
+    _write_partial(output, data, [0, 1, 2, 5], _SIZE, _etag(url))
+    requests = ota_http_server.requests
+
+    _downloader(url, output).download()
+
+    assert output.read_bytes() == data
+    assert ota_http_server.requests - requests == 1 + _CHUNKS - 4
+    assert not (tmp_path / "payload.zip.ranges").exists()
+
+
+@pytest.mark.parametrize("stale", ["etag", "size"])
+def test_stale_state_discarded(
+    ota_http_server: _RunningOTAHttpServer, tmp_path: Path, stale: str
+) -> None:
+    """Download everything again if the remote file changed.
+
+    :param ota_http_server: OTA HTTP server
+    :type ota_http_server: _RunningOTAHttpServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :param stale: state field not matching the remote file
+    :type stale: str
+    """
+    url = ota_http_server.url("payload.zip")
+    data = (ota_http_server.root / "payload.zip").read_bytes()
+    output = tmp_path / "payload.zip"
+    _write_partial(
+        output,
+        os.urandom(_SIZE),
+        [0, 1, 2],
+        _SIZE + 1 if stale == "size" else _SIZE,
+        '"rebuilt"' if stale == "etag" else _etag(url),
+    )
+    requests = ota_http_server.requests
+
+    _downloader(url, output).download()
+
+    assert output.read_bytes() == data
+    assert ota_http_server.requests - requests == 1 + _CHUNKS
+
+
+def test_sha256_mismatch_discards_download(
+    ota_http_server: _RunningOTAHttpServer, tmp_path: Path
+) -> None:
+    """Remove the download and its state if the digest does not match.
+
+    :param ota_http_server: OTA HTTP server
+    :type ota_http_server: _RunningOTAHttpServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    output = tmp_path / "payload.zip"
+
+    with pytest.raises(ValueError, match="SHA-256 mismatch"):
+        _downloader(ota_http_server.url("payload.zip"), output).download(
+            expected_sha256="0" * 64
+        )
+
+    assert list(tmp_path.iterdir()) == [ota_http_server.root]
+
+
+def test_server_without_range_support(plain_http_server: str, tmp_path: Path) -> None:
+    """Download the whole file with a single plain request.
+
+    :param plain_http_server: URL served without range support
+    :type plain_http_server: str
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    data = (tmp_path / "root" / "payload.zip").read_bytes()
+    output = tmp_path / "payload.zip"
+    progress: list[tuple[int, int]] = []
+
+    digest = _downloader(
+        plain_http_server,
+        output,
+        progress=lambda done, total: progress.append((done, total)),
+    ).download()
+
+    assert output.read_bytes() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert not (tmp_path / "payload.zip.ranges").exists()
+    assert progress[-1][0] == _SIZE
+
+
+def test_main_download_ok(
+    ota_http_server: _RunningOTAHttpServer,
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Print progress lines and a final ``DOWNLOAD OK`` line.
+
+    :param ota_http_server: OTA HTTP server
+    :type ota_http_server: _RunningOTAHttpServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :param capsys: captured output
+    :type capsys: pytest.CaptureFixture[str]
+    """
+    digest = hashlib.sha256(
+        (ota_http_server.root / "payload.zip").read_bytes()
+    ).hexdigest()
+
+    exit_code = main(
+        [
+            ota_http_server.url("payload.zip"),
+            str(tmp_path / "payload.zip"),
+            f"--chunk-size={_CHUNK_SIZE}",
+            f"--sha256={digest}",
+            "--progress-interval=0",
+        ]
+    )
+
+    lines = capsys.readouterr().out.splitlines()
+    assert exit_code == 0
+    assert lines[-1] == f"DOWNLOAD OK {digest}"
+    assert f"PROGRESS {_SIZE} {_SIZE}" in lines[:-1]
+    assert all(line.startswith("PROGRESS ") for line in lines[:-1])
+
+
+def test_main_download_failed(
+    ota_http_server: _RunningOTAHttpServer,
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Print a final ``DOWNLOAD FAILED`` line with the reason.
+
+    :param ota_http_server: OTA HTTP server
+    :type ota_http_server: _RunningOTAHttpServer
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :param capsys: captured output
+    :type capsys: pytest.CaptureFixture[str]
+    """
+    exit_code = main(
+        [ota_http_server.url("missing.zip"), str(tmp_path / "missing.zip")]
+    )
+
+    assert exit_code == 1
+    assert capsys.readouterr().out.splitlines()[-1].startswith(
+        "DOWNLOAD FAILED HTTPError: HTTP Error 404"
+    )
@@ -0,0 +1,100 @@
+"""Test the screenshot deduplication sink."""
+
+from __future__ import annotations
+
+import io
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from mobilefarm.lib.screenshot import DedupSink, FileSink
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+
+def _frame(text: str, checked: bool = False) -> bytes:
+    """Render a settings-like screen with a text field and a checkbox.
+
+    :param text: content of the text field
+    :type text: str
+    :param checked: whether the checkbox is ticked
+    :type checked: bool
+    :return: PNG encoded frame
+    :rtype: bytes
+    """
+    image = Image.new("RGB", (360, 640), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 360, 60), fill=(30, 90, 200))
+    draw.rectangle((20, 100, 340, 140), outline="black")
+    draw.text((28, 112), text, fill="black")
+    draw.rectangle(
+        (20, 200, 36, 216), outline="black", fill="black" if checked else None
+    )
+    png = io.BytesIO()
+    image.save(png, "PNG")
+    return png.getvalue()
+
+
+def _index(tmp_path: Path) -> list[dict[str, str]]:
+    lines = (tmp_path / DedupSink.index_name).read_text().splitlines()
+    return [json.loads(line) for line in lines]
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [_frame("hello!"), _frame("hello", checked=True)],
+    ids=["typed-character", "toggled-checkbox"],
+)
+def test_small_change_is_stored(tmp_path: Path, changed: bytes) -> None:
+    """Store frames differing by a small change with the default threshold.
+
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    :param changed: frame with a small change from the first one
+    :type changed: bytes
+    """
+    sink = DedupSink(FileSink())
+
+    sink.write(tmp_path / "001.png", _frame("hello"))
+    sink.write(tmp_path / "002.png", changed)
+
+    assert sink.skipped == 0
+    assert (tmp_path / "002.png").read_bytes() == changed
+    assert [entry["stored"] for entry in _index(tmp_path)] == ["001.png", "002.png"]
+
+
+def test_identical_frame_is_skipped(tmp_path: Path) -> None:
+    """Skip a frame identical to a stored one and index it.
+
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    sink = DedupSink(FileSink())
+
+    sink.write(tmp_path / "001.png", _frame("hello"))
+    sink.write(tmp_path / "002.png", _frame("hello!"))
+    sink.write(tmp_path / "003.png", _frame("hello"))
+
+    assert sink.skipped == 1
+    assert not (tmp_path / "003.png").exists()
+    assert _index(tmp_path)[-1] == {"frame": "003.png", "stored": "001.png"}
+
+
+def test_perceptual_match_is_opt_in(tmp_path: Path) -> None:
+    """Skip near-identical frames when a threshold is given.
+
+    :param tmp_path: temporary directory
+    :type tmp_path: Path
+    """
+    sink = DedupSink(FileSink(), threshold=0)
+
+    sink.write(tmp_path / "001.png", _frame("hello"))
+    sink.write(tmp_path / "002.png", _frame("hello!"))
+
+    assert sink.skipped == 1
+    assert _index(tmp_path)[-1] == {"frame": "002.png", "stored": "001.png"}